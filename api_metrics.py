@@ -0,0 +1,168 @@
+"""
+api_metrics.py
+
+Description:
+    Per-service, per-endpoint instrumentation of every outbound HTTP call made by the sync scripts.
+    The shared sessions of http_sessions.py send through an instrumented adapter, so calls made by
+    spotipy, ytmusicapi, plexapi and the raw Spotify Web API helpers are all recorded: request count,
+    error count (HTTP status >= 400 or a connection error/timeout) and a latency histogram.
+    Endpoints are named by method and URL path with IDs replaced by {id}
+    (e.g. "GET /v1/playlists/{id}/tracks", "GET /library/metadata/{id}/children").
+    At exit the scripts can write the totals as a JSON summary or in the Prometheus text format, for
+    node_exporter's textfile collector (the file is replaced atomically, so a scrape never sees a partial file).
+"""
+
+import json
+import os
+import re
+import threading
+import time
+from urllib.parse import urlsplit
+
+# Upper bounds (seconds) of the latency histogram buckets; the last bucket is +Inf
+LATENCY_BUCKETS = (0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Prefix of the exported Prometheus metric names
+METRIC_PREFIX = 'playlist_sync_api'
+
+# Path segments that are IDs rather than endpoint names: numbers (or comma-separated lists of them,
+# as in Plex metadata fetches) and long opaque tokens (Spotify, YouTube and Plex client IDs)
+ID_SEGMENT = re.compile(r"^[\d,]+$|^(?=[A-Za-z0-9_-]*\d)[A-Za-z0-9_-]{12,}$")
+
+
+# Endpoint name of a request: method and URL path with ID segments replaced by {id}
+def endpoint_name(method, url):
+    path = urlsplit(url).path or '/'
+    segments = ['{id}' if ID_SEGMENT.match(segment) else segment for segment in path.split('/')]
+    return f"{method} {'/'.join(segments)}"
+
+
+class EndpointStats:
+    def __init__(self):
+        self.count = 0
+        self.errors = 0
+        self.seconds = 0.0
+        self.max_seconds = 0.0
+        self.buckets = [0] * (len(LATENCY_BUCKETS) + 1)
+
+    def record(self, seconds, error):
+        self.count += 1
+        self.errors += error
+        self.seconds += seconds
+        self.max_seconds = max(self.max_seconds, seconds)
+        for i, bound in enumerate(LATENCY_BUCKETS):
+            if seconds <= bound:
+                self.buckets[i] += 1
+                break
+        else:
+            self.buckets[-1] += 1
+
+    # Cumulative bucket counts keyed by their upper bound, as in a Prometheus histogram
+    def cumulative_buckets(self):
+        total = 0
+        cumulative = {}
+        for bound, count in zip([*LATENCY_BUCKETS, '+Inf'], self.buckets):
+            total += count
+            cumulative[str(bound)] = total
+        return cumulative
+
+
+class ApiMetrics:
+    def __init__(self):
+        self.started_at = time.time()
+        self.endpoints = {}
+        self.lock = threading.Lock()
+
+    # Record one call to an endpoint of a service
+    def record(self, service, endpoint, seconds, error=False):
+        with self.lock:
+            stats = self.endpoints.get((service, endpoint))
+            if stats is None:
+                stats = self.endpoints[(service, endpoint)] = EndpointStats()
+            stats.record(seconds, error)
+
+    # Totals per service: (calls, errors, seconds)
+    def service_totals(self):
+        totals = {}
+        with self.lock:
+            for (service, _), stats in self.endpoints.items():
+                calls, errors, seconds = totals.get(service, (0, 0, 0.0))
+                totals[service] = (calls + stats.count, errors + stats.errors, seconds + stats.seconds)
+        return totals
+
+    def summary(self):
+        services = {}
+        with self.lock:
+            for (service, endpoint), stats in sorted(self.endpoints.items()):
+                services.setdefault(service, {})[endpoint] = {
+                    'count': stats.count,
+                    'errors': stats.errors,
+                    'seconds_total': round(stats.seconds, 6),
+                    'seconds_mean': round(stats.seconds / stats.count, 6) if stats.count else 0.0,
+                    'seconds_max': round(stats.max_seconds, 6),
+                    'buckets': stats.cumulative_buckets(),
+                }
+        return {
+            'started_at': self.started_at,
+            'finished_at': time.time(),
+            'services': services,
+        }
+
+    def prometheus_text(self):
+        name = METRIC_PREFIX
+        lines = [
+            f"# HELP {name}_requests_total Outbound API requests by service and endpoint.",
+            f"# TYPE {name}_requests_total counter",
+        ]
+        summary = self.summary()
+        rows = [(service, endpoint, stats) for service, endpoints in summary['services'].items() for endpoint, stats in endpoints.items()]
+        for service, endpoint, stats in rows:
+            lines.append(f"{name}_requests_total{{{labels(service, endpoint)}}} {stats['count']}")
+        lines += [
+            f"# HELP {name}_errors_total Outbound API requests that failed (HTTP status >= 400 or no response).",
+            f"# TYPE {name}_errors_total counter",
+        ]
+        for service, endpoint, stats in rows:
+            lines.append(f"{name}_errors_total{{{labels(service, endpoint)}}} {stats['errors']}")
+        lines += [
+            f"# HELP {name}_request_duration_seconds Outbound API request latency.",
+            f"# TYPE {name}_request_duration_seconds histogram",
+        ]
+        for service, endpoint, stats in rows:
+            for bound, count in stats['buckets'].items():
+                lines.append(f"{name}_request_duration_seconds_bucket{{{labels(service, endpoint)},le=\"{bound}\"}} {count}")
+            lines.append(f"{name}_request_duration_seconds_sum{{{labels(service, endpoint)}}} {stats['seconds_total']}")
+            lines.append(f"{name}_request_duration_seconds_count{{{labels(service, endpoint)}}} {stats['count']}")
+        lines += [
+            f"# HELP {name}_last_run_timestamp_seconds End time of the last sync run.",
+            f"# TYPE {name}_last_run_timestamp_seconds gauge",
+            f"{name}_last_run_timestamp_seconds {summary['finished_at']:.0f}",
+        ]
+        return '\n'.join(lines) + '\n'
+
+    # Write the metrics as 'json' or 'prometheus' text; the file is replaced atomically
+    def write(self, path, output_format='json'):
+        if output_format == 'prometheus':
+            content = self.prometheus_text()
+        else:
+            content = json.dumps(self.summary(), indent=2) + '\n'
+        temp_path = f"{path}.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            f.write(content)
+        os.replace(temp_path, path)
+
+    def print_summary(self):
+        for service, (calls, errors, seconds) in sorted(self.service_totals().items()):
+            mean = seconds / calls * 1000 if calls else 0
+            print(f"API calls {service}: {calls} requests, {errors} errors, {seconds:.1f}s total ({mean:.0f} ms mean).")
+
+
+# Label set of a service endpoint, escaped for the Prometheus text format
+def labels(service, endpoint):
+    def escape(value):
+        return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+    return f"service=\"{escape(service)}\",endpoint=\"{escape(endpoint)}\""
+
+
+# Process-wide metrics shared by every instrumented session
+api_metrics = ApiMetrics()
@@ -0,0 +1,232 @@
+"""
+benchmark_matching.py
+
+Description:
+    Scaling microbenchmark of the Plex matching engines on synthetic libraries (synthetic_catalog.py),
+    from 10k to 1M tracks. No Plex server is needed.
+    Engines:
+      - walk:    find_track_in_plex of the aio script (artist search -> albums -> tracks) over an
+                 in-memory stand-in of the music section;
+      - index:   PlexLibraryIndex exact lookups (--plex-index);
+      - trigram: PlexLibraryIndex with approximate fallback over the trigram index (--min-score);
+      - vector:  the same with the NumPy batch engine (--match-engine vector, needs numpy).
+    For every engine and library size it reports index build time, resident memory added by the
+    index, lookup latency percentiles (p50/p95/p99), and how many queries returned the right track.
+    The vector engine scores the whole query batch up front; that time is included in its mean.
+    The walk engine makes no network calls here; on a real server every search/albums/tracks step is a round trip.
+
+Usage:
+    python benchmark_matching.py                                   # 10k and 100k tracks, all engines
+    python benchmark_matching.py --sizes 1000000 --engines index trigram vector --queries 5000
+    python benchmark_matching.py --output matching.json
+"""
+
+import argparse
+import gc
+import io
+import json
+import os
+import resource
+import sys
+import time
+from contextlib import redirect_stdout
+
+import convert_playlist_aio_plex_spotify_youtube as aio
+from ngram_index import clean_text
+from plex_library_index import PlexLibraryIndex, normalize_text
+from retry_policy import RetryPolicy
+from synthetic_catalog import generate_catalog, generate_queries
+
+ENGINES = ['walk', 'index', 'trigram', 'vector']
+DEFAULT_SIZES = [10000, 100000]
+DEFAULT_QUERIES = 2000
+DEFAULT_MIN_SCORE = 0.8
+
+
+# Resident set size of this process in MB (peak RSS where /proc is not available)
+def rss_mb():
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 2 ** 20
+    except (OSError, ValueError):
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / 2 ** 20 if sys.platform == 'darwin' else peak / 2 ** 10
+
+
+def percentile(values, fraction):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+# Minimal stand-ins for the plexapi artist/album objects walked by find_track_in_plex
+class WalkAlbum:
+    type = 'album'
+
+    def __init__(self, title):
+        self.title = title
+        self.items = []
+
+    def tracks(self):
+        return self.items
+
+
+class WalkArtist:
+    type = 'artist'
+
+    def __init__(self, title):
+        self.title = title
+        self.album_map = {}
+
+    def albums(self):
+        return list(self.album_map.values())
+
+
+class WalkSection:
+    title = 'Music'
+
+    def __init__(self, tracks):
+        self.artist_map = {}
+        for track in tracks:
+            artist = self.artist_map.get(track.grandparentTitle)
+            if artist is None:
+                artist = self.artist_map[track.grandparentTitle] = WalkArtist(track.grandparentTitle)
+            album = artist.album_map.get(track.parentTitle)
+            if album is None:
+                album = artist.album_map[track.parentTitle] = WalkAlbum(track.parentTitle)
+            album.items.append(track)
+
+    # Plex hub search matches words anywhere in the artist name
+    def search(self, title=None):
+        query = title.lower()
+        return [artist for artist in self.artist_map.values() if query in artist.title.lower()]
+
+
+# Build an engine over the catalog; returns its lookup function and batch preparation function (or None)
+def build_engine(engine, tracks, min_score):
+    if engine == 'walk':
+        aio.plex_index = None
+        aio.music_library = WalkSection(tracks)
+        aio.plex_retry = RetryPolicy('Plex')
+        return lambda artist, title, album: aio.find_track_in_plex(artist, title, album), None
+
+    index = PlexLibraryIndex()
+    for track in tracks:
+        index.add(track)
+    if engine == 'index':
+        return lambda artist, title, album: index.find_track(artist, title, album), None
+    prepare = None
+    if engine == 'trigram':
+        index.fuzzy_index()
+    elif engine == 'vector':
+        from vector_matcher import VectorMatcher
+        matcher = VectorMatcher(index)
+        prepare = lambda queries: matcher.prepare([(artist, title) for artist, title, _, _ in queries])
+    return lambda artist, title, album: index.find_track(artist, title, album, min_score=min_score), prepare
+
+
+# A result is correct if it is the expected track or an equivalent one (same cleaned title and artist,
+# e.g. the compilation copy of the song), and None for queries that are not in the library
+def is_correct(result, expected_key, tracks):
+    if expected_key is None or result is None:
+        return result is None and expected_key is None
+    expected = tracks[expected_key - 1]
+    return result.ratingKey == expected_key or (
+        clean_text(result.title) == clean_text(expected.title)
+        and normalize_text(result.originalTitle or result.grandparentTitle) == normalize_text(expected.originalTitle or expected.grandparentTitle)
+    )
+
+
+# Build one engine over one catalog and time its lookups
+def run_case(engine, tracks, queries, min_score=DEFAULT_MIN_SCORE):
+    gc.collect()
+    rss_before = rss_mb()
+    start = time.perf_counter()
+    find, prepare = build_engine(engine, tracks, min_score)
+    build_seconds = time.perf_counter() - start
+    gc.collect()
+    rss_added = rss_mb() - rss_before
+
+    batch_seconds = 0.0
+    with redirect_stdout(io.StringIO()):
+        if prepare:
+            start = time.perf_counter()
+            prepare(queries)
+            batch_seconds = time.perf_counter() - start
+        latencies = []
+        correct = matched = 0
+        for artist, title, album, expected_key in queries:
+            start = time.perf_counter()
+            result = find(artist, title, album)
+            latencies.append((time.perf_counter() - start) * 1000)
+            matched += result is not None
+            correct += is_correct(result, expected_key, tracks)
+
+    return {
+        'engine': engine,
+        'tracks': len(tracks),
+        'queries': len(queries),
+        'build_seconds': round(build_seconds, 3),
+        'rss_mb': round(rss_added, 1),
+        'p50_ms': round(percentile(latencies, 0.50), 4),
+        'p95_ms': round(percentile(latencies, 0.95), 4),
+        'p99_ms': round(percentile(latencies, 0.99), 4),
+        'mean_ms': round((sum(latencies) + batch_seconds * 1000) / len(queries), 4),
+        'matched': matched,
+        'accuracy': round(correct / len(queries), 4),
+    }
+
+
+def print_header():
+    print(f"{'engine':<8} {'tracks':>8} {'build s':>8} {'RSS MB':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'mean ms':>9} {'matched':>8} {'accuracy':>9}")
+
+
+def print_result(result):
+    print(
+        f"{result['engine']:<8} {result['tracks']:>8} {result['build_seconds']:>8.2f} {result['rss_mb']:>8.1f} "
+        f"{result['p50_ms']:>9.3f} {result['p95_ms']:>9.3f} {result['p99_ms']:>9.3f} {result['mean_ms']:>9.3f} "
+        f"{result['matched']:>8} {result['accuracy']:>9.1%}",
+        flush=True
+    )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Scaling microbenchmark of the Plex matching engines on synthetic libraries.")
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES, help="Library sizes in tracks (default: 10000 100000)")
+    parser.add_argument('--engines', nargs='+', choices=ENGINES, default=ENGINES, help="Engines to run (default: all)")
+    parser.add_argument('--queries', type=int, default=DEFAULT_QUERIES, help="Lookups per engine and size (default: 2000)")
+    parser.add_argument('--min-score', type=float, default=DEFAULT_MIN_SCORE, help="Minimum score for the trigram and vector engines (default: 0.8)")
+    parser.add_argument('--seed', type=int, default=0, help="Seed of the synthetic catalog and queries (default: 0)")
+    parser.add_argument('--output', help="Write the results to this JSON file")
+    args = parser.parse_args(argv)
+
+    engines = list(args.engines)
+    if 'vector' in engines:
+        try:
+            import numpy  # noqa: F401
+        except ImportError:
+            print("numpy is not installed; skipping the vector engine.")
+            engines.remove('vector')
+
+    results = []
+    for size in args.sizes:
+        start = time.perf_counter()
+        rss_before = rss_mb()
+        tracks = generate_catalog(size, args.seed)
+        queries = generate_queries(tracks, args.queries, args.seed)
+        print(f"Generated {len(tracks)} tracks and {len(queries)} queries in {time.perf_counter() - start:.1f}s ({rss_mb() - rss_before:.0f} MB).")
+        print_header()
+        for engine in engines:
+            results.append(run_case(engine, tracks, queries, args.min_score))
+            print_result(results[-1])
+            aio.music_library = None
+        print()
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
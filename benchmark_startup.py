@@ -0,0 +1,88 @@
+"""
+benchmark_startup.py
+
+Description:
+    Cold-start benchmark for convert_playlist_aio_plex_spotify_youtube.py.
+    Each measurement runs a fresh Python process that imports the script and loads the client
+    libraries of one pair of services, the way a sync between those two services does. All three
+    libraries loaded together is what every run paid before backends were loaded lazily.
+    It reports the median and minimum over several runs of the whole process wall time (interpreter
+    start included) and of the in-process import time.
+    Network handshakes are not part of this benchmark; with --plex-server-cache a warm start skips the
+    three Plex connection round trips.
+
+Usage:
+    python benchmark_startup.py
+    python benchmark_startup.py --runs 20 --output startup.json
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+SCRIPT_MODULE = 'convert_playlist_aio_plex_spotify_youtube'
+SERVICE_SETS = [
+    ('spotify', 'ytmusic'),
+    ('spotify', 'plex'),
+    ('ytmusic', 'plex'),
+    ('spotify', 'ytmusic', 'plex'),
+]
+DEFAULT_RUNS = 10
+
+# Child process: import the script, load the backends, and print the in-process import time
+CHILD_CODE = f"""
+import sys, time
+start = time.perf_counter()
+import {SCRIPT_MODULE} as aio
+aio.load_backends(set(sys.argv[1:]))
+print(time.perf_counter() - start)
+"""
+
+
+# Start one fresh interpreter; returns (process wall seconds, in-process import seconds)
+def measure(services):
+    start = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, '-c', CHILD_CODE, *services],
+        capture_output=True, text=True, cwd=os.path.dirname(os.path.abspath(__file__))
+    )
+    wall = time.perf_counter() - start
+    if result.returncode:
+        sys.exit(f"Error: loading {', '.join(services)} failed:\n{result.stderr.strip()}")
+    return wall, float(result.stdout.strip().splitlines()[-1])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Cold-start benchmark of the aio playlist sync script.")
+    parser.add_argument('--runs', type=int, default=DEFAULT_RUNS, help="Fresh processes per service set (default: 10)")
+    parser.add_argument('--output', help="Write the results to this JSON file")
+    args = parser.parse_args(argv)
+
+    results = []
+    print(f"{'services':<26} {'process ms':>11} {'min':>8} {'import ms':>10} {'min':>8}")
+    for services in SERVICE_SETS:
+        samples = [measure(services) for _ in range(args.runs)]
+        walls = [wall * 1000 for wall, _ in samples]
+        imports = [seconds * 1000 for _, seconds in samples]
+        results.append({
+            'services': list(services),
+            'process_ms_median': round(statistics.median(walls), 1),
+            'process_ms_min': round(min(walls), 1),
+            'import_ms_median': round(statistics.median(imports), 1),
+            'import_ms_min': round(min(imports), 1),
+        })
+        result = results[-1]
+        print(f"{'+'.join(services):<26} {result['process_ms_median']:>11.1f} {result['process_ms_min']:>8.1f} "
+              f"{result['import_ms_median']:>10.1f} {result['import_ms_min']:>8.1f}", flush=True)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,241 @@
+"""
+benchmark_sync.py
+
+Description:
+    Offline end-to-end benchmark for convert_playlist_aio_plex_spotify_youtube.py.
+    Each sync direction is run against the in-process stand-in services of fake_services.py (no
+    network, no credentials) at several playlist sizes. For every run it reports wall time,
+    tracks/sec, tracks written and API calls per track for each service.
+    With --resync, each case is synced once, one track in the middle of the source playlist is swapped
+    for another, and the sync is run again with --replace; the second run is the one measured (it
+    should only touch the changed entry of the destination playlist).
+    Results can be saved as a baseline; when compared against a baseline, the benchmark exits with
+    status 1 if any direction makes more API calls per track than before (beyond a small tolerance).
+
+Usage:
+    python benchmark_sync.py                                   # all directions at 100, 1k and 10k tracks
+    python benchmark_sync.py --sizes 1000 --directions spotify:plex --extra-args "--plex-index"
+    python benchmark_sync.py --save-baseline benchmark_baseline.json
+    python benchmark_sync.py --baseline benchmark_baseline.json
+    python benchmark_sync.py --resync --sizes 2000                # one-track change re-synced with --replace
+"""
+
+import argparse
+import io
+import json
+import os
+import shlex
+import sys
+import tempfile
+import time
+from contextlib import redirect_stdout
+from types import SimpleNamespace
+
+import convert_playlist_aio_plex_spotify_youtube as aio
+from fake_services import (
+    BENCHMARK_PLAYLIST, CallCounter, Catalog, FakePlexServer, FakeSpotify, FakeSpotifyHTTP, FakeYTMusic
+)
+from sync_workers import MatchCache
+
+DIRECTIONS = [
+    ('spotify', 'plex'), ('spotify', 'ytmusic'),
+    ('ytmusic', 'spotify'), ('ytmusic', 'plex'),
+    ('plex', 'spotify'), ('plex', 'ytmusic'),
+]
+DEFAULT_SIZES = [100, 1000, 10000]
+
+# The stand-in library holds this many songs per playlist track (the rest are never matched)
+LIBRARY_FACTOR = 2
+
+# Allowed relative increase in API calls per track before a run counts as a regression
+DEFAULT_TOLERANCE = 0.05
+
+SOURCE_URLS = {
+    'spotify': 'https://open.spotify.com/playlist/bench',
+    'ytmusic': 'https://music.youtube.com/playlist?list=bench',
+}
+
+
+# SessionFactory stand-in: the raw Spotify Web API session is the fake, other services need none
+class FakeSessionFactory:
+    def __init__(self, spotify_http):
+        self.spotify_http = spotify_http
+
+    def get(self, service):
+        return self.spotify_http if service == 'spotify' else None
+
+    def print_stats(self):
+        pass
+
+    def close(self):
+        pass
+
+
+# Run the sync script once; returns (error message or None, seconds)
+def sync_once(argv):
+    error = None
+    start = time.perf_counter()
+    with redirect_stdout(io.StringIO()):
+        try:
+            aio.main(argv)
+        except SystemExit as e:
+            error = str(e.code) if e.code else None
+    return error, time.perf_counter() - start
+
+
+# Swap the track in the middle of the source playlist for a song not in the playlist
+def change_source_track(source, catalog, ytmusic, plex):
+    position = len(catalog.playlist) // 2
+    song = catalog.songs[len(catalog.playlist)]
+    catalog.playlist[position] = song
+    if source == 'ytmusic':
+        ytmusic.playlists['bench']['tracks'][position] = song.video_id
+    elif source == 'plex':
+        # The source playlist is the first one on the server (the destination may have the same name)
+        plex.playlist_list[0].item_list[position] = plex.music.by_rating_key[song.rating_key]
+
+
+# Run one sync direction at one playlist size and return its measurements
+def run_case(source, destination, size, workers=1, latency=0.0, extra_args=(), resync=False):
+    catalog = Catalog(size * LIBRARY_FACTOR, size)
+    counter = CallCounter(latency)
+    spotify = FakeSpotify(catalog, counter)
+    spotify_http = FakeSpotifyHTTP(catalog, counter, spotify)
+    ytmusic = FakeYTMusic(catalog, counter)
+    plex = FakePlexServer(catalog, counter, source_playlist=(source == 'plex'))
+
+    # Swap the service clients the script constructs for the stand-ins, and start from cold caches
+    aio.SessionFactory = lambda *args, **kwargs: FakeSessionFactory(spotify_http)
+    aio.spotipy = SimpleNamespace(Spotify=lambda *args, **kwargs: spotify)
+    aio.YTMusic = lambda *args, **kwargs: ytmusic
+    aio.PlexServer = lambda *args, **kwargs: plex
+    aio.match_cache = MatchCache()
+    aio.sync_states.clear()
+    aio.reset_services()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        cookies_path = os.path.join(tmp, 'cookies.txt')
+        with open(cookies_path, 'w') as f:
+            f.write("# Netscape HTTP Cookie File\n")
+        argv = [
+            '--source-service', source, '--destination-service', destination,
+            '--playlist-name', BENCHMARK_PLAYLIST,
+            '--cookies-path', cookies_path, '--spotify-token-cache', os.path.join(tmp, 'token.json'),
+            '--yt-oauth-json', os.path.join(tmp, 'oauth.json'),
+            '--plex-url', 'http://plex.invalid:32400', '--plex-token', 'benchmark',
+            '--spotify-rate', '0', '--ytmusic-rate', '0', '--plex-rate', '0',
+            '--workers', str(workers),
+            '--track-identities', os.path.join(tmp, 'track_identities.db'),
+        ]
+        if source in SOURCE_URLS:
+            argv += ['--playlist-url', SOURCE_URLS[source]]
+        argv += [arg.replace('{tmp}', tmp) for arg in extra_args]
+
+        if resync:
+            # Initial sync (not measured), then re-sync the changed playlist from cold caches
+            error, _ = sync_once(argv)
+            change_source_track(source, catalog, ytmusic, plex)
+            counter.counts.clear()
+            aio.match_cache = MatchCache()
+            aio.reset_services()
+            argv += ['--replace']
+        error, elapsed = sync_once(argv)
+        for store in aio.identity_stores.values():
+            store.close()
+        aio.identity_stores.clear()
+
+    calls = counter.by_service()
+    written = {'spotify': spotify.written, 'ytmusic': ytmusic.written, 'plex': plex.written}[destination]()
+    return {
+        'direction': f"{source}->{destination}" + (" resync" if resync else ""),
+        'tracks': size,
+        'seconds': round(elapsed, 3),
+        'tracks_per_sec': round(size / elapsed, 1) if elapsed else None,
+        'written': written,
+        'error': error,
+        'calls': calls,
+        'calls_per_track': {service: round(count / size, 4) for service, count in sorted(calls.items())},
+        'endpoints': {f"{service}.{endpoint}": count for (service, endpoint), count in sorted(counter.counts.items())},
+    }
+
+
+def result_key(result):
+    return f"{result['direction']}@{result['tracks']}"
+
+
+def print_header():
+    print(f"{'direction':<24} {'tracks':>7} {'written':>7} {'seconds':>9} {'tracks/s':>10}  calls per track")
+
+
+def print_result(result):
+    calls = ', '.join(f"{service} {value:.2f}" for service, value in result['calls_per_track'].items())
+    line = f"{result['direction']:<24} {result['tracks']:>7} {result['written']:>7} {result['seconds']:>9.2f} {result['tracks_per_sec'] or 0:>10.1f}  {calls}"
+    if result['error']:
+        line += f"  (error: {result['error']})"
+    print(line, flush=True)
+
+
+# Runs whose calls per track (for any service) grew by more than the tolerance over the baseline
+def find_regressions(results, baseline, tolerance=DEFAULT_TOLERANCE):
+    regressions = []
+    for result in results:
+        expected = baseline.get(result_key(result))
+        if expected is None:
+            continue
+        for service, value in result['calls_per_track'].items():
+            previous = expected.get(service, 0.0)
+            if value > previous * (1 + tolerance) + 1e-9:
+                regressions.append(f"{result_key(result)} {service}: {previous:.4f} -> {value:.4f} calls per track")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Offline benchmark of the aio playlist sync against stand-in services.")
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES, help="Playlist sizes to run (default: 100 1000 10000)")
+    parser.add_argument('--directions', nargs='+', help="Directions to run as source:destination (default: all six)")
+    parser.add_argument('--workers', type=int, default=1, help="Value passed to --workers (default: 1)")
+    parser.add_argument('--latency', type=float, default=0.0, help="Simulated latency per API call in milliseconds (default: 0)")
+    parser.add_argument('--extra-args', default='', help="Extra arguments for the sync script, e.g. \"--plex-index\" ({tmp} expands to a scratch directory)")
+    parser.add_argument('--resync', action='store_true', help="Measure a --replace re-sync after one source track changed, instead of the initial sync")
+    parser.add_argument('--output', help="Write the full results (including per-endpoint call counts) to this JSON file")
+    parser.add_argument('--baseline', help="Baseline JSON to compare calls per track against; exit 1 on regression")
+    parser.add_argument('--save-baseline', help="Write the calls per track of this run as a baseline JSON file")
+    parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE, help="Allowed relative increase in calls per track (default: 0.05)")
+    args = parser.parse_args(argv)
+
+    directions = [tuple(direction.split(':')) for direction in args.directions] if args.directions else DIRECTIONS
+    extra_args = shlex.split(args.extra_args)
+    results = []
+    print_header()
+    for source, destination in directions:
+        for size in args.sizes:
+            results.append(run_case(source, destination, size, args.workers, args.latency / 1000, extra_args, args.resync))
+            print_result(results[-1])
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+    if args.save_baseline:
+        with open(args.save_baseline, 'w') as f:
+            json.dump({result_key(result): result['calls_per_track'] for result in results}, f, indent=2, sort_keys=True)
+            f.write('\n')
+        print(f"Baseline saved to {args.save_baseline}.")
+
+    failed = [result_key(result) for result in results if result['error']]
+    if failed:
+        print(f"Failed runs: {', '.join(failed)}")
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = find_regressions(results, json.load(f), args.tolerance)
+        if regressions:
+            print("API calls per track regressed:")
+            for regression in regressions:
+                print(f"  {regression}")
+            sys.exit(1)
+        print("No regression in API calls per track.")
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,161 @@
 import tkinter as tk
-from tkinter import filedialog, messagebox
-import subprocess
+from tkinter import filedialog, messagebox, ttk
+import json
+import os
+import queue
 import threading
+import time
+from sync_engine import SyncEngine
+
+# Syncs run in this process, so clients, authentication and the Plex index stay warm between runs
+engine = SyncEngine()
+
+# Connection settings remembered between sessions, so the clients can be warmed up as soon as the window opens.
+# The Plex token is only stored when "Remember token" is ticked; the file is readable by its owner only.
+SETTINGS_PATH = os.path.join(os.path.expanduser('~'), '.cache', 'playlist-sync', 'gui_settings.json')
+SETTINGS_FIELDS = ['cookies_path', 'oauth_path', 'plex_url', 'plex_token']
+
+def load_settings():
+    try:
+        with open(SETTINGS_PATH) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def save_settings():
+    settings = {
+        'cookies_path': cookies_entry.get(),
+        'oauth_path': oauth_entry.get(),
+        'plex_url': plex_url_entry.get(),
+    }
+    if remember_token_var.get():
+        settings['plex_token'] = plex_token_entry.get()
+    tmp_path = f"{SETTINGS_PATH}.tmp"
+    try:
+        os.makedirs(os.path.dirname(SETTINGS_PATH), exist_ok=True)
+        fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, 'w') as f:
+            json.dump(settings, f)
+        os.replace(tmp_path, SETTINGS_PATH)
+    except OSError:
+        pass
+
+# Arguments shared by runs and warm-ups: the services and their connection settings.
+# The Plex library index is always used, since it stays in memory between runs.
+def connection_args():
+    args = [
+        "--source-service", source_var.get(),
+        "--destination-service", destination_var.get(),
+        "--plex-index",
+    ]
+    if cookies_entry.get():
+        args.extend(["--cookies-path", cookies_entry.get()])
+    if oauth_entry.get():
+        args.extend(["--yt-oauth-json", oauth_entry.get()])
+    if plex_url_entry.get():
+        args.extend(["--plex-url", plex_url_entry.get()])
+    if plex_token_entry.get():
+        args.extend(["--plex-token", plex_token_entry.get()])
+    if verbose_var.get():
+        args.append("--verbose")
+    return args
+
+# Whether the connection settings of both selected services are filled in
+def services_configured():
+    required = {
+        'spotify': [cookies_entry],
+        'ytmusic': [oauth_entry],
+        'plex': [plex_url_entry, plex_token_entry],
+    }
+    services = {source_var.get(), destination_var.get()}
+    return len(services) == 2 and all(entry.get() for service in services for entry in required[service])
+
+# Connect, authenticate and build the Plex index in the background, so the next run starts matching immediately
+def warm_up(*_):
+    if not services_configured():
+        return
+    engine.warm_up(connection_args(), output=append_output,
+                   done=lambda ok: append_output("Services ready.\n" if ok else "Warm-up failed; the next run will retry.\n"))
+
+# Output and progress of runs and warm-ups are queued by the worker threads (Tk widgets may only be used
+# from the main thread) and drawn by the Tk main loop in batches
+output_queue = queue.Queue()
+OUTPUT_POLL_MS = 100
+MAX_EVENTS_PER_POLL = 10000
+MAX_LOG_LINES = 2000  # The log keeps only the most recent lines
+
+# Time the current run started matching (for tracks/sec and the ETA)
+matching_started = None
+
+def append_output(text):
+    output_queue.put(('log', text))
+
+def update_progress(processed, matched, total):
+    output_queue.put(('progress', (processed, matched, total, time.monotonic())))
+
+# Draw everything queued since the last poll: one insert for the log, and only the latest progress report
+def drain_output():
+    chunks = []
+    progress = None
+    try:
+        for _ in range(MAX_EVENTS_PER_POLL):
+            kind, value = output_queue.get_nowait()
+            if kind == 'progress':
+                progress = value
+            else:
+                chunks.append(value)
+    except queue.Empty:
+        pass
+    if chunks:
+        write_log(''.join(chunks))
+    if progress:
+        show_progress(*progress)
+    root.after(OUTPUT_POLL_MS, drain_output)
+
+def write_log(text):
+    lines = text.splitlines(keepends=True)
+    if len(lines) > MAX_LOG_LINES:
+        text = ''.join(lines[-MAX_LOG_LINES:])
+    output_text.insert(tk.END, text)
+    # Drop the oldest lines beyond the cap
+    line_count = int(output_text.index('end-1c').split('.')[0])
+    if line_count > MAX_LOG_LINES:
+        output_text.delete('1.0', f'{line_count - MAX_LOG_LINES + 1}.0')
+    output_text.see(tk.END)  # Scroll to the end of the output
+
+def format_duration(seconds):
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours}:{minutes:02d}:{seconds:02d}" if hours else f"{minutes}:{seconds:02d}"
+
+def show_progress(processed, matched, total, at):
+    global matching_started
+    if processed == 0 or matching_started is None:
+        matching_started = at
+    elapsed = at - matching_started
+    rate = processed / elapsed if elapsed > 0 else 0.0
+    if total is not None:
+        progress_bar.configure(mode='determinate', maximum=max(total, 1), value=processed)
+        eta = format_duration((total - processed) / rate) if rate else "--"
+        counts = f"{processed}/{total}"
+    else:
+        # Streamed source playlist: the total is not known until it has been read completely
+        progress_bar.configure(mode='indeterminate')
+        progress_bar.step()
+        eta = "unknown"
+        counts = f"{processed}"
+    progress_label.configure(text=f"{counts} tracks processed, {matched} matched - {rate:.1f} tracks/s - ETA {eta}")
+
+def reset_progress():
+    global matching_started
+    matching_started = None
+    progress_bar.configure(mode='determinate', value=0)
+    progress_label.configure(text="")
 
 def run_script():
-    # Clear the output console
+    # Clear the output console and the progress bar
     output_text.delete("1.0", tk.END)
+    reset_progress()
     
     # Collect user inputs
     source_service = source_var.get()
@@ -14,18 +164,9 @@ def run_script():
     playlist_name = name_entry.get()
     append_replace = append_replace_var.get()
     unmatched_output = unmatched_output_entry.get()
-    verbose = verbose_var.get()
-    cookies_path = cookies_entry.get()
-    oauth_path = oauth_entry.get()
-    plex_url = plex_url_entry.get()
-    plex_token = plex_token_entry.get()
-
-    # Build command list
-    command = [
-        "python", "convert_playlist_aio_plex_spotify_youtube.py",
-        "--source-service", source_service,
-        "--destination-service", destination_service,
-    ]
+
+    # Build the argument list
+    command = connection_args()
     if playlist_url:
         command.extend(["--playlist-url", playlist_url])
     if playlist_name:
@@ -34,37 +175,18 @@ def run_script():
         command.append("--append" if append_replace == "Append" else "--replace")
     if unmatched_output:
         command.extend(["--unmatched-output", unmatched_output])
-    if verbose:
-        command.append("--verbose")
-    if cookies_path:
-        command.extend(["--cookies-path", cookies_path])
-    if oauth_path:
-        command.extend(["--yt-oauth-json", oauth_path])
-    if plex_url:
-        command.extend(["--plex-url", plex_url])
-    if plex_token:
-        command.extend(["--plex-token", plex_token])
-
-    # Run the command in a separate thread to keep GUI responsive
-    thread = threading.Thread(target=execute_command, args=(command,))
+    save_settings()
+
+    # Run the sync in a separate thread to keep GUI responsive
+    thread = threading.Thread(target=execute_command, args=(command,), daemon=True)
     thread.start()
 
 def execute_command(command):
-    # Run the command and capture output
-    process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
-    
-    # Continuously read and display the output in the Text widget
-    for line in process.stdout:
-        output_text.insert(tk.END, line)
-        output_text.see(tk.END)  # Scroll to the end of the output
-        root.update_idletasks()  # Refresh the GUI window
-    
-    process.stdout.close()
-    process.wait()
-    if process.returncode == 0:
-        output_text.insert(tk.END, "\nScript completed successfully!\n")
+    # Run the sync in this process (waits for a warm-up in progress) and display its output in the Text widget
+    if engine.run(command, output=append_output, progress=update_progress):
+        append_output("\nScript completed successfully!\n")
     else:
-        output_text.insert(tk.END, "\nScript encountered an error.\n")
+        append_output("\nScript encountered an error.\n")
 
 def browse_file(entry_field):
     file_path = filedialog.askopenfilename()
@@ -140,14 +262,33 @@ plex_url_entry.grid(row=9, column=1, sticky="w", padx=5, pady=5)
 tk.Label(root, text="Plex Token:").grid(row=10, column=0, sticky="e", padx=5, pady=5)
 plex_token_entry = tk.Entry(root, width=40)
 plex_token_entry.grid(row=10, column=1, sticky="w", padx=5, pady=5)
+remember_token_var = tk.BooleanVar()
+remember_token_check = tk.Checkbutton(root, text="Remember token", variable=remember_token_var)
+remember_token_check.grid(row=10, column=2, sticky="w", padx=5, pady=5)
 
 # Output Console
 output_text = tk.Text(root, wrap="word", height=10)
 output_text.grid(row=11, column=0, columnspan=3, padx=5, pady=5)
 
+# Progress Bar (tracks matched, tracks/sec and ETA)
+progress_bar = ttk.Progressbar(root, orient="horizontal", mode="determinate")
+progress_bar.grid(row=12, column=0, columnspan=3, sticky="ew", padx=5, pady=5)
+progress_label = tk.Label(root, text="")
+progress_label.grid(row=13, column=0, columnspan=3, padx=5)
+
 # Run Button
 run_button = tk.Button(root, text="Run Script", command=run_script)
-run_button.grid(row=12, column=1, pady=20)
+run_button.grid(row=14, column=1, pady=20)
+
+# Restore the remembered connection settings and warm up the selected services
+settings = load_settings()
+for field, entry in zip(SETTINGS_FIELDS, [cookies_entry, oauth_entry, plex_url_entry, plex_token_entry]):
+    entry.insert(0, settings.get(field, ''))
+remember_token_var.set('plex_token' in settings)
+source_var.trace_add('write', warm_up)
+destination_var.trace_add('write', warm_up)
+root.after(0, warm_up)
+root.after(OUTPUT_POLL_MS, drain_output)
 
 # Start GUI loop
 root.mainloop()
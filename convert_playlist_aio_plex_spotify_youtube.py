@@ -19,124 +19,410 @@ Library Requirements:
 
     To install these dependencies, run:
         pip install requests spotipy ytmusicapi plexapi
+
+    Only the libraries of the services a run uses are imported (see load_backends()).
 """
 
-import requests
-import spotipy
-from spotipy.oauth2 import SpotifyOAuth
-from ytmusicapi import YTMusic
-from plexapi.server import PlexServer
-from http.cookiejar import MozillaCookieJar
+import time
+
+# Start of the module import, for the startup time reported by --profile
+IMPORT_STARTED = time.perf_counter()
+
+from sync_workers import TokenBucket, MatchCache, match_tracks
+from spotify_api import SpotifyTokenManager, get_spotify_playlist_items, get_spotify_playlist_track_ids, get_spotify_playlist_snapshot_id, DEFAULT_FETCH_WORKERS
+from ytmusic_api import iter_youtube_playlist_items
+from playlist_writer import BatchedPlaylistWriter, SPOTIFY_BATCH_SIZE, YTMUSIC_BATCH_SIZE, PLEX_BATCH_SIZE, DEFAULT_FLUSH_INTERVAL
+from playlist_diff import DiffPlaylistWriter, update_spotify_playlist, update_youtube_playlist, update_plex_playlist, plan_removals, remove_plex_entries, batches
+from playlist_resolver import spotify_resolver, youtube_resolver, plex_resolver
+from sync_state import SyncState, track_key, fingerprint_keys, sync_key
+from track_identity import TrackIdentityStore, CONFIDENCE_LEVELS, DEFAULT_MIN_CONFIDENCE, DEFAULT_TRACK_IDENTITIES
+from http_sessions import SessionFactory
+from api_metrics import api_metrics
+from retry_policy import RetryPolicy
+from phase_profiler import PhaseProfiler
 import argparse
+import json
+import os
 import sys
 import csv
 import re
-import time
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+IMPORT_FINISHED = time.perf_counter()
+
+# Same defaults as plex_server_cache.py (not imported unless Plex is used)
+DEFAULT_PLEX_SERVER_CACHE = os.path.join(os.path.expanduser('~'), '.cache', 'playlist-sync', 'plex_server.json')
+DEFAULT_PLEX_SERVER_CACHE_TTL = 24 * 3600
+
+# Command-line arguments (also the keys allowed in --manifest jobs)
+def build_parser():
+    parser = argparse.ArgumentParser(description="Sync playlists between Spotify, YouTube Music, and Plex.")
+    parser.add_argument('--source-service', choices=['plex', 'spotify', 'ytmusic'], help="Source service: Spotify or YouTube Music (required unless --manifest is used)")
+    parser.add_argument('--destination-service', choices=['plex', 'spotify', 'ytmusic'], help="Destination service: Plex, Spotify, or YouTube Music (required unless --manifest is used)")
+    parser.add_argument('--playlist-url', help="URL of the source playlist")
+    parser.add_argument('--cookies-path', help="Path to cookies.txt file (for Spotify)")
+    parser.add_argument('--spotify-token-cache', help="File to cache the Spotify access token in between runs (default: <cookies-path>.token.json)")
+    parser.add_argument('--yt-oauth-json', help="Path to YouTube Music OAuth JSON file")
+    parser.add_argument('--plex-url', help="Plex server URL")
+    parser.add_argument('--plex-token', help="Plex authentication token")
+    parser.add_argument('--plex-library', default='Music', help="Plex library section name (default: Music)")
+    parser.add_argument('--playlist-name', help="Name for the destination playlist")
+    parser.add_argument('--append', action='store_true', help="Append to existing playlist if it exists")
+    parser.add_argument('--replace', action='store_true', help="Replace the existing playlist if it exists")
+    parser.add_argument('--unmatched-output', help="File to save unmatched track details")
+    parser.add_argument('--unmatched-format', choices=['text', 'csv'], default='text', help="Format of unmatched output file")
+    parser.add_argument('--force-album-match', choices=['exact', 'fuzzy'], help="Enforce exact or fuzzy album match for track matching")
+    parser.add_argument('--plex-index', action='store_true', help="Prefetch the whole Plex library section into an in-memory index for track matching")
+    parser.add_argument('--plex-index-cache', help="SQLite file to persist the Plex library index in and refresh incrementally (implies --plex-index)")
+    parser.add_argument('--min-score', type=float, help="Fall back to approximate (trigram) matching in Plex, accepting the best match scoring at least this (0-1, e.g. 0.8; implies --plex-index)")
+    parser.add_argument('--match-engine', choices=['trigram', 'vector'], default='trigram', help="Engine for --min-score matching: per-track trigram index, or NumPy batch scoring of the whole playlist (requires numpy; default: trigram)")
+    parser.add_argument('--workers', type=int, default=1, help="Number of tracks to match in parallel (default: 1)")
+    parser.add_argument('--spotify-rate', type=float, default=10, help="Max Spotify API requests per second across all workers (default: 10, 0 disables)")
+    parser.add_argument('--ytmusic-rate', type=float, default=5, help="Max YouTube Music requests per second across all workers (default: 5, 0 disables)")
+    parser.add_argument('--plex-rate', type=float, default=20, help="Max Plex server requests per second across all workers (default: 20, 0 disables)")
+    parser.add_argument('--flush-interval', type=float, default=DEFAULT_FLUSH_INTERVAL, help=f"Seconds a matched track may wait before a partial batch is written to the destination (default: {DEFAULT_FLUSH_INTERVAL})")
+    parser.add_argument('--sync-state', help="SQLite file recording source playlist fingerprints; reruns skip unchanged playlists and only sync added/removed tracks")
+    parser.add_argument('--track-identities', default=DEFAULT_TRACK_IDENTITIES, help="SQLite file linking the Spotify, YouTube Music and Plex IDs of tracks matched by earlier syncs in any direction; known tracks are resolved without searching (default: ~/.cache/playlist-sync/track_identities.db, empty string disables)")
+    parser.add_argument('--identity-min-confidence', choices=CONFIDENCE_LEVELS, default=DEFAULT_MIN_CONFIDENCE, help=f"Lowest confidence of a stored link that is reused instead of searching: fuzzy, search, exact or manual (default: {DEFAULT_MIN_CONFIDENCE})")
+    parser.add_argument('--manifest', help="JSON file listing many sync jobs to run in one process, sharing clients, the Plex index and match caches")
+    parser.add_argument('--max-jobs', type=int, default=2, help="Number of manifest jobs to run concurrently (default: 2)")
+    parser.add_argument('--watch', action='store_true', help="Keep running and re-sync each source playlist whenever its fingerprint changes")
+    parser.add_argument('--poll-interval', type=float, default=300, help="Watch mode: seconds between polls of a playlist that just changed (default: 300)")
+    parser.add_argument('--max-poll-interval', type=float, default=3600, help="Watch mode: upper bound the poll interval backs off to for unchanged playlists (default: 3600)")
+    parser.add_argument('--index-refresh-interval', type=float, default=3600, help="Watch mode (and in-process runs from the GUI): seconds between Plex library index refreshes (default: 3600)")
+    parser.add_argument('--metrics-output', help="Write per-endpoint API call counts, errors and latency histograms to this file at exit (after every poll round in watch mode)")
+    parser.add_argument('--metrics-format', choices=['json', 'prometheus'], default='json', help="Format of --metrics-output: JSON summary or Prometheus textfile (default: json)")
+    parser.add_argument('--plex-server-cache', default=DEFAULT_PLEX_SERVER_CACHE, help="File caching the Plex server identity and library sections, so warm starts skip the connection handshake (default: ~/.cache/playlist-sync/plex_server.json)")
+    parser.add_argument('--plex-server-cache-ttl', type=float, default=DEFAULT_PLEX_SERVER_CACHE_TTL, help="Seconds a cached Plex handshake stays valid (default: 86400, 0 disables the cache)")
+    parser.add_argument('--profile', action='store_true', help="Print the time spent in each phase of the run (startup, auth, plex index, source fetch, matching, destination write, unmatched report) at exit")
+    parser.add_argument('--profile-dir', help="Also capture a cProfile profile per phase and dump it as <phase>.pstats into this directory (implies --profile)")
+    parser.add_argument('--verbose', '-v', action='store_true', help="Enable verbose output for debugging")
+    return parser
+
+# Service client libraries, imported by load_backends() for the services a run uses
+spotipy = None
+YTMusic = None
+PlexServer = None
+
+# Service clients, Plex index and caches; set up once by init_services() and shared by every sync job in the process
+spotify = None
+spotify_tokens = None
+ytmusic = None
+plex = None
+music_library = None
+plex_index = None
+match_cache = MatchCache()
+
+# Name -> playlist indexes of each service's playlists (playlist_resolver.py), set up with the clients
+spotify_playlists = None
+ytmusic_playlists = None
+plex_playlists = None
+http_sessions = SessionFactory()
+
+# Per-service rate limiters shared by all matching workers (and all concurrent jobs)
+spotify_limiter = TokenBucket(0)
+ytmusic_limiter = TokenBucket(0)
+plex_limiter = TokenBucket(0)
+
+# Per-service retry policies wrapping the limiters above; searches, reads and writes all go through them
+spotify_retry = RetryPolicy('Spotify', spotify_limiter)
+ytmusic_retry = RetryPolicy('YouTube Music', ytmusic_limiter)
+plex_retry = RetryPolicy('Plex', plex_limiter)
+
+# Phase timings of the run (reported with --profile)
+profiler = PhaseProfiler()
+
+# Progress hook for programs that embed the script (the GUI sets it through SyncEngine): called as
+# progress_callback(processed, matched, total) from the matching loop after each track.
+# total is None when the source playlist is streamed (YouTube Music) and its length is not known yet.
+progress_callback = None
+
+# Pass match results through, reporting progress to progress_callback (a result counts as matched if it is set)
+def report_progress(results, tracks):
+    callback = progress_callback
+    if callback is None:
+        yield from results
+        return
+    total = len(tracks) if isinstance(tracks, list) else None
+    processed = matched = 0
+    callback(processed, matched, total)
+    for track, result in results:
+        processed += 1
+        matched += bool(result)
+        callback(processed, matched, total)
+        yield track, result
+
+# Import the client library of each service in use (spotipy, ytmusicapi, plexapi are slow to import);
+# a backend that is already set (e.g. replaced by a stand-in) is left alone
+def load_backends(services):
+    global spotipy, YTMusic, PlexServer
+    if 'spotify' in services and spotipy is None:
+        import spotipy
+    if 'ytmusic' in services and YTMusic is None:
+        from ytmusicapi import YTMusic
+    if 'plex' in services and PlexServer is None:
+        from plex_server_cache import CachedPlexServer as PlexServer
 
-# Parse command-line arguments
-parser = argparse.ArgumentParser(description="Sync playlists between Spotify, YouTube Music, and Plex.")
-parser.add_argument('--source-service', choices=['plex', 'spotify', 'ytmusic'], required=True, help="Source service: Spotify or YouTube Music")
-parser.add_argument('--destination-service', choices=['plex', 'spotify', 'ytmusic'], required=True, help="Destination service: Plex, Spotify, or YouTube Music")
-parser.add_argument('--playlist-url', help="URL of the source playlist")
-parser.add_argument('--cookies-path', help="Path to cookies.txt file (for Spotify)")
-parser.add_argument('--yt-oauth-json', help="Path to YouTube Music OAuth JSON file")
-parser.add_argument('--plex-url', help="Plex server URL")
-parser.add_argument('--plex-token', help="Plex authentication token")
-parser.add_argument('--plex-library', default='Music', help="Plex library section name (default: Music)")
-parser.add_argument('--playlist-name', help="Name for the destination playlist")
-parser.add_argument('--append', action='store_true', help="Append to existing playlist if it exists")
-parser.add_argument('--replace', action='store_true', help="Replace the existing playlist if it exists")
-parser.add_argument('--unmatched-output', help="File to save unmatched track details")
-parser.add_argument('--unmatched-format', choices=['text', 'csv'], default='text', help="Format of unmatched output file")
-parser.add_argument('--force-album-match', choices=['exact', 'fuzzy'], help="Enforce exact or fuzzy album match for track matching")
-parser.add_argument('--verbose', '-v', action='store_true', help="Enable verbose output for debugging")
-args = parser.parse_args()
-
-# Initialize services based on source and destination
-ytmusic = YTMusic(args.yt_oauth_json) if 'ytmusic' in [args.source_service, args.destination_service] else None
-plex = PlexServer(args.plex_url, args.plex_token) if 'plex' in [args.source_service, args.destination_service] else None
-music_library = plex.library.section(args.plex_library) if 'plex' in [args.source_service, args.destination_service] else None
-
-# Spotify authentication
-def spotify_authenticate(cookies_path):
+# Spotify authentication: the access token is cached on disk with its expiry and reused across runs,
+# and refreshed transparently when it is about to expire or the API answers 401
+def spotify_authenticate(cookies_path, args):
     if not cookies_path:
         sys.exit("Error: Cookies path is required for Spotify authentication.")
-    # Proceed with authentication
-    token_url = 'https://open.spotify.com/get_access_token'
-    cookie_jar = MozillaCookieJar(cookies_path)
-    cookie_jar.load(ignore_discard=True, ignore_expires=True)
-    response = requests.get(token_url, cookies=cookie_jar)
-    if response.status_code == 200:
-        return response.json().get('accessToken')
+    token_manager = SpotifyTokenManager(cookies_path, args.spotify_token_cache, session=http_sessions.get('spotify'))
+    if not token_manager.get_access_token():
+        sys.exit("Error: Unable to retrieve Spotify access token.")
+    return token_manager
+
+# Connect to the Plex server and resolve the music section. With --plex-server-cache the connection
+# handshake (server identity, library sections) comes from the cache on a warm start, costing no round trips.
+def connect_plex(args):
+    from plex_server_cache import HandshakeCache
+    cache = None
+    if args.plex_server_cache and args.plex_server_cache_ttl > 0:
+        cache = HandshakeCache(args.plex_server_cache, args.plex_url, args.plex_token, args.plex_server_cache_ttl)
+    server = PlexServer(args.plex_url, args.plex_token, session=http_sessions.get('plex'), cache=cache)
+    try:
+        section = plex_retry.call(server.library.section, args.plex_library)
+    except Exception:
+        if not server.handshake_cached:
+            raise
+        # The cached handshake may be stale (e.g. the section was renamed): connect live instead
+        server.invalidate_handshake()
+        server = PlexServer(args.plex_url, args.plex_token, session=http_sessions.get('plex'), cache=cache)
+        section = plex_retry.call(server.library.section, args.plex_library)
+    server.save_handshake()
+    if args.verbose:
+        print(f"Connected to Plex library '{section.title}' ({'cached' if server.handshake_cached else 'live'} handshake).")
+    return server, section
+
+# Optionally prefetch the whole Plex music section into an in-memory index (backed by an on-disk snapshot if requested)
+def build_plex_index(args):
+    from plex_library_index import PlexLibraryIndex, load_snapshot_index
+    if args.plex_index_cache:
+        index = load_snapshot_index(music_library, args.plex_index_cache, verbose=args.verbose, retry=plex_retry)
+    elif args.plex_index or args.min_score is not None:
+        index = PlexLibraryIndex.from_section(music_library, verbose=args.verbose, retry=plex_retry)
     else:
-        sys.exit(f"Failed to retrieve Spotify access token: {response.status_code} - {response.text}")
+        return None
+    if args.min_score is not None and args.match_engine == 'vector':
+        try:
+            from vector_matcher import VectorMatcher
+        except ImportError:
+            sys.exit("Error: --match-engine vector requires numpy (pip install numpy).")
+        VectorMatcher(index, verbose=args.verbose)
+    return index
+
+# Options the service clients, limiters and Plex index depend on; clients set up with the same values are reused
+SERVICE_SETTINGS = [
+    'cookies_path', 'spotify_token_cache', 'yt_oauth_json', 'plex_url', 'plex_token', 'plex_library',
+    'plex_index', 'plex_index_cache', 'min_score', 'match_engine', 'plex_server_cache', 'plex_server_cache_ttl',
+    'workers', 'max_jobs', 'spotify_rate', 'ytmusic_rate', 'plex_rate',
+]
+service_settings = None
+plex_index_built = 0.0
+
+# Initialize the services used as a source or destination by any of the jobs
+# (services is a list of (source_service, destination_service) pairs).
+# Clients, sessions and the Plex index already set up by an earlier call with the same settings are kept
+# (the in-process API of sync_engine.py calls this before every run); only missing ones are created.
+def init_services(args, services):
+    global spotify, spotify_tokens, ytmusic, plex, music_library, plex_index, plex_index_built
+    global spotify_playlists, ytmusic_playlists, plex_playlists
+    global spotify_limiter, ytmusic_limiter, plex_limiter, http_sessions
+    global spotify_retry, ytmusic_retry, plex_retry, service_settings
+    used = set(service for pair in services for service in pair)
+    destinations = set(destination for _, destination in services)
+    profiler.call('startup', load_backends, used)
+
+    settings = [getattr(args, name) for name in SERVICE_SETTINGS]
+    if settings != service_settings:
+        # One keep-alive session per service, shared by all its clients and sized for every thread that
+        # may call it at once (matching workers of each concurrent job, or the parallel page fetches)
+        concurrent_jobs = min(len(services), max(1, args.max_jobs))
+        http_sessions.close()
+        http_sessions = SessionFactory(max(args.workers * concurrent_jobs, DEFAULT_FETCH_WORKERS))
+
+        spotify_limiter = TokenBucket(args.spotify_rate)
+        ytmusic_limiter = TokenBucket(args.ytmusic_rate)
+        plex_limiter = TokenBucket(args.plex_rate)
+        spotify_retry = RetryPolicy('Spotify', spotify_limiter, verbose=args.verbose)
+        ytmusic_retry = RetryPolicy('YouTube Music', ytmusic_limiter, verbose=args.verbose)
+        plex_retry = RetryPolicy('Plex', plex_limiter, verbose=args.verbose)
+        spotify = spotify_tokens = ytmusic = plex = music_library = plex_index = None
+        match_cache.clear()
+        service_settings = settings
+    # Verbosity is not a service setting (toggling it must not reconnect anything), so apply it to the kept policies
+    for retry in (spotify_retry, ytmusic_retry, plex_retry):
+        retry.verbose = args.verbose
+
+    if 'ytmusic' in used and not ytmusic:
+        ytmusic = YTMusic(args.yt_oauth_json, requests_session=http_sessions.get('ytmusic'))
+        ytmusic_playlists = youtube_resolver(ytmusic, retry=ytmusic_retry)
+    if 'plex' in used and not plex:
+        plex, music_library = connect_plex(args)
+        plex_playlists = plex_resolver(plex, retry=plex_retry)
 
+    # Rebuild an index older than --index-refresh-interval, so a long-lived process picks up library changes
+    if plex_index and time.time() - plex_index_built >= args.index_refresh_interval:
+        plex_index = None
+        match_cache.clear()
+    if 'plex' in destinations and not plex_index:
+        plex_index = profiler.call('plex index', build_plex_index, args)
+        plex_index_built = time.time()
 
-spotify_access_token = spotify_authenticate(args.cookies_path) if 'spotify' in [args.source_service, args.destination_service] else None
-spotify = spotipy.Spotify(auth=spotify_access_token) if spotify_access_token else None
+    if 'spotify' in used and not spotify:
+        spotify_tokens = spotify_authenticate(args.cookies_path, args)
+        spotify = spotipy.Spotify(auth_manager=spotify_tokens, requests_session=http_sessions.get('spotify'))
+        spotify_playlists = spotify_resolver(spotify, retry=spotify_retry, tokens=spotify_tokens)
 
-# Function to retrieve YouTube Music playlist tracks
-def get_youtube_playlist_tracks(yt_playlist_url):
+# Stable IDs a track record can carry besides its service ID ('isrc' from Spotify, 'isrc'/'mbid' from Plex Guid tags)
+STABLE_ID_FIELDS = ('isrc', 'mbid')
+
+# The stable IDs of a track record as {field: id}; destinations try an exact lookup by these before text search
+def stable_ids(track):
+    return {field: track[field] for field in STABLE_ID_FIELDS if track.get(field)}
+
+# Function to stream YouTube Music playlist tracks (generator: tracks are yielded page by page as they arrive)
+def get_youtube_playlist_tracks(yt_playlist_url, args):
     yt_playlist_id = re.search(r"list=([a-zA-Z0-9_-]+)", yt_playlist_url).group(1)
-    yt_tracks = []
-    playlist_items = ytmusic.get_playlist(yt_playlist_id, limit=500)['tracks']
-    for item in playlist_items:
-        yt_tracks.append({
+    for item in iter_youtube_playlist_items(ytmusic, yt_playlist_id, verbose=args.verbose, retry=ytmusic_retry):
+        yield {
+            'id': item.get('videoId'),
             'title': item['title'],
             'artist': item['artists'][0]['name'],
             'album': item.get('album', {}).get('name') if item.get('album') else None
-        })
-    return yt_tracks
+        }
 
-# Function to retrieve Spotify playlist tracks
-def get_spotify_playlist_tracks(spotify_url):
+# Function to retrieve Spotify playlist tracks (all pages, fetched concurrently)
+def get_spotify_playlist_tracks(spotify_url, args):
     spotify_id = re.search(r"playlist/([a-zA-Z0-9]+)", spotify_url).group(1)
-    url = f'https://api.spotify.com/v1/playlists/{spotify_id}/tracks'
-    headers = {'Authorization': f'Bearer {spotify_access_token}'}
-    response = requests.get(url, headers=headers)
+    items = get_spotify_playlist_items(spotify_tokens, spotify_id, retry=spotify_retry)
+    if items is None:
+        sys.exit("Error: Unable to retrieve the Spotify playlist.")
+    if args.verbose:
+        print(f"Retrieved {len(items)} tracks from Spotify playlist '{spotify_id}'.")
     return [
         {
-            'title': item['track']['name'],
-            'artist': item['track']['artists'][0]['name'],
-            'album': item['track']['album']['name']
+            'id': track.get('id'),
+            'title': track['name'],
+            'artist': track['artists'][0]['name'],
+            'album': track['album']['name'],
+            'isrc': (track.get('external_ids') or {}).get('isrc')
         }
-        for item in response.json()['items']
+        for track in items
     ]
 
 # Function to retrieve Plex playlist tracks with connection check
-def get_plex_playlist_tracks(playlist_name):
+def get_plex_playlist_tracks(playlist_name, args):
     if not plex:
         sys.exit("Error: Plex server not initialized. Please provide valid --plex-url and --plex-token.")
+    from plex_library_index import external_ids
     
     # Retrieve specified Plex playlist
-    plex_playlist = next((p for p in plex.playlists() if p.title.lower() == playlist_name.lower()), None)
+    plex_playlist = find_plex_playlist(playlist_name)
     if not plex_playlist:
         sys.exit(f"Error: Playlist '{playlist_name}' not found on Plex.")
     
     plex_tracks = []
-    for item in plex_playlist.items():
+    for item in plex_retry.call(plex_playlist.items):
         if item.TYPE == "track":
             plex_tracks.append({
+                'id': item.ratingKey,
                 'title': item.title,
                 'artist': item.originalTitle or item.grandparentTitle,
-                'album': item.parentTitle
+                'album': item.parentTitle,
+                **external_ids(item)
             })
     if args.verbose:
         print(f"Retrieved {len(plex_tracks)} tracks from Plex playlist '{playlist_name}'.")
     return plex_tracks
 
-# Function to add tracks to Spotify
-def add_to_spotify_playlist(tracks):
+# Find a playlist by name (case-insensitive) on each service; None if it does not exist.
+# Lookups go through the service's playlist index, which lists all playlists once.
+def find_spotify_playlist(playlist_name):
+    return spotify_playlists.find(playlist_name)
+
+def find_youtube_playlist(playlist_name):
+    return ytmusic_playlists.find(playlist_name)
+
+# plexapi playlist objects cache their items, so an indexed playlist already used by an earlier lookup is fetched fresh
+def find_plex_playlist(playlist_name):
+    playlist, unused = plex_playlists.find_unused(playlist_name)
+    if playlist is None or unused:
+        return playlist
+    return plex_retry.call(plex.fetchItem, playlist.key)
+
+# Track identity stores (track_identity.py), one per --track-identities path, shared by all jobs
+identity_stores = {}
+identity_stores_lock = threading.Lock()
+
+def get_identity_store(args):
+    if not args.track_identities:
+        return None
+    with identity_stores_lock:
+        if args.track_identities not in identity_stores:
+            identity_stores[args.track_identities] = TrackIdentityStore(args.track_identities)
+        return identity_stores[args.track_identities]
+
+# Service name and ID a track is stored under in the track identity store
+# (Plex ratingKeys are only unique within their library section)
+def identity_key(service, item_id):
+    if service == 'plex':
+        return f"plex/{music_library.uuid}", str(item_id)
+    return service, str(item_id)
+
+# Identifiers of a source track in the track identity store: its ID on the source service and its stable IDs
+def source_identifiers(track, args):
+    identifiers = list(stable_ids(track).items())
+    if track.get('id'):
+        identifiers.insert(0, identity_key(args.source_service, track['id']))
+    return identifiers
+
+# Matching criteria a text match on service depends on: (--force-album-match, --min-score) for Plex, None elsewhere
+def match_criteria(service, args):
+    return (args.force_album_match or '', args.min_score) if service == 'plex' else None
+
+# ID on the destination service of a source track linked by an earlier sync (no search call), or None.
+# Links are only reused if they meet --identity-min-confidence and were made with the same or stricter criteria.
+def recall_match(track, service, args):
+    store = get_identity_store(args)
+    identifiers = source_identifiers(track, args) if store else None
+    if not identifiers:
+        return None
+    known = store.resolve(identifiers, identity_key(service, '')[0], args.identity_min_confidence, match_criteria(service, args))
+    return known[0] if known else None
+
+# Link the source tracks to their matches in the track identity store (one transaction per sync);
+# matches are (source track, destination ID, confidence) tuples
+def remember_matches(matches, service, args):
+    store = get_identity_store(args)
+    if not store:
+        return
+    groups = []
+    links = []
+    for track, item_id, confidence in matches:
+        identifiers = source_identifiers(track, args)
+        if not identifiers:
+            continue
+        # The source service's own ID and stable IDs (e.g. a Spotify track and its ISRC) belong together for sure
+        if len(identifiers) > 1:
+            groups.append(identifiers)
+        links.append((identifiers[0], identity_key(service, item_id), confidence, match_criteria(service, args)))
+    store.record(groups, links)
+
+# Function to add tracks to Spotify; returns {source track key: Spotify track ID} for the tracks written
+def add_to_spotify_playlist(tracks, args):
     playlist_name = args.playlist_name or "Synced Playlist"
-    playlists = spotify.current_user_playlists()['items']
-    existing_playlist = next((p for p in playlists if p['name'].lower() == playlist_name.lower()), None)
+    existing_playlist = find_spotify_playlist(playlist_name)
     
-    # Create or replace the playlist as necessary
-    if existing_playlist and args.replace:
-        spotify.user_playlist_unfollow(spotify.me()['id'], existing_playlist['id'])
-        existing_playlist = None
+    # Create the playlist if necessary (an existing one is updated in place, also with --replace)
     if not existing_playlist:
-        playlist_id = spotify.user_playlist_create(spotify.me()['id'], playlist_name, public=False)['id']
+        user_id = spotify_retry.call(spotify_tokens.call, spotify.me)['id']
+        playlist = spotify_retry.call_write(spotify_tokens.call, spotify.user_playlist_create, user_id, playlist_name, public=False)
+        spotify_playlists.add(playlist)
+        playlist_id = playlist['id']
         if args.verbose:
             print(f"Created new Spotify playlist '{playlist_name}'.")
     else:
@@ -146,23 +432,60 @@ def add_to_spotify_playlist(tracks):
 
     unmatched_tracks = []
 
-    # Add each track to the Spotify playlist
-    for track in tracks:
-        spotify_track_id = search_spotify_track(spotify, track['title'], track['artist'], track.get('album'))
-        if spotify_track_id:
-            spotify.playlist_add_items(playlist_id, [spotify_track_id])
+    # Matched track IDs are written in batches of up to 100 (Spotify API limit); with --replace, the
+    # existing playlist is brought in line with the matched tracks by a minimal diff once matching is done
+    if existing_playlist and args.replace:
+        def replace_spotify_tracks(track_ids):
+            current_ids = get_spotify_playlist_track_ids(spotify_tokens, playlist_id, retry=spotify_retry)
+            if current_ids is None:
+                raise Exception("unable to read the current playlist")
+            return update_spotify_playlist(spotify, playlist_id, current_ids, track_ids, retry=spotify_retry, tokens=spotify_tokens)
+        writer = DiffPlaylistWriter(profiler.wrap('destination write', replace_spotify_tracks), name="Spotify playlist", verbose=args.verbose)
+    else:
+        writer = BatchedPlaylistWriter(
+            profiler.wrap('destination write', lambda track_ids: spotify_tokens.call(spotify.playlist_add_items, playlist_id, track_ids)),
+            SPOTIFY_BATCH_SIZE, args.flush_interval, retry=spotify_retry, name="Spotify playlist", verbose=args.verbose
+        )
+
+    # Match tracks in parallel (results come back in source order) and queue each for the Spotify playlist.
+    # Tracks linked by an earlier sync come from the track identity store; the others are searched.
+    def search(track):
+        known = recall_match(track, 'spotify', args)
+        if known:
+            return known, None
+        return match_cache.get_or_search(
+            ('spotify', track['title'].lower(), track['artist'].lower(), (track.get('album') or '').lower(), track.get('isrc')),
+            lambda: match_spotify_track(track)
+        )
+    new_matches = []
+    for track, match in report_progress(profiler.iterate('matching', match_tracks(tracks, search, args.workers)), tracks):
+        if match:
+            spotify_track_id, confidence = match
+            if confidence:
+                new_matches.append((track, spotify_track_id, confidence))
+            writer.add(spotify_track_id, track)
             if args.verbose:
-                print(f"Added '{track['title']}' by '{track['artist']}' to Spotify playlist.")
+                print(f"Matched '{track['title']}' by '{track['artist']}' on Spotify.")
         else:
             unmatched_tracks.append(track)
             if args.verbose:
                 print(f"No match found on Spotify for '{track['title']}' by '{track['artist']}'.")
 
+    profiler.call('matching', remember_matches, new_matches, 'spotify', args)
+    writer.close()
+    unmatched_tracks.extend(writer.failed_tracks)
+    written = {track_key(track): track_id for track_id, track in writer.written}
+
     # Optionally output unmatched tracks
+    profiler.call('unmatched report', save_unmatched_tracks, unmatched_tracks, args)
+    return written
+
+# Save the details of unmatched tracks to --unmatched-output (text or CSV)
+def save_unmatched_tracks(unmatched_tracks, args):
     if args.unmatched_output and unmatched_tracks:
         with open(args.unmatched_output, 'w', newline='') as f:
             if args.unmatched_format == 'csv':
-                writer = csv.DictWriter(f, fieldnames=["title", "artist", "album"])
+                writer = csv.DictWriter(f, fieldnames=["title", "artist", "album"], extrasaction='ignore')
                 writer.writeheader()
                 writer.writerows(unmatched_tracks)
                 if args.verbose:
@@ -174,29 +497,53 @@ def add_to_spotify_playlist(tracks):
                     print(f"Unmatched track details saved to {args.unmatched_output} in text format.")
 
 
+# Exact lookup of a track on Spotify by its ISRC; None if no track has that code
+def search_spotify_isrc(spotify, isrc):
+    results = spotify_retry.call(spotify_tokens.call, spotify.search, q=f"isrc:{isrc}", type='track', limit=1)
+    tracks = results.get('tracks', {}).get('items', [])
+    if tracks:
+        return tracks[0]['id']
+    return None
+
+# Match a source track on Spotify: by ISRC if it has one, else (or if that finds nothing) by text search.
+# Returns (track ID, confidence of the match) or None.
+def match_spotify_track(track):
+    if track.get('isrc'):
+        track_id = search_spotify_isrc(spotify, track['isrc'])
+        if track_id:
+            return track_id, 'exact'
+    track_id = search_spotify_track(spotify, track['title'], track['artist'], track.get('album'))
+    return (track_id, 'search') if track_id else None
+
 # Search for a track on Spotify using title and artist (and album, if available)
 def search_spotify_track(spotify, title, artist, album=None):
     query = f"{title} {artist}"
     if album:
         query += f" {album}"
-    results = spotify.search(q=query, type='track', limit=1)
+    results = spotify_retry.call(spotify_tokens.call, spotify.search, q=query, type='track', limit=1)
     tracks = results.get('tracks', {}).get('items', [])
     if tracks:
         return tracks[0]['id']
     return None
 
 # Enhanced function to search for track by artist, album, and track title in Plex with exact or fuzzy album match
-def find_track_in_plex(artist_name, track_name, album_name=None):
+def find_track_in_plex(artist_name, track_name, album_name=None, force_album_match=None, min_score=None, ids=None):
+    # Use the prefetched library index if enabled (no extra round trips; exact lookup by the stable IDs in ids
+    # first, approximate matching with min_score). Without the index, Plex offers no lookup by these IDs.
+    if plex_index:
+        return plex_index.find_track(artist_name, track_name, album_name, force_album_match, min_score, ids)
+
     # Search for the artist
+    search_results = plex_retry.call(music_library.search, title=artist_name)
     artist_results = [
-        artist for artist in music_library.search(title=artist_name)
+        artist for artist in search_results
         if artist.type == 'artist' and artist.title.lower() == artist_name.lower()
     ]
 
     if not artist_results:
         # Fall back to searching for close matches if no exact match is found
         artist_results = [
-            artist for artist in music_library.search(title=artist_name)
+            artist for artist in search_results
             if artist.type == 'artist' and artist_name.lower() in artist.title.lower()
         ]
     
@@ -207,23 +554,23 @@ def find_track_in_plex(artist_name, track_name, album_name=None):
 
     # Step 1: Try to find a match based on force-album-match option (exact or fuzzy)
     for artist in artist_results:
-        for album in artist.albums():
+        for album in plex_retry.call(artist.albums):
             if album_name:
-                if args.force_album_match == 'exact' and album.title.lower() != album_name.lower():
+                if force_album_match == 'exact' and album.title.lower() != album_name.lower():
                     continue  # Skip if exact match is required and titles don't match
-                elif args.force_album_match == 'fuzzy' and album_name.lower() not in album.title.lower():
+                elif force_album_match == 'fuzzy' and album_name.lower() not in album.title.lower():
                     continue  # Skip if fuzzy match is required and title is not a substring
 
-            for track in album.tracks():
+            for track in plex_retry.call(album.tracks):
                 if track.title.lower() == track_name.lower():
                     print(f"Match found: {track.title} in album '{album.title}' by '{artist.title}'")
                     return track
 
     # Step 2: Fallback to double match (artist and track only, ignoring album) if no force-album-match is set
-    if not args.force_album_match:
+    if not force_album_match:
         for artist in artist_results:
-            for album in artist.albums():
-                for track in album.tracks():
+            for album in plex_retry.call(artist.albums):
+                for track in plex_retry.call(album.tracks):
                     if track.title.lower() == track_name.lower():
                         print(f"Partial match found (without album): {track.title} in album '{album.title}' by '{artist.title}'")
                         return track
@@ -232,60 +579,129 @@ def find_track_in_plex(artist_name, track_name, album_name=None):
     print(f"No track named '{track_name}' found for artist '{artist_name}' with the specified criteria.")
     return None
 
-# Function to add tracks to Plex
-def add_to_plex_playlist(tracks):
+# Match a source track in Plex; returns (Plex track, confidence of the match) or None.
+# A hit on the track's ISRC/MusicBrainz ID is exact, a differing title means an approximate (--min-score) match.
+def match_plex_track(track, args):
+    plex_track = find_track_in_plex(track['artist'], track['title'], track.get('album'), args.force_album_match, args.min_score, stable_ids(track))
+    if not plex_track:
+        return None
+    if plex_index and stable_ids(track) and plex_index.find_by_ids(stable_ids(track)) is plex_track:
+        return plex_track, 'exact'
+    return plex_track, 'search' if plex_track.title.casefold() == track['title'].casefold() else 'fuzzy'
+
+# Plex track for a ratingKey recalled from the track identity store: the indexed track (None if it left the
+# library), or without the index a record that is swapped for the live track when the playlist is written
+def recalled_plex_track(rating_key, track):
+    if plex_index:
+        return plex_index.by_rating_key.get(int(rating_key))
+    from plex_library_index import SnapshotTrack
+    return SnapshotTrack(int(rating_key), track['title'], track['artist'], None, track.get('album'), 0, 0, ())
+
+# Function to add tracks to Plex; returns {source track key: Plex ratingKey} for the tracks written
+def add_to_plex_playlist(tracks, args):
     playlist_name = args.playlist_name or "Synced Playlist"
     
-    existing_playlist = plex.playlist(playlist_name) if playlist_name in [p.title for p in plex.playlists()] else None
+    existing_playlist = find_plex_playlist(playlist_name)
     
-    # Collect matched Plex tracks
-    plex_tracks = []
-    for track in tracks:
-        plex_track = find_track_in_plex(track['artist'], track['title'], track.get('album'))
+    if existing_playlist and args.append:
+        print(f"Appending to existing Plex playlist '{playlist_name}'.")
+    target_playlist = existing_playlist if existing_playlist and args.append else None
+
+    # Write one batch of matched tracks: the first batch creates the playlist unless appending, later batches are appended
+    def write_plex_batch(items):
+        nonlocal target_playlist
+        from plex_library_index import resolve_plex_tracks
+        # Swap snapshot records for live Plex items (batched by ratingKey)
+        items = resolve_plex_tracks(plex, items, plex_index.snapshot if plex_index else None, retry=plex_retry)
+        if not items:
+            return
+        if target_playlist is None:
+            target_playlist = plex.createPlaylist(playlist_name, items=items)
+            plex_playlists.add(target_playlist)
+        else:
+            target_playlist.addItems(items)
+
+    # With --replace, the existing playlist is brought in line with the matched tracks by a minimal diff once matching is done
+    def replace_plex_tracks(items):
+        from plex_library_index import resolve_plex_tracks
+        items = resolve_plex_tracks(plex, items, plex_index.snapshot if plex_index else None, retry=plex_retry)
+        return update_plex_playlist(existing_playlist, items, retry=plex_retry)
+
+    if existing_playlist and args.replace:
+        writer = DiffPlaylistWriter(profiler.wrap('destination write', replace_plex_tracks), name="Plex playlist", verbose=args.verbose)
+    else:
+        writer = BatchedPlaylistWriter(profiler.wrap('destination write', write_plex_batch), PLEX_BATCH_SIZE, args.flush_interval, retry=plex_retry, name="Plex playlist", verbose=args.verbose)
+
+    # A batch engine scores the whole playlist up front (the source is read completely first)
+    if plex_index and plex_index.fuzzy_engine is not None and args.min_score is not None:
+        tracks = list(tracks)
+        profiler.call('matching', plex_index.fuzzy_engine.prepare, [(track['artist'], track['title']) for track in tracks])
+
+    # Match tracks in parallel (kept in source order) and queue them for the Plex playlist.
+    # Tracks linked by an earlier sync come from the track identity store; the others are searched.
+    def search(track):
+        known = recall_match(track, 'plex', args)
+        plex_track = recalled_plex_track(known, track) if known else None
         if plex_track:
-            plex_tracks.append(plex_track)
+            return plex_track, None
+        return match_cache.get_or_search(
+            ('plex', track['title'].lower(), track['artist'].lower(), (track.get('album') or '').lower(), args.force_album_match, args.min_score,
+             tuple(sorted(stable_ids(track).items()))),
+            lambda: match_plex_track(track, args)
+        )
+    new_matches = []
+    for track, match in report_progress(profiler.iterate('matching', match_tracks(tracks, search, args.workers)), tracks):
+        if match:
+            plex_track, confidence = match
+            if confidence:
+                new_matches.append((track, plex_track.ratingKey, confidence))
+            writer.add(plex_track, track)
             if args.verbose:
                 print(f"Match found for '{track['title']}' by '{track['artist']}'")
+    profiler.call('matching', remember_matches, new_matches, 'plex', args)
 
-
-    # Only create or update playlist if there are items to add
-    if not plex_tracks:
+    # Only create or update playlist if there were items to add
+    added_count = writer.close()
+    if not added_count:
         print("No matching tracks found in Plex to add to the playlist.")
-        return
+        return {}
+    if existing_playlist and args.append:
+        print(f"Appended {added_count} tracks to Plex playlist '{playlist_name}'.")
+    elif existing_playlist and args.replace:
+        print(f"Plex playlist '{playlist_name}' updated to {added_count} tracks ({writer.edits.summary()}).")
+    else:
+        print(f"Plex playlist '{playlist_name}' created with {added_count} tracks.")
+    return {track_key(track): plex_track.ratingKey for plex_track, track in writer.written}
 
-    # Handle playlist creation or update
-    if existing_playlist:
-        if args.replace:
-            existing_playlist.delete()
-            existing_playlist = None
-        elif args.append:
-            print(f"Appending to existing Plex playlist '{playlist_name}'.")
-            existing_playlist.addItems(plex_tracks)
-            return
+# Search for a track on YouTube Music using title and artist, returning the videoId of the best match
+# (YouTube Music has no lookup by ISRC or other stable IDs, so this is always a text search)
+def search_youtube_track(track):
+    search_query = f"{track['title']} {track['artist']}"
+    search_results = ytmusic_retry.call(ytmusic.search, search_query, filter="songs")
+    if search_results:
+        return search_results[0]['videoId']
+    return None
 
-    # Create a new playlist with matched items
-    plex.createPlaylist(playlist_name, items=plex_tracks)
-    print(f"Plex playlist '{playlist_name}' created with {len(plex_tracks)} tracks.")
+# Match a source track on YouTube Music; returns (videoId, confidence of the match) or None
+def match_youtube_track(track):
+    video_id = search_youtube_track(track)
+    return (video_id, 'search') if video_id else None
 
-# Function to add tracks to YouTube Music with conflict handling and duplicate checking
-def add_to_youtube_playlist(tracks):
+# Function to add tracks to YouTube Music with conflict handling and duplicate checking;
+# returns {source track key: videoId} for the tracks written
+def add_to_youtube_playlist(tracks, args):
     playlist_name = args.playlist_name or "Synced Playlist"
     playlist_description = ""
     # Check for existing playlists on YouTube Music
-    existing_playlists = ytmusic.get_library_playlists()
-    existing_playlist = next((p for p in existing_playlists if p['title'].lower() == playlist_name.lower()), None)
+    existing_playlist = find_youtube_playlist(playlist_name)
     
     # Create or update the playlist
     if existing_playlist:
         if args.replace:
-            ytmusic.delete_playlist(existing_playlist['playlistId'])
+            # Updated in place by a minimal diff once matching is done
             if args.verbose:
-                print(f"Replaced existing YouTube Music playlist '{playlist_name}'.")
-            if 'plex' in [args.source_service]:
-                playlist_description = "Synced from Plex"
-            elif 'spotify' in [args.source_service]:
-                playlist_description = "Synced from Spotify"
-            playlist_id = ytmusic.create_playlist(playlist_name, playlist_description)
+                print(f"Replacing the contents of existing YouTube Music playlist '{playlist_name}'.")
+            playlist_id = existing_playlist['playlistId']
         elif args.append:
             if args.verbose:
                 print(f"Appending to existing YouTube Music playlist '{playlist_name}'.")
@@ -297,90 +713,386 @@ def add_to_youtube_playlist(tracks):
                 playlist_description = "Synced from Plex"
         elif 'spotify' in [args.source_service]:
                 playlist_description = "Synced from Spotify"
-        playlist_id = ytmusic.create_playlist(playlist_name, playlist_description)
+        playlist_id = ytmusic_retry.call_write(ytmusic.create_playlist, playlist_name, playlist_description)
+        ytmusic_playlists.add({'playlistId': playlist_id, 'title': playlist_name})
         if args.verbose:
             print(f"Created new YouTube Music playlist '{playlist_name}'.")
 
     unmatched_tracks = []  # Track unmatched items
 
-    # Get current tracks to prevent duplicates
+    # Get current tracks to prevent duplicates (a replaced playlist only keeps this run's tracks)
     existing_track_ids = set()
-    if existing_playlist:
-        existing_items = ytmusic.get_playlist(playlist_id, limit=500)['tracks']
+    if existing_playlist and not args.replace:
+        existing_items = iter_youtube_playlist_items(ytmusic, playlist_id, verbose=args.verbose, retry=ytmusic_retry)
         existing_track_ids.update(item['videoId'] for item in existing_items)
 
-    # Search for each track on YouTube Music and add it if not a duplicate
-    for track in tracks:
-        search_query = f"{track['title']} {track['artist']}"
-        search_results = ytmusic.search(search_query, filter="songs")
-        
-        if search_results:
-            yt_track_id = search_results[0]['videoId']
-            
+    # Write one batch of videoIds; YouTube Music reports failures in the response status rather than raising
+    def write_youtube_batch(video_ids):
+        response = ytmusic.add_playlist_items(playlist_id, video_ids)
+        if isinstance(response, dict) and 'SUCCEEDED' not in response.get('status', 'STATUS_SUCCEEDED'):
+            raise Exception(f"YouTube Music returned status {response.get('status')}")
+
+    # Replace the playlist's contents: read it once and apply only the differences
+    def replace_youtube_tracks(video_ids):
+        current_items = list(iter_youtube_playlist_items(ytmusic, playlist_id, retry=ytmusic_retry))
+        return update_youtube_playlist(ytmusic, playlist_id, current_items, video_ids, retry=ytmusic_retry)
+
+    # Matched videoIds are written in multi-ID batches (failed batches are retried with backoff)
+    if existing_playlist and args.replace:
+        writer = DiffPlaylistWriter(profiler.wrap('destination write', replace_youtube_tracks), name="YouTube Music playlist", verbose=args.verbose)
+    else:
+        writer = BatchedPlaylistWriter(profiler.wrap('destination write', write_youtube_batch), YTMUSIC_BATCH_SIZE, args.flush_interval, retry=ytmusic_retry, name="YouTube Music playlist", verbose=args.verbose)
+
+    # Search for each track on YouTube Music (in parallel, kept in source order) and queue it if not a duplicate.
+    # Tracks linked by an earlier sync come from the track identity store; the others are searched.
+    def search(track):
+        known = recall_match(track, 'ytmusic', args)
+        if known:
+            return known, None
+        return match_cache.get_or_search(
+            ('ytmusic', track['title'].lower(), track['artist'].lower()),
+            lambda: match_youtube_track(track)
+        )
+    new_matches = []
+    for track, match in report_progress(profiler.iterate('matching', match_tracks(tracks, search, args.workers)), tracks):
+        if match:
+            yt_track_id, confidence = match
+            if confidence:
+                new_matches.append((track, yt_track_id, confidence))
             # Check for duplicate track
             if yt_track_id in existing_track_ids:
                 if args.verbose:
                     print(f"Track '{track['title']}' already exists in the playlist. Skipping.")
                 continue
-            
-            # Attempt to add the track, with retry handling
-            try:
-                ytmusic.add_playlist_items(playlist_id, [yt_track_id])
-                existing_track_ids.add(yt_track_id)
-                if args.verbose:
-                    print(f"Added '{track['title']}' by '{track['artist']}' to YouTube Music playlist.")
-            except Exception as e:
-                print(f"Error adding track '{track['title']}': {e}. Retrying after delay.")
-                time.sleep(2)  # Brief pause before retrying
-                try:
-                    ytmusic.add_playlist_items(playlist_id, [yt_track_id])
-                    existing_track_ids.add(yt_track_id)
-                    if args.verbose:
-                        print(f"Added '{track['title']}' by '{track['artist']}' (Retry)")
-                except Exception as retry_e:
-                    print(f"Failed again on '{track['title']}'. Skipping this track.")
-                    unmatched_tracks.append(track)
+
+            writer.add(yt_track_id, track)
+            existing_track_ids.add(yt_track_id)
+            if args.verbose:
+                print(f"Matched '{track['title']}' by '{track['artist']}' on YouTube Music.")
         else:
             if args.verbose:
                 print(f"No match found on YouTube Music for '{track['title']}' by '{track['artist']}'")
             unmatched_tracks.append(track)
 
+    profiler.call('matching', remember_matches, new_matches, 'ytmusic', args)
+    writer.close()
+    unmatched_tracks.extend(writer.failed_tracks)
+    written = {track_key(track): video_id for video_id, track in writer.written}
+
     # Save unmatched track details if specified
-    if args.unmatched_output and unmatched_tracks:
-        with open(args.unmatched_output, 'w', newline='') as f:
-            if args.unmatched_format == 'csv':
-                writer = csv.DictWriter(f, fieldnames=["title", "artist", "album"])
-                writer.writeheader()
-                writer.writerows(unmatched_tracks)
-                if args.verbose:
-                    print(f"Unmatched track details saved to {args.unmatched_output} in CSV format.")
-            else:
-                for track in unmatched_tracks:
-                    f.write(f"{track['title']} - {track['artist']}\n")
+    profiler.call('unmatched report', save_unmatched_tracks, unmatched_tracks, args)
+    return written
+
+# Functions to remove previously synced tracks from a destination playlist (delta sync). remove counts the
+# source entries dropped per destination ID and keep the ones still mapped to it (see plan_removals), so
+# only the removed copies go, by position, and a track other source entries still map to stays.
+def remove_from_spotify_playlist(playlist_name, remove, keep):
+    playlist_id = find_spotify_playlist(playlist_name)['id']
+    current_ids = get_spotify_playlist_track_ids(spotify_tokens, playlist_id, retry=spotify_retry)
+    if current_ids is None:
+        raise Exception("unable to read the current playlist")
+    # Remove from the end of the playlist first, so the positions of later batches stay valid
+    for batch in batches(plan_removals(current_ids, remove, keep)[::-1], SPOTIFY_BATCH_SIZE):
+        spotify_retry.call_write(spotify_tokens.call, spotify.playlist_remove_specific_occurrences_of_items, playlist_id,
+                                 [{'uri': current_ids[position], 'positions': [position]} for position in batch])
+
+def remove_from_youtube_playlist(playlist_name, remove, keep):
+    playlist_id = find_youtube_playlist(playlist_name)['playlistId']
+    # Removal needs the setVideoId of each playlist entry, so read the current playlist items
+    items = list(iter_youtube_playlist_items(ytmusic, playlist_id, retry=ytmusic_retry))
+    positions = plan_removals([item.get('videoId') for item in items], remove, keep)
+    if positions:
+        ytmusic_retry.call_write(ytmusic.remove_playlist_items, playlist_id, [items[position] for position in positions])
+
+def remove_from_plex_playlist(playlist_name, remove, keep):
+    playlist = find_plex_playlist(playlist_name)
+    items = plex_retry.call(playlist.items)
+    positions = plan_removals([item.ratingKey for item in items], remove, keep)
+    remove_plex_entries(playlist, [items[position] for position in positions], plex_retry)
+
+# Source readers and destination writers for each supported service
+SOURCE_READERS = {
+    'spotify': lambda args: get_spotify_playlist_tracks(args.playlist_url, args),
+    'ytmusic': lambda args: get_youtube_playlist_tracks(args.playlist_url, args),
+    'plex': lambda args: get_plex_playlist_tracks(args.playlist_name, args),
+}
+DESTINATION_WRITERS = {'spotify': add_to_spotify_playlist, 'ytmusic': add_to_youtube_playlist, 'plex': add_to_plex_playlist}
+DESTINATION_REMOVERS = {'spotify': remove_from_spotify_playlist, 'ytmusic': remove_from_youtube_playlist, 'plex': remove_from_plex_playlist}
+DESTINATION_FINDERS = {'spotify': find_spotify_playlist, 'ytmusic': find_youtube_playlist, 'plex': find_plex_playlist}
+
+# Read the source playlist, charging the fetch (including pages streamed while tracks are matched) to the source fetch phase.
+# A playlist read completely up front is returned as a list, so its length is known.
+def read_source(args):
+    tracks = profiler.call('source fetch', SOURCE_READERS[args.source_service], args)
+    if isinstance(tracks, list):
+        return tracks
+    return profiler.iterate('source fetch', tracks)
+
+# Write tracks to the destination playlist (lookups, creation and batches count as the destination write phase)
+def write_destination(tracks, args):
+    return profiler.call('destination write', DESTINATION_WRITERS[args.destination_service], tracks, args)
+
+# Identify the source playlist (Spotify/YouTube Music playlist ID, or Plex playlist name)
+def get_source_id(args):
+    if args.source_service == 'spotify':
+        return re.search(r"playlist/([a-zA-Z0-9]+)", args.playlist_url).group(1)
+    if args.source_service == 'ytmusic':
+        return re.search(r"list=([a-zA-Z0-9_-]+)", args.playlist_url).group(1)
+    return args.playlist_name
+
+# Incremental sync: skip unchanged source playlists, otherwise only add new and remove deleted tracks.
+# Returns True if the source had changed (and was synced), False if it was unchanged.
+def run_delta_sync(state, args):
+    playlist_name = args.playlist_name or "Synced Playlist"
+    key = sync_key(args.source_service, get_source_id(args), args.destination_service, playlist_name)
+    previous = state.get(key)
+
+    # Spotify exposes a snapshot_id, so an unchanged playlist is detected with one small request
+    fingerprint = None
+    if args.source_service == 'spotify':
+        fingerprint = profiler.call('source fetch', get_spotify_playlist_snapshot_id, spotify_tokens, get_source_id(args), retry=spotify_retry)
+        if previous and fingerprint and previous[0] == fingerprint:
+            print(f"Source playlist unchanged since the last sync (snapshot {fingerprint}). Nothing to do.")
+            return False
+
+    # Other sources are fingerprinted by hashing their ordered videoId / ratingKey lists
+    tracks = list(read_source(args))
+    keys = [track_key(track) for track in tracks]
+    if not fingerprint:
+        fingerprint = fingerprint_keys(keys)
+        if previous and previous[0] == fingerprint:
+            print("Source playlist unchanged since the last sync. Nothing to do.")
+            return False
+
+    if previous and profiler.call('destination write', DESTINATION_FINDERS[args.destination_service], playlist_name):
+        # Tracks that were never written (e.g. unmatched last time) are retried along with new ones.
+        # Removals are counted per entry, so dropping one copy of a duplicated source track counts too.
+        previous_counts = Counter(previous[1])
+        current_counts = Counter(keys)
+        added = [track for track in tracks if track_key(track) not in previous_counts]
+        removed = previous_counts - current_counts
+        removed_keys = [k for k in removed if k not in current_counts]
+        print(f"Delta sync: {len(added)} tracks to add, {sum(removed.values())} tracks to remove.")
+
+        # The destination already mirrors the previous source state, so only append the new tracks
+        # (on a copy of the options: watch mode reuses the job's own for every later round)
+        args = argparse.Namespace(**vars(args))
+        args.append, args.replace = True, False
+        written = write_destination(added, args) if added else {}
+        if removed:
+            # Destination tracks that remaining source entries also map to (duplicates, or two source
+            # versions matched to the same track) keep a copy for each of them
+            mapping = state.mappings(key)
+            mapping.update((k, str(destination_id)) for k, destination_id in written.items())
+            remove = Counter(mapping[k] for k in removed.elements() if k in mapping)
+            keep = Counter(mapping[k] for k in keys if k in mapping)
+            if remove:
+                profiler.call('destination write', DESTINATION_REMOVERS[args.destination_service], playlist_name, remove, keep)
+        mapped_keys = (set(previous_counts) - set(removed_keys)) | set(written)
+        state.save(key, fingerprint, [k for k in keys if k in mapped_keys], written, removed_keys)
+    else:
+        written = write_destination(tracks, args)
+        state.save(key, fingerprint, [k for k in keys if k in written], written, replace_mappings=True)
+    return True
+
+
+# Sync-state stores are shared by all jobs that use the same file
+sync_states = {}
+sync_states_lock = threading.Lock()
+
+def get_sync_state(path):
+    with sync_states_lock:
+        if path not in sync_states:
+            sync_states[path] = SyncState(path)
+        return sync_states[path]
+
+# Run one source -> destination sync job; returns False if a --sync-state sync found the source unchanged
+def run_sync(args):
+    if args.source_service == args.destination_service:
+        sys.exit("Error: Unsupported source-destination combination.")
+    if args.sync_state:
+        return run_delta_sync(get_sync_state(args.sync_state), args)
+    write_destination(read_source(args), args)
+    return True
+
+# Load the jobs of a manifest file: a JSON list (or {"jobs": [...]}) of objects whose keys are command-line
+# option names (e.g. "source-service", "playlist-url"); unset options are inherited from the command line
+# Options a manifest job may not set: the clients and Plex index are set up once from the command line for
+# every job, and the job scheduling options apply to the whole run
+PROCESS_OPTIONS = SERVICE_SETTINGS + ['manifest', 'watch', 'max_jobs']
+
+def load_manifest(path, args, parser):
+    with open(path) as f:
+        manifest = json.load(f)
+    jobs = manifest['jobs'] if isinstance(manifest, dict) else manifest
+    known_options = vars(args)
+    job_args = []
+    report_jobs = {}
+    for number, job in enumerate(jobs, 1):
+        options = dict(known_options)
+        inherited_report = bool(options['unmatched_output'])
+        for option, value in job.items():
+            name = option.lstrip('-').replace('-', '_')
+            if name not in known_options:
+                parser.error(f"Manifest job {number}: unknown option '{option}'.")
+            if name in PROCESS_OPTIONS:
+                parser.error(f"Manifest job {number}: '{option}' applies to all jobs and must be given on the command line.")
+            options[name] = value
+            if name == 'unmatched_output':
+                inherited_report = False
+        if not options['source_service'] or not options['destination_service']:
+            parser.error(f"Manifest job {number}: source-service and destination-service are required.")
+        # Jobs run concurrently, so each writes its own unmatched report: one inherited from the command
+        # line gets the job number (unmatched.txt -> unmatched.job2.txt), and two jobs may not share a path
+        if inherited_report:
+            root, extension = os.path.splitext(options['unmatched_output'])
+            options['unmatched_output'] = f"{root}.job{number}{extension}"
+        report = options['unmatched_output'] and os.path.abspath(options['unmatched_output'])
+        if report in report_jobs:
+            parser.error(f"Manifest job {number}: unmatched-output '{options['unmatched_output']}' is also written by job {report_jobs[report]}.")
+        if report:
+            report_jobs[report] = number
+        options['manifest'] = None
+        job_args.append(argparse.Namespace(**options))
+    return job_args
+
+# Run one job of a manifest or watch loop; a failure (including sys.exit) is reported instead of stopping the process.
+# Returns (succeeded, changed).
+def run_job(number, job):
+    label = f"job {number} ({job.source_service} -> {job.destination_service}, '{job.playlist_name or job.playlist_url}')"
+    print(f"Starting {label}.")
+    changed = True
+    try:
+        changed = run_sync(job)
+    except SystemExit as e:
+        if e.code:
+            print(f"Failed {label}: {e.code}")
+            return False, False
+    except Exception as e:
+        print(f"Failed {label}: {e}")
+        return False, False
+    print(f"Finished {label}.")
+    return True, changed
+
+# Run manifest jobs concurrently (up to --max-jobs at a time); a failing job is reported without stopping the others
+def run_manifest(jobs, max_jobs):
+    with ThreadPoolExecutor(max_workers=max(1, max_jobs)) as executor:
+        results = [ok for ok, _ in executor.map(run_job, range(1, len(jobs) + 1), jobs)]
+    failed = results.count(False)
+    print(f"Manifest complete: {len(jobs) - failed} of {len(jobs)} jobs succeeded.")
+    return failed
+
+
+# Multiplier applied to a job's poll interval each time its source is found unchanged
+POLL_BACKOFF = 1.5
+
+# Watch mode: keep clients, caches and the Plex index warm and re-sync a source playlist only when its fingerprint
+# changes. Every job is polled on its own schedule, backing off towards --max-poll-interval while it stays unchanged.
+def run_watch(jobs, args):
+    global plex_index, plex_index_built
+    # Fingerprints are what tells a changed playlist apart; keep them in memory if no --sync-state file is given
+    for job in jobs:
+        job.sync_state = job.sync_state or ':memory:'
+
+    intervals = [args.poll_interval] * len(jobs)
+    next_due = [0.0] * len(jobs)
+    print(f"Watching {len(jobs)} playlist(s). Press Ctrl+C to stop.")
+    with ThreadPoolExecutor(max_workers=max(1, args.max_jobs)) as executor:
+        while True:
+            due = [i for i in range(len(jobs)) if next_due[i] <= time.time()]
+            for i, (ok, changed) in zip(due, executor.map(lambda i: run_job(i + 1, jobs[i]), due)):
+                if ok and changed:
+                    intervals[i] = args.poll_interval
+                elif ok:
+                    intervals[i] = min(intervals[i] * POLL_BACKOFF, args.max_poll_interval)
+                next_due[i] = time.time() + intervals[i]
                 if args.verbose:
-                    print(f"Unmatched track details saved to {args.unmatched_output} in text format.")
+                    print(f"Next poll of job {i + 1} in {intervals[i]:.0f}s.")
+            if due and args.metrics_output:
+                api_metrics.write(args.metrics_output, args.metrics_format)
 
+            # Pick up library changes: refresh the Plex index and drop cached search results (including misses)
+            if plex_index and time.time() - plex_index_built >= args.index_refresh_interval:
+                plex_index = profiler.call('plex index', build_plex_index, args)
+                match_cache.clear()
+                plex_index_built = time.time()
 
+            time.sleep(max(0, min(next_due) - time.time()))
 
 
 # Main execution logic
-if args.source_service == 'spotify' and args.destination_service == 'ytmusic':
-    tracks = get_spotify_playlist_tracks(args.playlist_url)
-    add_to_youtube_playlist(tracks)
-elif args.source_service == 'spotify' and args.destination_service == 'plex':
-    tracks = get_spotify_playlist_tracks(args.playlist_url)
-    add_to_plex_playlist(tracks)
-elif args.source_service == 'ytmusic' and args.destination_service == 'spotify':
-    tracks = get_youtube_playlist_tracks(args.playlist_url)
-    add_to_spotify_playlist(tracks)
-elif args.source_service == 'ytmusic' and args.destination_service == 'plex':
-    tracks = get_youtube_playlist_tracks(args.playlist_url)
-    add_to_plex_playlist(tracks)
-elif args.source_service == 'plex' and args.destination_service == 'spotify':
-    tracks = get_plex_playlist_tracks(args.playlist_name)
-    add_to_spotify_playlist(tracks)
-elif args.source_service == 'plex' and args.destination_service == 'ytmusic':
-    tracks = get_plex_playlist_tracks(args.playlist_name)
-    add_to_youtube_playlist(tracks)
-else:
-    sys.exit("Error: Unsupported source-destination combination.")
+# Parse a command line into its options and the list of jobs to run (the options themselves, or the manifest jobs)
+def parse_jobs(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if args.manifest:
+        jobs = load_manifest(args.manifest, args, parser)
+    elif not args.source_service or not args.destination_service:
+        parser.error("--source-service and --destination-service are required (or use --manifest).")
+    else:
+        jobs = [args]
+    return args, jobs
+
+# Set up (or reuse) the service clients and Plex index a command line needs, without syncing anything
+def prepare(argv=None):
+    args, jobs = parse_jobs(argv)
+    init_services(args, [(job.source_service, job.destination_service) for job in jobs])
+
+# Forget the clients set up by init_services, so the next run connects again
+def reset_services():
+    global service_settings
+    service_settings = None
+
+# Whether the module import time was already charged to a run (only the first run in a process pays for it)
+startup_reported = False
+
+def main(argv=None):
+    global profiler, startup_reported
+    args, jobs = parse_jobs(argv)
+    if startup_reported:
+        profiler = PhaseProfiler(args.profile_dir)
+    else:
+        profiler = PhaseProfiler(args.profile_dir, started=IMPORT_STARTED)
+        profiler.charge('startup', IMPORT_FINISHED - IMPORT_STARTED)
+        startup_reported = True
+    profiler.call('auth', init_services, args, [(job.source_service, job.destination_service) for job in jobs])
+
+    failed = 0
+    completed = False
+    try:
+        if args.watch:
+            run_watch(jobs, args)
+        elif args.manifest:
+            failed = run_manifest(jobs, args.max_jobs)
+        else:
+            run_sync(args)
+        completed = True
+    except KeyboardInterrupt:
+        if not args.watch:
+            raise
+        completed = True
+        print("Stopped watching.")
+    finally:
+        # A failed run may come from a stale cached Plex handshake (e.g. a recreated library section)
+        # or a stale playlist index (a playlist deleted or renamed elsewhere)
+        if failed or not completed:
+            if plex:
+                plex.invalidate_handshake()
+            for resolver in (spotify_playlists, ytmusic_playlists, plex_playlists):
+                if resolver:
+                    resolver.invalidate()
+        if args.verbose:
+            http_sessions.print_stats()
+            api_metrics.print_summary()
+        if args.metrics_output:
+            api_metrics.write(args.metrics_output, args.metrics_format)
+        if args.profile or args.profile_dir:
+            profiler.report()
+            for path in profiler.dump():
+                print(f"Profile saved to {path}.")
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,15 @@
-import requests
 from plexapi.server import PlexServer
-from http.cookiejar import MozillaCookieJar
+from plex_library_index import PlexLibraryIndex
 import argparse
+import atexit
 import sys
 import csv
 import re
+from spotify_api import SpotifyTokenManager, SPOTIFY_API_URL, fetch_spotify_page, get_spotify_collection_items
+from http_sessions import create_session
+from api_metrics import api_metrics
+from playlist_diff import update_plex_playlist
+from playlist_resolver import plex_resolver
 
 # Define default values here
 DEFAULT_PLEX_URL = 'http://YOUR_PLEX_SERVER_IP:32400'  # Replace with your Plex server URL
@@ -26,19 +31,27 @@ parser.add_argument('--replace', action='store_true', help="Replace the existing
 parser.add_argument('--unmatched-output', help="File to save unmatched Spotify track URLs")
 parser.add_argument('--unmatched-format', choices=['text', 'csv'], default='text', help="Format of unmatched output file (text or csv, default: text)")
 parser.add_argument('--force-album-match', choices=['exact', 'fuzzy'], help="Enforce exact or fuzzy album match for track matching in Plex")
+parser.add_argument('--plex-index', action='store_true', help="Prefetch the whole Plex library section into an in-memory index for track matching")
+parser.add_argument('--min-score', type=float, help="Fall back to approximate (trigram) matching, accepting the best match scoring at least this (0-1; implies --plex-index)")
+parser.add_argument('--metrics-output', help="Write per-endpoint API call counts, errors and latency histograms to this file at exit")
+parser.add_argument('--metrics-format', choices=['json', 'prometheus'], default='json', help="Format of --metrics-output: JSON summary or Prometheus textfile (default: json)")
 args = parser.parse_args()
 
+# Export the API call metrics when the script exits
+if args.metrics_output:
+    atexit.register(api_metrics.write, args.metrics_output, args.metrics_format)
+
 # Validate that only one of --append or --replace is set
 if args.append and args.replace:
     sys.exit("Error: Specify only one of --append or --replace.")
 
 # Initialize Plex server and library section
-plex = PlexServer(args.plex_url, args.plex_token)
+plex = PlexServer(args.plex_url, args.plex_token, session=create_session(service='plex'))
 music_library = plex.library.section(args.plex_library)
+plex_index = PlexLibraryIndex.from_section(music_library, verbose=True) if args.plex_index or args.min_score is not None else None
 
-# Load cookies from the specified path
-cookie_jar = MozillaCookieJar(args.cookies_path)
-cookie_jar.load(ignore_discard=True, ignore_expires=True)
+# Spotify access tokens are cached next to the cookies file and reused until shortly before they expire
+spotify_tokens = SpotifyTokenManager(args.cookies_path, session=create_session(service='spotify'))
 
 # Function to determine Spotify type and extract ID
 def parse_spotify_url(spotify_url):
@@ -51,15 +64,9 @@ def parse_spotify_url(spotify_url):
         print("Error: Unsupported Spotify URL. Please provide a valid album or playlist URL.")
         sys.exit()
 
-# Function to get Spotify access token
+# Function to get Spotify access token (cached across runs)
 def get_spotify_access_token():
-    token_url = 'https://open.spotify.com/get_access_token'
-    response = requests.get(token_url, cookies=cookie_jar)
-    if response.status_code == 200:
-        return response.json().get('accessToken')
-    else:
-        print(f"Failed to retrieve access token: {response.status_code} - {response.text}")
-        return None
+    return spotify_tokens.get_access_token()
 
 # Function to get Spotify tracks from either a playlist or an album
 def get_spotify_tracks(spotify_id, spotify_type):
@@ -67,24 +74,18 @@ def get_spotify_tracks(spotify_id, spotify_type):
     if not access_token:
         exit("Unable to retrieve Spotify access token.")
 
-    # API URLs for playlist and album
-    url = f'https://api.spotify.com/v1/{spotify_type}s/{spotify_id}/tracks'
-    headers = {'Authorization': f'Bearer {access_token}'}
-    response = requests.get(url, headers=headers)
-    
-    if response.status_code != 200:
-        print(f"Failed to retrieve {spotify_type}: {response.status_code} - {response.text}")
+    # Fetch all pages of the playlist or album (remaining offsets are fetched concurrently)
+    tracks = get_spotify_collection_items(spotify_tokens, spotify_type, spotify_id)
+    if tracks is None:
         return []
 
-    tracks = response.json()['items']
-
     if spotify_type == 'playlist':
-        # For playlists, extract track details directly
-        return [(track['track']['name'], track['track']['artists'][0]['name'], track['track']['album']['name'], track['track']['external_urls']['spotify']) for track in tracks]
+        # For playlists, extract track details directly (skipping removed/unavailable entries)
+        return [(track['track']['name'], track['track']['artists'][0]['name'], track['track']['album']['name'], track['track']['external_urls'].get('spotify')) for track in tracks if track.get('track')]
     elif spotify_type == 'album':
         # For albums, get the album name separately
-        album_info_url = f'https://api.spotify.com/v1/albums/{spotify_id}'
-        album_info_response = requests.get(album_info_url, headers=headers)
+        album_info_url = f'{SPOTIFY_API_URL}/albums/{spotify_id}'
+        album_info_response = fetch_spotify_page(album_info_url, spotify_tokens, {'fields': 'name'})
         
         if album_info_response.status_code == 200:
             album_name = album_info_response.json()['name']
@@ -95,6 +96,10 @@ def get_spotify_tracks(spotify_id, spotify_type):
 
 # Enhanced function to search for track by artist, album, and track title in Plex with exact or fuzzy album match
 def find_track_in_plex(artist_name, track_name, album_name=None):
+    # Use the prefetched library index if enabled (no extra round trips)
+    if plex_index:
+        return plex_index.find_track(artist_name, track_name, album_name, args.force_album_match, args.min_score)
+
     # Search for the artist
     artist_results = [
         artist for artist in music_library.search(title=artist_name)
@@ -143,7 +148,7 @@ def find_track_in_plex(artist_name, track_name, album_name=None):
 # Function to create or update a Plex playlist based on specified behavior
 def create_or_update_plex_playlist(playlist_name, spotify_tracks):
     # Check if playlist already exists
-    existing_playlist = plex.playlist(playlist_name) if playlist_name in [p.title for p in plex.playlists()] else None
+    existing_playlist = plex_resolver(plex).find(playlist_name)
 
     # Handle existing playlist based on options
     if existing_playlist:
@@ -153,8 +158,8 @@ def create_or_update_plex_playlist(playlist_name, spotify_tracks):
             plex_tracks = [track for track in existing_tracks]  # Start with current tracks
 
         elif args.replace:
+            # Updated in place at the end (only removed, added and moved entries are written)
             print(f"Replacing existing playlist '{playlist_name}'.")
-            existing_playlist.delete()
             plex_tracks = []  # Start fresh for replacement
 
         else:
@@ -179,13 +184,14 @@ def create_or_update_plex_playlist(playlist_name, spotify_tracks):
             })
     
     # Create or update the playlist in Plex
-    if plex_tracks:
-        if existing_playlist and args.append:
-            # Add tracks to existing playlist
-            existing_playlist.addItems(plex_tracks)
-        else:
-            # Create a new playlist
-            plex.createPlaylist(playlist_name, items=plex_tracks)
+    if existing_playlist:
+        # Bring the existing playlist in line with the target list by a minimal diff
+        # (on append only the new tracks are added; the current ones are not re-added)
+        edits = update_plex_playlist(existing_playlist, plex_tracks)
+        print(f"Plex playlist '{playlist_name}' updated successfully with {len(plex_tracks)} tracks ({edits.summary()}).")
+    elif plex_tracks:
+        # Create a new playlist
+        plex.createPlaylist(playlist_name, items=plex_tracks)
         print(f"Plex playlist '{playlist_name}' updated successfully with {len(plex_tracks)} tracks.")
     else:
         print("No matching tracks found in Plex.")
@@ -1,11 +1,16 @@
-import requests
 from ytmusicapi import YTMusic
-from http.cookiejar import MozillaCookieJar
 import argparse
+import atexit
 import sys
 import csv
 import re
-import time
+from spotify_api import SpotifyTokenManager, get_spotify_playlist_items
+from ytmusic_api import iter_youtube_playlist_items
+from playlist_diff import update_youtube_playlist
+from playlist_resolver import youtube_resolver
+from http_sessions import create_session
+from api_metrics import api_metrics
+from retry_policy import RetryPolicy
 
 # Parse command-line arguments
 parser = argparse.ArgumentParser(description="Sync Spotify playlist to YouTube Music.")
@@ -19,11 +24,16 @@ parser.add_argument('--unmatched-output', help="File to save unmatched Spotify t
 parser.add_argument('--unmatched-format', choices=['text', 'csv'], default='text', help="Format of unmatched output file")
 parser.add_argument('--force-album-match', choices=['exact', 'fuzzy'], help="Enforce exact or fuzzy album match for track matching")
 parser.add_argument('--verbose', '-v', action='store_true', help="Enable verbose output for debugging")
+parser.add_argument('--metrics-output', help="Write per-endpoint API call counts, errors and latency histograms to this file at exit")
+parser.add_argument('--metrics-format', choices=['json', 'prometheus'], default='json', help="Format of --metrics-output: JSON summary or Prometheus textfile (default: json)")
 args = parser.parse_args()
 
-# Load Spotify cookies
-cookie_jar = MozillaCookieJar(args.cookies_path)
-cookie_jar.load(ignore_discard=True, ignore_expires=True)
+# Export the API call metrics when the script exits
+if args.metrics_output:
+    atexit.register(api_metrics.write, args.metrics_output, args.metrics_format)
+
+# Spotify access tokens are cached next to the cookies file and reused until shortly before they expire
+spotify_tokens = SpotifyTokenManager(args.cookies_path, session=create_session(service='spotify'))
 
 # Function to extract Spotify playlist ID
 def parse_spotify_url(spotify_url):
@@ -33,15 +43,9 @@ def parse_spotify_url(spotify_url):
     else:
         sys.exit("Error: Invalid Spotify playlist URL.")
 
-# Function to get Spotify access token
+# Function to get Spotify access token (cached across runs)
 def get_spotify_access_token():
-    token_url = 'https://open.spotify.com/get_access_token'
-    response = requests.get(token_url, cookies=cookie_jar)
-    if response.status_code == 200:
-        return response.json().get('accessToken')
-    else:
-        print(f"Failed to retrieve access token: {response.status_code} - {response.text}")
-        return None
+    return spotify_tokens.get_access_token()
 
 # Function to get Spotify playlist tracks
 def get_spotify_tracks(spotify_id):
@@ -49,41 +53,35 @@ def get_spotify_tracks(spotify_id):
     if not access_token:
         exit("Unable to retrieve Spotify access token.")
 
-    url = f'https://api.spotify.com/v1/playlists/{spotify_id}/tracks'
-    headers = {'Authorization': f'Bearer {access_token}'}
-    response = requests.get(url, headers=headers)
-    
-    if response.status_code != 200:
-        print(f"Failed to retrieve playlist: {response.status_code} - {response.text}")
+    # Fetch all pages of the playlist (remaining offsets are fetched concurrently)
+    items = get_spotify_playlist_items(spotify_tokens, spotify_id)
+    if items is None:
         return []
 
     return [
         {
-            'title': track['track']['name'],
-            'artist': track['track']['artists'][0]['name'],
-            'album': track['track']['album']['name']
+            'title': track['name'],
+            'artist': track['artists'][0]['name'],
+            'album': track['album']['name']
         }
-        for track in response.json()['items']
+        for track in items
     ]
 
 # Load YouTube Music API
-ytmusic = YTMusic(args.yt_oauth_json)
+ytmusic = YTMusic(args.yt_oauth_json, requests_session=create_session(service='ytmusic'))
+ytmusic_retry = RetryPolicy('YouTube Music', verbose=args.verbose)
 
 # Function to find or create YouTube Music playlist and add tracks
 def create_or_update_yt_playlist(playlist_name, spotify_tracks):
-    existing_playlist = None
-    
-    # Check if playlist exists
-    playlists = ytmusic.get_library_playlists()
-    for playlist in playlists:
-        if playlist['title'].lower() == playlist_name.lower():
-            existing_playlist = playlist
-            break
+    # Check if playlist exists (all pages of the library are searched)
+    existing_playlist = youtube_resolver(ytmusic, retry=ytmusic_retry).find(playlist_name)
     
+    # An existing playlist is replaced in place: matched tracks are collected and applied as a minimal diff at the end
+    replacing = bool(existing_playlist and args.replace)
     if existing_playlist:
-        if args.replace:
-            ytmusic.delete_playlist(existing_playlist['playlistId'])
-            existing_playlist = None  # Reset to create a new playlist
+        if replacing:
+            if args.verbose:
+                print(f"Replacing the contents of existing YouTube playlist '{playlist_name}'.")
         elif args.append:
             if args.verbose:
                 print(f"Appending to existing YouTube playlist '{playlist_name}'.")
@@ -98,10 +96,11 @@ def create_or_update_yt_playlist(playlist_name, spotify_tracks):
     
     unmatched_tracks = []  # Track unmatched items
 
-    # Retrieve current tracks in the playlist to avoid duplicates
+    # Retrieve current tracks in the playlist to avoid duplicates (a replaced playlist only keeps this run's tracks)
     existing_track_ids = set()
-    if existing_playlist:
-        existing_items = ytmusic.get_playlist(playlist_id, limit=500)['tracks']
+    target_track_ids = []
+    if existing_playlist and not replacing:
+        existing_items = iter_youtube_playlist_items(ytmusic, playlist_id, verbose=args.verbose, retry=ytmusic_retry)
         existing_track_ids.update(item['videoId'] for item in existing_items)
 
     # Search and add each Spotify track to YouTube playlist
@@ -117,29 +116,35 @@ def create_or_update_yt_playlist(playlist_name, spotify_tracks):
                 if args.verbose:
                     print(f"Track '{track['title']}' already exists in the playlist. Skipping.")
                 continue
-            
-            # Attempt to add the track, with error handling
+
+            if replacing:
+                target_track_ids.append(yt_track_id)
+                existing_track_ids.add(yt_track_id)
+                continue
+
+            # Attempt to add the track, retrying transient errors with backoff
             try:
-                ytmusic.add_playlist_items(playlist_id, [yt_track_id])
+                ytmusic_retry.call_write(ytmusic.add_playlist_items, playlist_id, [yt_track_id])
                 existing_track_ids.add(yt_track_id)  # Update set with added track ID
                 if args.verbose:
                     print(f"Added '{track['title']}' by '{track['artist']}' (Exact match)")
             except Exception as e:
-                print(f"Error adding track '{track['title']}': {e}. Retrying after delay.")
-                time.sleep(2)  # Wait before retrying
-                try:
-                    ytmusic.add_playlist_items(playlist_id, [yt_track_id])
-                    existing_track_ids.add(yt_track_id)
-                    if args.verbose:
-                        print(f"Added '{track['title']}' by '{track['artist']}' (Retry)")
-                except Exception as retry_e:
-                    print(f"Failed again on '{track['title']}'. Skipping this track.")
-                    unmatched_tracks.append(track)
+                print(f"Failed to add '{track['title']}' ({e}). Skipping this track.")
+                unmatched_tracks.append(track)
         else:
             if args.verbose:
                 print(f"No match found for '{track['title']}' by '{track['artist']}'")
             unmatched_tracks.append(track)
 
+    # Apply the replacement: only the removed, added and moved entries are written
+    if replacing:
+        try:
+            current_items = list(iter_youtube_playlist_items(ytmusic, playlist_id, retry=ytmusic_retry))
+            edits = update_youtube_playlist(ytmusic, playlist_id, current_items, target_track_ids, retry=ytmusic_retry)
+            print(f"Updated YouTube playlist '{playlist_name}': {edits.summary()}.")
+        except Exception as e:
+            print(f"Failed to update YouTube playlist '{playlist_name}' ({e}).")
+
     # Log unmatched tracks if specified
     if args.unmatched_output and unmatched_tracks:
         with open(args.unmatched_output, 'w', newline='') as f:
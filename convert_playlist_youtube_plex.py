@@ -1,9 +1,16 @@
 from ytmusicapi import YTMusic
 from plexapi.server import PlexServer
+from plex_library_index import PlexLibraryIndex
 import argparse
+import atexit
 import csv
 import sys
 import os
+from ytmusic_api import iter_youtube_playlist_items
+from http_sessions import create_session
+from api_metrics import api_metrics
+from playlist_diff import update_plex_playlist
+from playlist_resolver import plex_resolver
 
 # Argument parser setup
 parser = argparse.ArgumentParser(description="Sync YouTube Music playlist to Plex.")
@@ -18,40 +25,50 @@ parser.add_argument('--replace', action='store_true', help="Replace the existing
 parser.add_argument('--unmatched-output', help="File to save unmatched YouTube track info")
 parser.add_argument('--unmatched-format', choices=['text', 'csv'], default='text', help="Format of unmatched output file (text or csv)")
 parser.add_argument('--force-album-match', choices=['exact', 'fuzzy'], help="Enforce exact or fuzzy album match for track matching in Plex")
+parser.add_argument('--plex-index', action='store_true', help="Prefetch the whole Plex library section into an in-memory index for track matching")
+parser.add_argument('--min-score', type=float, help="Fall back to approximate (trigram) matching, accepting the best match scoring at least this (0-1; implies --plex-index)")
 
 # Stub for deprecated cookies path argument
 parser.add_argument('--cookies-path', help="Deprecated. Please use `ytmusicapi oauth` to generate an oauth.json file.")
+parser.add_argument('--metrics-output', help="Write per-endpoint API call counts, errors and latency histograms to this file at exit")
+parser.add_argument('--metrics-format', choices=['json', 'prometheus'], default='json', help="Format of --metrics-output: JSON summary or Prometheus textfile (default: json)")
 
 args = parser.parse_args()
 
+# Export the API call metrics when the script exits
+if args.metrics_output:
+    atexit.register(api_metrics.write, args.metrics_output, args.metrics_format)
+
 # Display warning if --cookies-path is used
 if args.cookies_path:
     print("Warning: --cookies-path is deprecated. Please use `ytmusicapi oauth` to generate an oauth.json file.")
 
 # Initialize Plex server
-plex = PlexServer(args.plex_url, args.plex_token)
+plex = PlexServer(args.plex_url, args.plex_token, session=create_session(service='plex'))
 music_library = plex.library.section(args.plex_library)
+plex_index = PlexLibraryIndex.from_section(music_library, verbose=True) if args.plex_index or args.min_score is not None else None
 
 # Initialize YTMusic with OAuth JSON for authenticated access
 if not os.path.exists(args.oauth_json_path):
     sys.exit(f"OAuth file not found at {args.oauth_json_path}. Please run `ytmusicapi oauth` to generate this file.")
-ytmusic = YTMusic(args.oauth_json_path)
+ytmusic = YTMusic(args.oauth_json_path, requests_session=create_session(service='ytmusic'))
 
-# Fetch tracks from YouTube Music playlist
+# Stream tracks from YouTube Music playlist (generator: tracks are yielded page by page as they arrive)
 def get_youtube_music_tracks(playlist_id):
-    playlist = ytmusic.get_playlist(playlist_id)
-    tracks = []
-    for track in playlist['tracks']:
+    for track in iter_youtube_playlist_items(ytmusic, playlist_id):
         album_name = track['album']['name'] if track.get('album') and track['album'].get('name') else 'Unknown Album'
-        tracks.append({
+        yield {
             'name': track['title'],
             'artist': track['artists'][0]['name'],
             'album': album_name
-        })
-    return tracks
+        }
 
 # Enhanced function to search for track by artist, album, and track title in Plex with exact or fuzzy album match
 def find_track_in_plex(artist_name, track_name, album_name=None):
+    # Use the prefetched library index if enabled (no extra round trips)
+    if plex_index:
+        return plex_index.find_track(artist_name, track_name, None if album_name == 'Unknown Album' else album_name, args.force_album_match, args.min_score)
+
     artist_results = [
         artist for artist in music_library.search(title=artist_name)
         if artist.type == 'artist' and artist.title.lower() == artist_name.lower()
@@ -93,7 +110,7 @@ def find_track_in_plex(artist_name, track_name, album_name=None):
 
 # Function to create or update a Plex playlist
 def create_or_update_plex_playlist(playlist_name, youtube_tracks):
-    existing_playlist = plex.playlist(playlist_name) if playlist_name in [p.title for p in plex.playlists()] else None
+    existing_playlist = plex_resolver(plex).find(playlist_name)
 
     if existing_playlist:
         if args.append:
@@ -101,8 +118,8 @@ def create_or_update_plex_playlist(playlist_name, youtube_tracks):
             existing_tracks = existing_playlist.items()
             plex_tracks = [track for track in existing_tracks]
         elif args.replace:
+            # Updated in place at the end (only removed, added and moved entries are written)
             print(f"Replacing existing playlist '{playlist_name}'.")
-            existing_playlist.delete()
             plex_tracks = []
         else:
             sys.exit(f"Warning: Playlist '{playlist_name}' already exists. Specify --append or --replace to proceed.")
@@ -123,11 +140,12 @@ def create_or_update_plex_playlist(playlist_name, youtube_tracks):
                 "album_name": track['album']
             })
 
-    if plex_tracks:
-        if existing_playlist and args.append:
-            existing_playlist.addItems(plex_tracks)
-        else:
-            plex.createPlaylist(playlist_name, items=plex_tracks)
+    if existing_playlist:
+        # Bring the existing playlist in line with the target list by a minimal diff
+        edits = update_plex_playlist(existing_playlist, plex_tracks)
+        print(f"Plex playlist '{playlist_name}' updated successfully with {len(plex_tracks)} tracks ({edits.summary()}).")
+    elif plex_tracks:
+        plex.createPlaylist(playlist_name, items=plex_tracks)
         print(f"Plex playlist '{playlist_name}' updated successfully with {len(plex_tracks)} tracks.")
     else:
         print("No matching tracks found in Plex.")
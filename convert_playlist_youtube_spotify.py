@@ -1,13 +1,21 @@
-import requests
 import spotipy
 from spotipy.oauth2 import SpotifyOAuth
 from ytmusicapi import YTMusic
-from http.cookiejar import MozillaCookieJar
 import argparse
+import atexit
 import sys
 import csv
 import re
 import time
+from ytmusic_api import iter_youtube_playlist_items
+from spotify_api import SpotifyTokenManager, get_spotify_playlist_track_ids
+from playlist_diff import update_spotify_playlist
+from playlist_resolver import spotify_resolver
+from http_sessions import create_session
+from api_metrics import api_metrics
+
+# Keep-alive session shared by the Spotify token fetches and spotipy
+spotify_session = create_session(service='spotify')
 
 # Parse command-line arguments
 parser = argparse.ArgumentParser(description="Sync YouTube Music playlist to Spotify.")
@@ -20,10 +28,16 @@ parser.add_argument('--replace', action='store_true', help="Replace the existing
 parser.add_argument('--unmatched-output', help="File to save unmatched YouTube track details")
 parser.add_argument('--unmatched-format', choices=['text', 'csv'], default='text', help="Format of unmatched output file")
 parser.add_argument('--verbose', '-v', action='store_true', help="Enable verbose output for debugging")
+parser.add_argument('--metrics-output', help="Write per-endpoint API call counts, errors and latency histograms to this file at exit")
+parser.add_argument('--metrics-format', choices=['json', 'prometheus'], default='json', help="Format of --metrics-output: JSON summary or Prometheus textfile (default: json)")
 args = parser.parse_args()
 
+# Export the API call metrics when the script exits
+if args.metrics_output:
+    atexit.register(api_metrics.write, args.metrics_output, args.metrics_format)
+
 # Load YouTube Music API
-ytmusic = YTMusic(args.yt_oauth_json)
+ytmusic = YTMusic(args.yt_oauth_json, requests_session=create_session(service='ytmusic'))
 
 # Function to extract YouTube playlist ID from URL
 def parse_youtube_url(yt_url):
@@ -33,30 +47,21 @@ def parse_youtube_url(yt_url):
     else:
         sys.exit("Error: Invalid YouTube Music playlist URL.")
 
-# Function to retrieve YouTube Music playlist tracks by ID
+# Function to stream YouTube Music playlist tracks by ID (generator: tracks are yielded page by page as they arrive)
 def get_youtube_playlist_tracks(yt_playlist_id):
-    yt_tracks = []
-    playlist_items = ytmusic.get_playlist(yt_playlist_id, limit=500)['tracks']
-    for item in playlist_items:
-        yt_tracks.append({
+    for item in iter_youtube_playlist_items(ytmusic, yt_playlist_id, verbose=args.verbose):
+        yield {
             'title': item['title'],
             'artist': item['artists'][0]['name'],
             'album': item.get('album', {}).get('name') if item.get('album') else None
-        })
-    if args.verbose:
-        print(f"Retrieved {len(yt_tracks)} tracks from YouTube Music playlist with ID '{yt_playlist_id}'.")
-    return yt_tracks
+        }
 
-# Initialize Spotify API with cookie-based auth
+# Initialize Spotify API with cookie-based auth (token cached across runs and refreshed before it expires)
 def spotify_authenticate(cookies_path):
-    token_url = 'https://open.spotify.com/get_access_token'
-    cookie_jar = MozillaCookieJar(cookies_path)
-    cookie_jar.load(ignore_discard=True, ignore_expires=True)
-    response = requests.get(token_url, cookies=cookie_jar)
-    if response.status_code == 200:
-        return response.json().get('accessToken')
-    else:
-        sys.exit(f"Failed to retrieve Spotify access token: {response.status_code} - {response.text}")
+    token_manager = SpotifyTokenManager(cookies_path, session=spotify_session)
+    if not token_manager.get_access_token():
+        sys.exit("Error: Unable to retrieve Spotify access token.")
+    return token_manager
 
 # Search for a track on Spotify using title and artist (and album, if available)
 def search_spotify_track(spotify, title, artist, album=None):
@@ -71,15 +76,14 @@ def search_spotify_track(spotify, title, artist, album=None):
 
 # Add tracks to Spotify playlist
 def create_or_update_spotify_playlist(spotify, playlist_name, yt_tracks):
-    # Check if playlist exists
-    playlists = spotify.current_user_playlists()['items']
-    existing_playlist = next((p for p in playlists if p['name'].lower() == playlist_name.lower()), None)
+    # Check if playlist exists (all pages of the user's playlists are searched)
+    existing_playlist = spotify_resolver(spotify).find(playlist_name)
     
-    # Create new playlist if not existing or replace is selected
+    # Create new playlist if not existing; with --replace, an existing playlist is updated in place (minimal diff)
+    replacing = bool(existing_playlist and args.replace)
     if existing_playlist:
-        if args.replace:
-            spotify.user_playlist_unfollow(spotify.me()['id'], existing_playlist['id'])
-            existing_playlist = None
+        if replacing:
+            print(f"Replacing the contents of existing Spotify playlist '{playlist_name}'.")
         elif args.append:
             print(f"Appending to existing Spotify playlist '{playlist_name}'.")
     
@@ -104,9 +108,17 @@ def create_or_update_spotify_playlist(spotify, playlist_name, yt_tracks):
             if args.verbose:
                 print(f"No match found for '{track['title']}' by '{track['artist']}'")
 
-    # Add tracks in batches of 100 (Spotify API limit)
-    for i in range(0, len(track_ids_to_add), 100):
-        spotify.playlist_add_items(playlist_id, track_ids_to_add[i:i+100])
+    if replacing:
+        # Only the removed, added and moved entries are written
+        current_ids = get_spotify_playlist_track_ids(spotify_tokens, playlist_id)
+        if current_ids is None:
+            sys.exit(f"Error: Unable to read Spotify playlist '{playlist_name}'.")
+        edits = update_spotify_playlist(spotify, playlist_id, current_ids, track_ids_to_add)
+        print(f"Updated Spotify playlist '{playlist_name}': {edits.summary()}.")
+    else:
+        # Add tracks in batches of 100 (Spotify API limit)
+        for i in range(0, len(track_ids_to_add), 100):
+            spotify.playlist_add_items(playlist_id, track_ids_to_add[i:i+100])
 
     # Log unmatched tracks if specified
     if args.unmatched_output and unmatched_tracks:
@@ -124,6 +136,6 @@ def create_or_update_spotify_playlist(spotify, playlist_name, yt_tracks):
 # Run the sync process
 yt_playlist_id = parse_youtube_url(args.yt_url)
 youtube_tracks = get_youtube_playlist_tracks(yt_playlist_id)
-spotify_access_token = spotify_authenticate(args.cookies_path)
-spotify = spotipy.Spotify(auth=spotify_access_token)
+spotify_tokens = spotify_authenticate(args.cookies_path)
+spotify = spotipy.Spotify(auth_manager=spotify_tokens, requests_session=spotify_session)
 create_or_update_spotify_playlist(spotify, args.spotify_playlist_name or "YouTube Synced Playlist", youtube_tracks)
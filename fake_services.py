@@ -0,0 +1,484 @@
+"""
+fake_services.py
+
+Description:
+    In-process stand-ins for the Spotify Web API (raw HTTP and spotipy), YouTube Music (ytmusicapi)
+    and Plex (plexapi), used by benchmark_sync.py to run the sync scripts offline.
+    All three services serve the same synthetic catalog, so every source track can be found on every
+    destination. Only the methods the sync scripts call are implemented, with the shapes those
+    scripts read. Every call is counted per service and endpoint (one count per HTTP request the
+    real client would make, e.g. one per page of a paged listing), and can be given a simulated
+    latency so that concurrency shows up in wall time.
+"""
+
+import math
+import re
+import threading
+import time
+from datetime import datetime
+from urllib.parse import urlparse
+from xml.etree import ElementTree
+
+BENCHMARK_PLAYLIST = 'Benchmark'
+
+# Synthetic catalog layout: songs per album and albums per artist
+ALBUM_SIZE = 10
+ARTIST_ALBUMS = 2
+
+# Page sizes of the real services' paged listings
+SPOTIFY_PAGE_SIZE = 100
+YTMUSIC_PAGE_SIZE = 100
+
+LIBRARY_UPDATED_AT = datetime(2024, 1, 1)
+
+
+class CallCounter:
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.counts = {}
+        self.lock = threading.Lock()
+
+    # Count one request to service/endpoint (count > 1 for listings the real client pages through)
+    def record(self, service, endpoint, count=1):
+        with self.lock:
+            self.counts[(service, endpoint)] = self.counts.get((service, endpoint), 0) + count
+        if self.latency:
+            time.sleep(self.latency * count)
+
+    def by_service(self):
+        totals = {}
+        for (service, _), count in self.counts.items():
+            totals[service] = totals.get(service, 0) + count
+        return totals
+
+
+# One song of the synthetic catalog, as each service identifies it
+class Song:
+    def __init__(self, number):
+        self.number = number
+        self.title = f"Song {number}"
+        self.artist = f"Artist {number // (ALBUM_SIZE * ARTIST_ALBUMS)}"
+        self.album = f"Album {number // ALBUM_SIZE}"
+        self.spotify_id = f"sp{number}"
+        self.video_id = f"yt{number}"
+        self.rating_key = number + 1
+        self.isrc = f"BENCH{number:07d}"
+        self.mbid = f"00000000-0000-4000-8000-{number:012d}"
+
+
+class Catalog:
+    # songs: number of songs on every service; the benchmark playlist holds the first playlist_size songs
+    def __init__(self, songs, playlist_size):
+        self.songs = [Song(number) for number in range(songs)]
+        self.playlist = self.songs[:playlist_size]
+        self.by_query = {}
+        for song in self.songs:
+            self.by_query[f"{song.title} {song.artist}"] = song
+            self.by_query[f"{song.title} {song.artist} {song.album}"] = song
+        self.by_spotify_id = {song.spotify_id: song for song in self.songs}
+        self.by_video_id = {song.video_id: song for song in self.songs}
+        self.by_isrc = {song.isrc: song for song in self.songs}
+
+
+class FakeResponse:
+    def __init__(self, data, status_code=200):
+        self.data = data
+        self.status_code = status_code
+        self.headers = {}
+        self.text = str(data)
+
+    def json(self):
+        return self.data
+
+
+# Raw Spotify Web API as used through requests (token endpoint and paged playlist listings)
+class FakeSpotifyHTTP:
+    # spotify: the FakeSpotify whose playlists are served besides the benchmark playlist
+    def __init__(self, catalog, counter, spotify=None):
+        self.catalog = catalog
+        self.counter = counter
+        self.spotify = spotify
+
+    def get(self, url, headers=None, params=None, cookies=None):
+        path = urlparse(url).path
+        params = params or {}
+        if path.endswith('/get_access_token'):
+            self.counter.record('spotify', 'token')
+            return FakeResponse({'accessToken': 'benchmark-token', 'accessTokenExpirationTimestampMs': (time.time() + 3600) * 1000})
+        if re.fullmatch(r'/v1/playlists/[^/]+/tracks', path):
+            self.counter.record('spotify', 'playlist_tracks')
+            playlist_id = path.split('/')[3]
+            if self.spotify and playlist_id in self.spotify.playlists:
+                songs = [self.catalog.by_spotify_id[track_id] for track_id in self.spotify.playlists[playlist_id]['tracks']]
+            else:
+                songs = self.catalog.playlist
+            offset = params.get('offset', 0)
+            page = songs[offset:offset + params.get('limit', SPOTIFY_PAGE_SIZE)]
+            return FakeResponse({'total': len(songs), 'items': [{'track': spotify_track(song)} for song in page]})
+        if re.fullmatch(r'/v1/playlists/[^/]+', path):
+            self.counter.record('spotify', 'playlist')
+            return FakeResponse({'snapshot_id': f"snapshot-{len(self.catalog.playlist)}"})
+        return FakeResponse({'error': 'not found'}, 404)
+
+    def close(self):
+        pass
+
+
+def spotify_track(song):
+    return {
+        'id': song.spotify_id,
+        'name': song.title,
+        'artists': [{'name': song.artist}],
+        'album': {'name': song.album},
+        'external_ids': {'isrc': song.isrc},
+        'external_urls': {'spotify': f"https://open.spotify.com/track/{song.spotify_id}"},
+    }
+
+
+# spotipy.Spotify stand-in
+class FakeSpotify:
+    def __init__(self, catalog, counter):
+        self.catalog = catalog
+        self.counter = counter
+        self.playlists = {}
+        self.lock = threading.Lock()
+
+    def search(self, q, type='track', limit=10, **kwargs):
+        self.counter.record('spotify', 'search')
+        song = self.catalog.by_isrc.get(q[len('isrc:'):]) if q.startswith('isrc:') else self.catalog.by_query.get(q)
+        return {'tracks': {'items': [spotify_track(song)] if song else []}}
+
+    def me(self):
+        self.counter.record('spotify', 'me')
+        return {'id': 'benchmark-user'}
+
+    def current_user_playlists(self, limit=50, offset=0):
+        self.counter.record('spotify', 'current_user_playlists')
+        playlists = [{'id': playlist_id, 'name': playlist['name']} for playlist_id, playlist in self.playlists.items()]
+        more = offset + limit < len(playlists)
+        return {'items': playlists[offset:offset + limit], 'total': len(playlists), 'next': 'next-page' if more else None}
+
+    def user_playlist_create(self, user, name, public=True, **kwargs):
+        self.counter.record('spotify', 'playlist_create')
+        with self.lock:
+            playlist_id = f"playlist{len(self.playlists) + 1}"
+            self.playlists[playlist_id] = {'name': name, 'tracks': []}
+        return {'id': playlist_id, 'name': name}
+
+    def user_playlist_unfollow(self, user, playlist_id):
+        self.counter.record('spotify', 'playlist_unfollow')
+        self.playlists.pop(playlist_id, None)
+
+    def playlist_add_items(self, playlist_id, items, position=None):
+        self.counter.record('spotify', 'playlist_add_items')
+        with self.lock:
+            self.playlists[playlist_id]['tracks'].extend(items)
+        return {'snapshot_id': 'added'}
+
+    def playlist_remove_specific_occurrences_of_items(self, playlist_id, items, snapshot_id=None):
+        self.counter.record('spotify', 'playlist_remove_items')
+        with self.lock:
+            tracks = self.playlists[playlist_id]['tracks']
+            for position in sorted((position for item in items for position in item['positions']), reverse=True):
+                del tracks[position]
+
+    def playlist_reorder_items(self, playlist_id, range_start, insert_before, range_length=1, snapshot_id=None):
+        self.counter.record('spotify', 'playlist_reorder_items')
+        with self.lock:
+            tracks = self.playlists[playlist_id]['tracks']
+            moved = tracks[range_start:range_start + range_length]
+            del tracks[range_start:range_start + range_length]
+            if insert_before > range_start:
+                insert_before -= range_length
+            tracks[insert_before:insert_before] = moved
+
+    def playlist_remove_all_occurrences_of_items(self, playlist_id, items):
+        self.counter.record('spotify', 'playlist_remove_items')
+        with self.lock:
+            removed = set(items)
+            tracks = self.playlists[playlist_id]['tracks']
+            tracks[:] = [track for track in tracks if track not in removed]
+
+    def written(self):
+        return sum(len(playlist['tracks']) for playlist in self.playlists.values())
+
+
+def youtube_track(song):
+    return {
+        'videoId': song.video_id,
+        'setVideoId': f"set-{song.video_id}",
+        'title': song.title,
+        'artists': [{'name': song.artist}],
+        'album': {'name': song.album},
+    }
+
+
+# ytmusicapi.YTMusic stand-in (playlists are read through get_playlist, counted per 100-track page)
+class FakeYTMusic:
+    def __init__(self, catalog, counter):
+        self.catalog = catalog
+        self.counter = counter
+        self.playlists = {'bench': {'title': BENCHMARK_PLAYLIST, 'tracks': [song.video_id for song in catalog.playlist]}}
+        self.library_playlists = []
+        self.lock = threading.Lock()
+
+    def search(self, query, filter=None, limit=20, **kwargs):
+        self.counter.record('ytmusic', 'search')
+        song = self.catalog.by_query.get(query)
+        return [youtube_track(song)] if song else []
+
+    def get_playlist(self, playlist_id, limit=100, **kwargs):
+        tracks = self.playlists[playlist_id]['tracks']
+        if limit is not None:
+            tracks = tracks[:limit]
+        self.counter.record('ytmusic', 'get_playlist', max(1, math.ceil(len(tracks) / YTMUSIC_PAGE_SIZE)))
+        return {'tracks': [youtube_track(self.catalog.by_video_id[video_id]) for video_id in tracks]}
+
+    def get_library_playlists(self, limit=25):
+        self.counter.record('ytmusic', 'get_library_playlists')
+        return [{'playlistId': playlist_id, 'title': self.playlists[playlist_id]['title']} for playlist_id in self.library_playlists]
+
+    def create_playlist(self, title, description, **kwargs):
+        self.counter.record('ytmusic', 'create_playlist')
+        with self.lock:
+            playlist_id = f"playlist{len(self.playlists) + 1}"
+            self.playlists[playlist_id] = {'title': title, 'tracks': []}
+            self.library_playlists.append(playlist_id)
+        return playlist_id
+
+    def delete_playlist(self, playlist_id):
+        self.counter.record('ytmusic', 'delete_playlist')
+        with self.lock:
+            self.playlists.pop(playlist_id, None)
+            self.library_playlists.remove(playlist_id)
+
+    def add_playlist_items(self, playlist_id, video_ids, **kwargs):
+        self.counter.record('ytmusic', 'add_playlist_items')
+        with self.lock:
+            self.playlists[playlist_id]['tracks'].extend(video_ids)
+        return {'status': 'STATUS_SUCCEEDED',
+                'playlistEditResults': [{'videoId': video_id, 'setVideoId': f"set-{video_id}"} for video_id in video_ids]}
+
+    # Only moveItem=setVideoId (to the end) or (setVideoId, successor setVideoId) is supported
+    def edit_playlist(self, playlist_id, moveItem=None, **kwargs):
+        self.counter.record('ytmusic', 'edit_playlist')
+        moved, successor = (moveItem, None) if isinstance(moveItem, str) else moveItem
+        with self.lock:
+            tracks = self.playlists[playlist_id]['tracks']
+            video_id = moved[len('set-'):]
+            tracks.remove(video_id)
+            position = tracks.index(successor[len('set-'):]) if successor else len(tracks)
+            tracks.insert(position, video_id)
+        return 'STATUS_SUCCEEDED'
+
+    def remove_playlist_items(self, playlist_id, videos):
+        self.counter.record('ytmusic', 'remove_playlist_items')
+        removed = set(video['videoId'] for video in videos)
+        with self.lock:
+            tracks = self.playlists[playlist_id]['tracks']
+            tracks[:] = [video_id for video_id in tracks if video_id not in removed]
+
+    def written(self):
+        return sum(len(self.playlists[playlist_id]['tracks']) for playlist_id in self.library_playlists)
+
+
+class FakePlexGuid:
+    def __init__(self, guid):
+        self.id = guid
+
+
+# Library tracks carry a MusicBrainz recording ID Guid tag, as tracks matched by Plex's music agent do
+class FakePlexTrack:
+    TYPE = 'track'
+    type = 'track'
+
+    def __init__(self, song):
+        self.ratingKey = song.rating_key
+        self.title = song.title
+        self.grandparentTitle = song.artist
+        self.originalTitle = None
+        self.parentTitle = song.album
+        self.updatedAt = LIBRARY_UPDATED_AT
+        self.addedAt = LIBRARY_UPDATED_AT
+        self.guids = [FakePlexGuid(f"mbid://{song.mbid}")]
+
+
+class FakePlexAlbum:
+    type = 'album'
+
+    def __init__(self, title, counter):
+        self.title = title
+        self.counter = counter
+        self.track_list = []
+
+    def tracks(self):
+        self.counter.record('plex', 'album_tracks')
+        return list(self.track_list)
+
+
+class FakePlexArtist:
+    type = 'artist'
+
+    def __init__(self, title, counter):
+        self.title = title
+        self.counter = counter
+        self.album_list = []
+
+    def albums(self):
+        self.counter.record('plex', 'artist_albums')
+        return list(self.album_list)
+
+
+class FakePlexSection:
+    def __init__(self, catalog, counter, title='Music'):
+        self.title = title
+        self.uuid = 'benchmark-section'
+        self.key = 1
+        self.updatedAt = LIBRARY_UPDATED_AT
+        self.counter = counter
+        self.tracks = [FakePlexTrack(song) for song in catalog.songs]
+        self.by_rating_key = {track.ratingKey: track for track in self.tracks}
+        artists = {}
+        albums = {}
+        for song, track in zip(catalog.songs, self.tracks):
+            artist = artists.get(song.artist)
+            if artist is None:
+                artist = artists[song.artist] = FakePlexArtist(song.artist, counter)
+            album = albums.get(song.album)
+            if album is None:
+                album = albums[song.album] = FakePlexAlbum(song.album, counter)
+                artist.album_list.append(album)
+            album.track_list.append(track)
+        self.artists = list(artists.values())
+
+    # Hub search by title: every artist whose name contains the query
+    def search(self, title=None, **kwargs):
+        self.counter.record('plex', 'search')
+        query = (title or '').lower()
+        return [artist for artist in self.artists if query in artist.title.lower()]
+
+    def searchTracks(self, container_size=None, filters=None, **kwargs):
+        tracks = self.tracks
+        if filters:
+            since = filters['or'][0]['updatedAt>>']
+            tracks = [track for track in tracks if track.updatedAt > since or track.addedAt > since]
+        self.counter.record('plex', 'search_tracks', max(1, math.ceil(len(tracks) / (container_size or 100))))
+        return list(tracks)
+
+    def totalViewSize(self, libtype=None, **kwargs):
+        self.counter.record('plex', 'total_view_size')
+        return len(self.tracks)
+
+
+class FakePlexPlaylist:
+    def __init__(self, server, title, items):
+        self.server = server
+        self.title = title
+        self.key = f"/playlists/{id(self)}"
+        self.item_list = list(items)
+
+    def items(self):
+        self.server.counter.record('plex', 'playlist_items', max(1, math.ceil(len(self.item_list) / 100)))
+        return list(self.item_list)
+
+    def addItems(self, items):
+        self.server.counter.record('plex', 'playlist_add_items')
+        self.item_list.extend(items)
+
+    def removeItems(self, items):
+        self.server.counter.record('plex', 'playlist_remove_items', len(items))
+        # Like plexapi, each item deletes the first entry with its ratingKey, so a second copy in the same call fails
+        removed = set()
+        for item in items:
+            position = next(i for i, entry in enumerate(self.item_list) if entry.ratingKey == item.ratingKey)
+            if position in removed:
+                raise Exception(f"(404) not_found; item {item.ratingKey} was already removed")
+            removed.add(position)
+        self.item_list = [entry for i, entry in enumerate(self.item_list) if i not in removed]
+
+    def moveItem(self, item, after=None):
+        self.server.counter.record('plex', 'playlist_move_item')
+        moved = next(entry for entry in self.item_list if entry.ratingKey == item.ratingKey)
+        self.item_list.remove(moved)
+        position = next(i for i, entry in enumerate(self.item_list) if entry.ratingKey == after.ratingKey) + 1 if after else 0
+        self.item_list.insert(position, moved)
+
+    def reload(self):
+        self.server.counter.record('plex', 'playlist_reload')
+
+    def delete(self):
+        self.server.counter.record('plex', 'playlist_delete')
+        self.server.playlist_list.remove(self)
+
+
+class FakeLibrary:
+    def __init__(self, server):
+        self.server = server
+
+    def section(self, title):
+        self.server.counter.record('plex', 'library_section')
+        return self.server.music
+
+
+# plexapi.server.PlexServer stand-in
+class FakePlexServer:
+    # source_playlist: whether the benchmark playlist exists on the server (Plex is the source service)
+    def __init__(self, catalog, counter, source_playlist=True):
+        self.counter = counter
+        self.music = FakePlexSection(catalog, counter)
+        self.music._server = self
+        self.library = FakeLibrary(self)
+        self.playlist_list = []
+        self.created = []
+        if source_playlist:
+            source = [self.music.by_rating_key[song.rating_key] for song in catalog.playlist]
+            self.playlist_list.append(FakePlexPlaylist(self, BENCHMARK_PLAYLIST, source))
+        self.lock = threading.Lock()
+
+    # Connection handshake cache interface of plex_server_cache.CachedPlexServer (never cached here)
+    handshake_cached = False
+
+    def save_handshake(self):
+        pass
+
+    def invalidate_handshake(self):
+        pass
+
+    # Raw XML listing of the music section's tracks (only what list_rating_keys reads), one page per request
+    def query(self, key, params=None, **kwargs):
+        self.counter.record('plex', 'section_listing')
+        params = params or {}
+        start = params.get('X-Plex-Container-Start', 0)
+        tracks = self.music.tracks[start:start + params.get('X-Plex-Container-Size', 100)]
+        data = ElementTree.Element('MediaContainer', totalSize=str(len(self.music.tracks)))
+        for track in tracks:
+            ElementTree.SubElement(data, 'Track', ratingKey=str(track.ratingKey))
+        return data
+
+    def playlists(self):
+        self.counter.record('plex', 'playlists')
+        return list(self.playlist_list)
+
+    def playlist(self, title):
+        self.counter.record('plex', 'playlist')
+        return next(playlist for playlist in self.playlist_list if playlist.title == title)
+
+    def createPlaylist(self, title, items=None, **kwargs):
+        self.counter.record('plex', 'create_playlist')
+        playlist = FakePlexPlaylist(self, title, items or [])
+        with self.lock:
+            self.playlist_list.append(playlist)
+            self.created.append(playlist)
+        return playlist
+
+    def fetchItem(self, ekey, **kwargs):
+        self.counter.record('plex', 'fetch_item')
+        return next(playlist for playlist in self.playlist_list if playlist.key == ekey)
+
+    def fetchItems(self, ekey, **kwargs):
+        self.counter.record('plex', 'fetch_items')
+        keys = ekey.rsplit('/', 1)[-1].split(',')
+        return [self.music.by_rating_key[int(key)] for key in keys if int(key) in self.music.by_rating_key]
+
+    def written(self):
+        return sum(len(playlist.item_list) for playlist in self.created if playlist in self.playlist_list)
@@ -0,0 +1,108 @@
+"""
+http_sessions.py
+
+Description:
+    Shared HTTP sessions for the playlist sync scripts.
+    One requests.Session per service (Spotify, YouTube Music, Plex) is created with a keep-alive
+    connection pool sized to the number of concurrent workers, and handed to every client that talks
+    to that service: the raw Spotify Web API calls in spotify_api.py, spotipy, ytmusicapi and plexapi.
+    Connections are then reused across requests and threads instead of paying for a new TCP/TLS
+    handshake per call. Pool statistics (connections opened vs. requests sent, per host) show whether
+    the reuse is actually happening.
+    Every request sent through these sessions is recorded in api_metrics (count, errors and latency
+    per service endpoint).
+"""
+
+import threading
+import time
+import requests
+from requests.adapters import HTTPAdapter
+from api_metrics import api_metrics, endpoint_name
+
+# Default number of keep-alive connections kept per host
+DEFAULT_POOL_SIZE = 10
+
+# Number of per-host pools a session keeps (e.g. api.spotify.com, open.spotify.com, accounts.spotify.com)
+POOL_HOSTS = 4
+
+
+# Transport adapter that records the latency and outcome of every request it sends
+class InstrumentedAdapter(HTTPAdapter):
+    def __init__(self, service, metrics=api_metrics, **kwargs):
+        super().__init__(**kwargs)
+        self.service = service
+        self.metrics = metrics
+
+    def send(self, request, **kwargs):
+        endpoint = endpoint_name(request.method, request.url)
+        start = time.perf_counter()
+        try:
+            response = super().send(request, **kwargs)
+        except Exception:
+            self.metrics.record(self.service, endpoint, time.perf_counter() - start, error=True)
+            raise
+        self.metrics.record(self.service, endpoint, time.perf_counter() - start, error=response.status_code >= 400)
+        return response
+
+
+# Create a session whose connection pools keep up to pool_size idle connections per host;
+# its requests are recorded in api_metrics under the service name
+def create_session(pool_size=DEFAULT_POOL_SIZE, service='http'):
+    session = requests.Session()
+    adapter = InstrumentedAdapter(service, pool_connections=POOL_HOSTS, pool_maxsize=max(1, pool_size))
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+
+# Connection statistics of a session's pools: one dict per host with the number of connections
+# opened and requests sent (requests / connections is the average reuse per connection)
+def session_pool_stats(session):
+    stats = []
+    # The same adapter is mounted for http:// and https://
+    for adapter in {id(adapter): adapter for adapter in session.adapters.values()}.values():
+        pools = adapter.poolmanager.pools
+        for key in list(pools.keys()):
+            pool = pools.get(key)
+            if pool is None:
+                continue
+            stats.append({
+                'host': f"{pool.scheme}://{pool.host}:{pool.port}",
+                'connections': pool.num_connections,
+                'requests': pool.num_requests,
+            })
+    return stats
+
+
+class SessionFactory:
+    # pool_size should match the number of threads that may talk to one service at the same time
+    def __init__(self, pool_size=DEFAULT_POOL_SIZE):
+        self.pool_size = pool_size
+        self.sessions = {}
+        self.lock = threading.Lock()
+
+    # The shared session for a service, created on first use
+    def get(self, service):
+        with self.lock:
+            if service not in self.sessions:
+                self.sessions[service] = create_session(self.pool_size, service)
+            return self.sessions[service]
+
+    # Pool statistics of every session, keyed by service
+    def stats(self):
+        with self.lock:
+            sessions = dict(self.sessions)
+        return {service: session_pool_stats(session) for service, session in sessions.items()}
+
+    def print_stats(self):
+        for service, hosts in self.stats().items():
+            for host in hosts:
+                reuse = host['requests'] / host['connections'] if host['connections'] else 0
+                print(f"HTTP pool {service} {host['host']}: {host['requests']} requests over "
+                      f"{host['connections']} connections ({reuse:.1f} requests per connection).")
+
+    def close(self):
+        with self.lock:
+            for session in self.sessions.values():
+                session.close()
+            self.sessions.clear()
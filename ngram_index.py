@@ -0,0 +1,97 @@
+"""
+ngram_index.py
+
+Description:
+    Character n-gram (trigram by default) inverted index for approximate string matching.
+    Every indexed string is split into overlapping character n-grams, and each n-gram maps to the
+    list of documents containing it. A query only touches the posting lists of its own n-grams, so
+    the top-k most similar strings are found without comparing against every indexed string.
+    Very common n-grams (present in more than STOP_GRAM_FRACTION of the documents) are skipped
+    while gathering candidates; the best candidates are then rescored exactly with the Dice
+    coefficient of their n-gram sets (1.0 = identical sets, 0.0 = nothing in common).
+"""
+
+import heapq
+import re
+from array import array
+
+DEFAULT_N = 3
+
+# N-grams found in more than this fraction of the documents are not used to gather candidates
+STOP_GRAM_FRACTION = 0.05
+
+# Number of candidates (per requested result) rescored exactly after the posting-list count
+CANDIDATE_FACTOR = 10
+
+# Decorations that commonly differ between services: "(Remastered 2011)", "[Live]", "- 2011 Remaster",
+# "feat. X" / "ft. X" / "with X" credits
+DECORATIONS = re.compile(r"\([^)]*\)|\[[^\]]*\]|\s-\s.*$|\s(?:feat\.?|ft\.?|featuring)\s.*$")
+
+
+# Lowercase, strip decorations and punctuation, and collapse whitespace for fuzzy comparison
+def clean_text(value):
+    if not value:
+        return ''
+    value = value.casefold()
+    stripped = DECORATIONS.sub(' ', value)
+    # Keep the original if stripping would leave nothing (e.g. a title that is only "(Intro)")
+    value = stripped if stripped.strip() else value
+    return ' '.join(re.sub(r"[^\w\s]", ' ', value).split())
+
+
+# Set of character n-grams of a string, padded so word boundaries count too
+def ngrams(text, n=DEFAULT_N):
+    if not text:
+        return set()
+    padded = f" {text} "
+    if len(padded) <= n:
+        return {padded}
+    return {padded[i:i + n] for i in range(len(padded) - n + 1)}
+
+
+# Dice coefficient of two n-gram sets
+def dice(grams_a, grams_b):
+    if not grams_a or not grams_b:
+        return 0.0
+    return 2 * len(grams_a & grams_b) / (len(grams_a) + len(grams_b))
+
+
+class NGramIndex:
+    def __init__(self, n=DEFAULT_N):
+        self.n = n
+        self.postings = {}
+        self.texts = []
+
+    def __len__(self):
+        return len(self.texts)
+
+    # Index a (cleaned) string; returns its document number
+    def add(self, text):
+        doc = len(self.texts)
+        self.texts.append(text)
+        for gram in ngrams(text, self.n):
+            postings = self.postings.get(gram)
+            if postings is None:
+                postings = self.postings[gram] = array('I')
+            postings.append(doc)
+        return doc
+
+    # Top-k documents most similar to text, as (document number, score) pairs with score >= min_score
+    def search(self, text, k=10, min_score=0.0):
+        grams = ngrams(text, self.n)
+        lists = [self.postings[gram] for gram in grams if gram in self.postings]
+        if not lists:
+            return []
+
+        # Count shared n-grams per document, using only the selective posting lists when there are any
+        max_postings = max(1, int(len(self.texts) * STOP_GRAM_FRACTION))
+        selective = [postings for postings in lists if len(postings) <= max_postings]
+        counts = {}
+        for postings in selective or lists:
+            for doc in postings:
+                counts[doc] = counts.get(doc, 0) + 1
+
+        # Rescore the best candidates exactly
+        candidates = heapq.nlargest(k * CANDIDATE_FACTOR, counts, key=counts.get)
+        scored = [(doc, dice(grams, ngrams(self.texts[doc], self.n))) for doc in candidates]
+        return heapq.nlargest(k, [(doc, score) for doc, score in scored if score >= min_score], key=lambda item: item[1])
@@ -0,0 +1,142 @@
+"""
+phase_profiler.py
+
+Description:
+    Phase-level timing (and optional cProfile capture) for the playlist sync scripts, used by --profile.
+    A run is split into phases: startup (module and client library imports), auth (client setup,
+    connection and authentication), plex index, source fetch, matching, destination write and
+    unmatched report. Phases nest; time is charged to the innermost phase only, so a batch written in
+    the middle of the matching loop counts as destination write and a source page fetched while
+    tracks are being matched counts as source fetch.
+    Timings are per thread: a playlist batch flushed in the background overlaps the thread doing the
+    matching, so the phase totals can add up to more than the wall time.
+    With a profile directory, each phase also gets its own cProfile.Profile, dumped as
+    <phase>.pstats at the end of the run (inspect with `python -m pstats` or snakeviz). Only one thread
+    is profiled at a time (the first one to enter a phase, until it leaves its outermost phase), so for
+    complete profiles run with --workers 1 and a single job.
+"""
+
+import cProfile
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+# Phases in report order
+PHASES = ['startup', 'auth', 'plex index', 'source fetch', 'matching', 'destination write', 'unmatched report']
+
+
+class PhaseProfiler:
+    # started: perf_counter() value the wall time is measured from (default: now)
+    def __init__(self, profile_dir=None, started=None):
+        self.profile_dir = profile_dir
+        self.started = started if started is not None else time.perf_counter()
+        self.seconds = {}
+        self.entries = {}
+        self.profiles = {}
+        self.profile_owner = None
+        self.local = threading.local()
+        self.lock = threading.Lock()
+
+    # Stack of [phase, resumed_at] entries of the current thread
+    def stack(self):
+        if not hasattr(self.local, 'stack'):
+            self.local.stack = []
+        return self.local.stack
+
+    def charge(self, name, seconds):
+        with self.lock:
+            self.seconds[name] = self.seconds.get(name, 0.0) + seconds
+
+    # Whether this thread is the one being profiled (claiming the profiler if it is free)
+    def owns_profile(self, claim=False):
+        if not self.profile_dir:
+            return False
+        thread = threading.get_ident()
+        with self.lock:
+            if self.profile_owner is None and claim:
+                self.profile_owner = thread
+            return self.profile_owner == thread
+
+    def profile(self, name):
+        with self.lock:
+            if name not in self.profiles:
+                self.profiles[name] = cProfile.Profile()
+            return self.profiles[name]
+
+    @contextmanager
+    def phase(self, name):
+        stack = self.stack()
+        now = time.perf_counter()
+        profiling = self.owns_profile(claim=not stack)
+        # Pause the enclosing phase (its time so far is charged, it resumes when this one ends)
+        if stack:
+            self.charge(stack[-1][0], now - stack[-1][1])
+            if profiling:
+                self.profile(stack[-1][0]).disable()
+        entry = [name, now]
+        stack.append(entry)
+        with self.lock:
+            self.entries[name] = self.entries.get(name, 0) + 1
+        if profiling:
+            self.profile(name).enable()
+        try:
+            yield
+        finally:
+            if profiling:
+                self.profile(name).disable()
+            now = time.perf_counter()
+            stack.pop()
+            self.charge(name, now - entry[1])
+            if stack:
+                stack[-1][1] = now
+                if profiling:
+                    self.profile(stack[-1][0]).enable()
+            elif profiling:
+                with self.lock:
+                    self.profile_owner = None
+
+    # Run func inside a phase
+    def call(self, name, func, *args, **kwargs):
+        with self.phase(name):
+            return func(*args, **kwargs)
+
+    # func wrapped so that every call runs inside a phase
+    def wrap(self, name, func):
+        return lambda *args, **kwargs: self.call(name, func, *args, **kwargs)
+
+    # Iterate over a (possibly lazy) source, charging the time spent producing each item to a phase
+    def iterate(self, name, iterable):
+        iterator = iter(iterable)
+        while True:
+            with self.phase(name):
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    return
+            yield item
+
+    def report(self):
+        wall = time.perf_counter() - self.started
+        with self.lock:
+            seconds = dict(self.seconds)
+            entries = dict(self.entries)
+        names = [name for name in PHASES if name in seconds] + sorted(name for name in seconds if name not in PHASES)
+        print(f"{'phase':<18} {'seconds':>9} {'% wall':>7} {'entries':>8}")
+        for name in names:
+            print(f"{name:<18} {seconds[name]:>9.2f} {seconds[name] / wall * 100 if wall else 0:>6.1f}% {entries.get(name, 1):>8}")
+        print(f"{'total (wall)':<18} {wall:>9.2f}")
+
+    # Dump one .pstats file per profiled phase; returns the paths written
+    def dump(self):
+        if not self.profile_dir:
+            return []
+        os.makedirs(self.profile_dir, exist_ok=True)
+        paths = []
+        with self.lock:
+            profiles = dict(self.profiles)
+        for name, profile in profiles.items():
+            path = os.path.join(self.profile_dir, f"{name.replace(' ', '_')}.pstats")
+            profile.dump_stats(path)
+            paths.append(path)
+        return paths
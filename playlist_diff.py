@@ -0,0 +1,294 @@
+"""
+playlist_diff.py
+
+Description:
+    Minimal-diff playlist updates, used by --replace (and by appends to an existing Plex playlist)
+    instead of deleting the destination playlist and rebuilding it.
+    The current contents are read once and compared with the target list by ID (the n-th copy of an
+    ID in the playlist stands for its n-th copy in the target). Entries that are no longer wanted are
+    removed, missing ones are appended, and entries out of order are moved. The longest run of entries
+    already in the right relative order stays where it is, so a one-track change to a 2,000-track
+    playlist costs a handful of calls instead of thousands. When the order changed so much that the
+    moves would take more calls than clearing the playlist and adding everything back, the playlist is
+    cleared and refilled instead (it keeps its ID either way).
+    Removes and adds are batched as far as each service allows. Spotify moves runs of adjacent entries
+    in one call; YouTube Music and Plex move one entry per call. Entries without an ID (Spotify local
+    files, unavailable items) cannot be matched or removed, so they are left in place.
+"""
+
+import math
+from bisect import bisect_left
+from collections import defaultdict, deque, namedtuple
+from playlist_writer import SPOTIFY_BATCH_SIZE, YTMUSIC_BATCH_SIZE, PLEX_BATCH_SIZE
+
+# One move: the target indexes of the moved entries (adjacent in the playlist), the target indexes of
+# the nearest entries with an ID they end up after and before (None if there is none on that side, i.e.
+# the move is to the start or end as far as entries with an ID go), and Spotify's range_start and
+# insert_before positions (relative to the playlist just before the move)
+Move = namedtuple('Move', ['targets', 'after', 'before', 'range_start', 'insert_before'])
+
+
+class PlaylistEdits:
+    # matched: target index of each current entry (None if removed or without an ID);
+    # removes: current positions to remove (ascending); adds: target indexes appended (in target order)
+    def __init__(self, matched, removes, adds, moves):
+        self.matched = matched
+        self.removes = removes
+        self.adds = adds
+        self.moves = moves
+
+    def changed(self):
+        return bool(self.removes or self.adds or self.moves)
+
+    # Requests needed to apply the edits, with removes and adds batched per request as given
+    def calls(self, remove_batch, add_batch):
+        return math.ceil(len(self.removes) / remove_batch) + math.ceil(len(self.adds) / add_batch) + len(self.moves)
+
+    def summary(self):
+        return f"{len(self.removes)} removed, {len(self.adds)} added, {len(self.moves)} moved"
+
+
+# Target index of each current entry, matching equal IDs in order (None if the entry is not in the target)
+def match_entries(current_ids, target_ids):
+    positions = defaultdict(deque)
+    for index, item_id in enumerate(target_ids):
+        positions[item_id].append(index)
+    matched = []
+    for item_id in current_ids:
+        queue = positions.get(item_id) if item_id is not None else None
+        matched.append(queue.popleft() if queue else None)
+    return matched
+
+
+# Positions in seq of a longest strictly increasing subsequence (O(n log n))
+def longest_increasing(seq):
+    tails = []
+    tail_positions = []
+    previous = [None] * len(seq)
+    for position, value in enumerate(seq):
+        i = bisect_left(tails, value)
+        if i == len(tails):
+            tails.append(value)
+            tail_positions.append(position)
+        else:
+            tails[i] = value
+            tail_positions[i] = position
+        previous[position] = tail_positions[i - 1] if i else None
+    result = []
+    position = tail_positions[-1] if tail_positions else None
+    while position is not None:
+        result.append(position)
+        position = previous[position]
+    return result[::-1]
+
+
+# Plan the removes, appends and moves that turn the current playlist into the target list.
+# With ranges, adjacent entries that move together are grouped into one move (Spotify).
+# batch_sizes is (removes, adds) per request; with it, the plan that takes fewer requests is returned.
+def plan_edits(current_ids, target_ids, ranges=False, batch_sizes=None):
+    edits = plan_moves(current_ids, target_ids, ranges)
+    if batch_sizes and edits.moves:
+        rewrite = plan_rewrite(current_ids, target_ids)
+        if rewrite.calls(*batch_sizes) < edits.calls(*batch_sizes):
+            return rewrite
+    return edits
+
+
+# Plan that removes every entry (except those without an ID) and appends the whole target
+def plan_rewrite(current_ids, target_ids):
+    removes = [position for position, item_id in enumerate(current_ids) if item_id is not None]
+    return PlaylistEdits([None] * len(current_ids), removes, list(range(len(target_ids))), [])
+
+
+def plan_moves(current_ids, target_ids, ranges=False):
+    matched = match_entries(current_ids, target_ids)
+    removes = [position for position, (item_id, index) in enumerate(zip(current_ids, matched)) if index is None and item_id is not None]
+    kept = set(index for index in matched if index is not None)
+    adds = [index for index in range(len(target_ids)) if index not in kept]
+
+    # Playlist after the removes and appends; entries without an ID stay put (as negative placeholders)
+    order = [index if index is not None else -1 - position
+             for position, (item_id, index) in enumerate(zip(current_ids, matched))
+             if index is not None or item_id is None] + adds
+    movable = [index for index in order if index >= 0]
+    stay = set(movable[position] for position in longest_increasing(movable))
+
+    # Walk the target in order and put each entry that is not staying right after its predecessor
+    moves = []
+    index = 0
+    while index < len(target_ids):
+        if index in stay:
+            index += 1
+            continue
+        start = order.index(index)
+        length = 1
+        if ranges:
+            while (index + length < len(target_ids) and index + length not in stay
+                   and start + length < len(order) and order[start + length] == index + length):
+                length += 1
+        insert_before = order.index(index - 1) + 1 if index else 0
+        if insert_before != start:
+            run = order[start:start + length]
+            del order[start:start + length]
+            destination = insert_before if insert_before < start else insert_before - length
+            order[destination:destination] = run
+            # Entries without an ID cannot serve as anchors, so skip over them to the nearest entry with one
+            after = next((order[i] for i in range(destination - 1, -1, -1) if order[i] >= 0), None)
+            before = next((order[i] for i in range(destination + length, len(order)) if order[i] >= 0), None)
+            moves.append(Move(run, after, before, start, insert_before))
+        index += length
+    return PlaylistEdits(matched, removes, adds, moves)
+
+
+def batches(items, size):
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+# Playlist positions (ascending) to delete when source entries were removed: for each destination ID
+# in remove (a Counter of str IDs), up to that many of its last copies, but never so many that fewer
+# copies are left than keep says still-present source entries map to it
+def plan_removals(current_ids, remove, keep):
+    ids = [str(item_id) if item_id is not None else None for item_id in current_ids]
+    copies = defaultdict(int)
+    for item_id in ids:
+        copies[item_id] += 1
+    budget = {item_id: min(count, copies[item_id] - keep[item_id]) for item_id, count in remove.items()}
+    positions = []
+    for position in range(len(ids) - 1, -1, -1):
+        if budget.get(ids[position], 0) > 0:
+            budget[ids[position]] -= 1
+            positions.append(position)
+    return positions[::-1]
+
+
+# Remove entries from a Plex playlist. plexapi looks each one up by ratingKey in its cached item list,
+# so a track listed twice can only lose one copy per request; further copies wait for a reload.
+def remove_plex_entries(playlist, entries, retry=None):
+    call = retry.call if retry else (lambda func, *args, **kwargs: func(*args, **kwargs))
+    write = retry.call_write if retry else (lambda func, *args, **kwargs: func(*args, **kwargs))
+    while entries:
+        keys, batch, rest = set(), [], []
+        for entry in entries:
+            (rest if entry.ratingKey in keys else batch).append(entry)
+            keys.add(entry.ratingKey)
+        write(playlist.removeItems, batch)
+        if rest:
+            call(playlist.reload)
+        entries = rest
+
+
+# Bring a Spotify playlist in line with target_ids (track IDs); current_ids are its track IDs in
+# playlist order (None for local files); tokens is the SpotifyTokenManager, if any, that refreshes the
+# token when a write is answered with 401. Returns the PlaylistEdits applied.
+def update_spotify_playlist(spotify, playlist_id, current_ids, target_ids, retry=None, tokens=None):
+    write = retry.call_write if retry else (lambda func, *args, **kwargs: func(*args, **kwargs))
+    authorized = tokens.call if tokens else (lambda func, *args, **kwargs: func(*args, **kwargs))
+    edits = plan_edits(current_ids, target_ids, ranges=True, batch_sizes=(SPOTIFY_BATCH_SIZE, SPOTIFY_BATCH_SIZE))
+
+    # Remove from the end of the playlist first, so the positions of later batches stay valid
+    for batch in batches(edits.removes[::-1], SPOTIFY_BATCH_SIZE):
+        write(authorized, spotify.playlist_remove_specific_occurrences_of_items, playlist_id,
+              [{'uri': current_ids[position], 'positions': [position]} for position in batch])
+    for batch in batches(edits.adds, SPOTIFY_BATCH_SIZE):
+        write(authorized, spotify.playlist_add_items, playlist_id, [target_ids[index] for index in batch])
+    for move in edits.moves:
+        write(authorized, spotify.playlist_reorder_items, playlist_id, range_start=move.range_start,
+              insert_before=move.insert_before, range_length=len(move.targets))
+    return edits
+
+
+# Bring a YouTube Music playlist in line with target_ids (videoIds); current_items are its track dicts
+# (with videoId and setVideoId) in playlist order. Returns the PlaylistEdits applied.
+def update_youtube_playlist(ytmusic, playlist_id, current_items, target_ids, retry=None):
+    call = retry.call if retry else (lambda func, *args, **kwargs: func(*args, **kwargs))
+    write = retry.call_write if retry else (lambda func, *args, **kwargs: func(*args, **kwargs))
+    edits = plan_edits([item.get('videoId') for item in current_items], target_ids, batch_sizes=(YTMUSIC_BATCH_SIZE, YTMUSIC_BATCH_SIZE))
+
+    # setVideoId (the ID of the playlist entry) of each target entry, for moves
+    entries = {index: item.get('setVideoId') for item, index in zip(current_items, edits.matched) if index is not None}
+
+    for batch in batches(edits.removes, YTMUSIC_BATCH_SIZE):
+        write(ytmusic.remove_playlist_items, playlist_id, [current_items[position] for position in batch])
+    for batch in batches(edits.adds, YTMUSIC_BATCH_SIZE):
+        response = write(ytmusic.add_playlist_items, playlist_id, [target_ids[index] for index in batch])
+        # YouTube Music reports failures in the response status rather than raising
+        if isinstance(response, dict) and 'SUCCEEDED' not in response.get('status', 'STATUS_SUCCEEDED'):
+            raise Exception(f"YouTube Music returned status {response.get('status')}")
+        results = response.get('playlistEditResults') if isinstance(response, dict) else None
+        for index, result in zip(batch, results or []):
+            result = (result or {}).get('playlistEditVideoAddedResultData', result) or {}
+            entries[index] = result.get('setVideoId')
+
+    if edits.moves and not all(entries.get(index) for index in range(len(target_ids))):
+        # The add responses did not include the new entries' setVideoIds: read them back once
+        from ytmusic_api import iter_youtube_playlist_items
+        items = list(iter_youtube_playlist_items(ytmusic, playlist_id, retry=retry))
+        matched = match_entries([item.get('videoId') for item in items], target_ids)
+        entries = {index: item.get('setVideoId') for item, index in zip(items, matched) if index is not None}
+
+    # Each move puts an entry before its successor (or at the end of the playlist)
+    for move in edits.moves:
+        moved = entries[move.targets[0]]
+        write(ytmusic.edit_playlist, playlist_id, moveItem=(moved, entries[move.before]) if move.before is not None else moved)
+    return edits
+
+
+# Bring a Plex playlist in line with target_items (Plex tracks). Returns the PlaylistEdits applied.
+def update_plex_playlist(playlist, target_items, retry=None):
+    call = retry.call if retry else (lambda func, *args, **kwargs: func(*args, **kwargs))
+    write = retry.call_write if retry else (lambda func, *args, **kwargs: func(*args, **kwargs))
+    current_items = call(playlist.items)
+    current_ids = [item.ratingKey for item in current_items]
+    target_ids = [item.ratingKey for item in target_items]
+    # plexapi removes entries one request at a time
+    edits = plan_edits(current_ids, target_ids, batch_sizes=(1, PLEX_BATCH_SIZE))
+    # moveItem always finds the first copy of a track, so moves are ambiguous if a track is listed twice
+    if edits.moves and (len(set(current_ids)) < len(current_ids) or len(set(target_ids)) < len(target_ids)):
+        edits = plan_rewrite(current_ids, target_ids)
+
+    removed = [current_items[position] for position in edits.removes]
+    remove_plex_entries(playlist, removed, retry)
+    for batch in batches(edits.adds, PLEX_BATCH_SIZE):
+        write(playlist.addItems, [target_items[index] for index in batch])
+
+    if edits.moves:
+        # plexapi finds each entry in its cached item list, which the removes and adds made stale
+        if removed or edits.adds:
+            call(playlist.reload)
+        # Each move puts an entry after its predecessor (or at the start of the playlist)
+        for move in edits.moves:
+            after = target_items[move.after] if move.after is not None else None
+            write(playlist.moveItem, target_items[move.targets[0]], after=after)
+    return edits
+
+
+class DiffPlaylistWriter:
+    # Drop-in for BatchedPlaylistWriter when an existing playlist is replaced: items are collected
+    # while tracks are matched, and close() hands the complete target list to update_func once
+    # (e.g. update_plex_playlist), which returns the PlaylistEdits it applied
+    def __init__(self, update_func, name='playlist', verbose=False):
+        self.update_func = update_func
+        self.name = name
+        self.verbose = verbose
+        self.pending = []
+        self.written = []
+        self.failed_tracks = []
+        self.edits = None
+
+    def add(self, item, track=None):
+        self.pending.append((item, track))
+
+    # Update the playlist and return the number of items it now holds from this run
+    def close(self):
+        pending, self.pending = self.pending, []
+        try:
+            self.edits = self.update_func([item for item, _ in pending])
+        except Exception as e:
+            print(f"Error updating {self.name}: {e}. Its tracks are reported as unmatched.")
+            self.failed_tracks.extend(track for _, track in pending if track is not None)
+            return 0
+        self.written.extend(pending)
+        if self.verbose:
+            print(f"Updated {self.name}: {self.edits.summary()}.")
+        return len(self.written)
@@ -0,0 +1,110 @@
+"""
+playlist_resolver.py
+
+Description:
+    Playlist lookup by name for the playlist sync scripts.
+    Each service's resolver pages through all of the user's playlists once and indexes them by
+    lower-cased name, so no playlist past the first page of the listing is missed and later lookups
+    (other jobs of a manifest, watch-mode rounds, GUI runs) are answered from memory.
+    The index expires after max_age seconds, learns about playlists the scripts create, and can be
+    invalidated explicitly (e.g. after a failed run, in case a playlist was deleted or renamed elsewhere).
+    When several playlists share a name, the first one listed wins, as with the earlier linear scans.
+"""
+
+import threading
+import time
+
+# Seconds an index is trusted before the next lookup lists the playlists again
+DEFAULT_MAX_AGE = 600
+
+# Largest page of Spotify's current-user playlist listing
+SPOTIFY_PLAYLIST_PAGE_SIZE = 50
+
+
+class PlaylistResolver:
+    # list_func returns every playlist of the account; name_func gives a playlist's name
+    def __init__(self, list_func, name_func, max_age=DEFAULT_MAX_AGE):
+        self.list_func = list_func
+        self.name_func = name_func
+        self.max_age = max_age
+        self.playlists = None
+        self.built_at = 0.0
+        self.handed_out = set()
+        self.lock = threading.Lock()
+
+    # Name -> playlist index, listing the playlists if there is no index yet or it has expired
+    def index(self):
+        with self.lock:
+            if self.playlists is None or time.time() - self.built_at > self.max_age:
+                playlists = {}
+                for playlist in self.list_func():
+                    playlists.setdefault(self.name_func(playlist).lower(), playlist)
+                self.playlists = playlists
+                self.built_at = time.time()
+                self.handed_out = set()
+            return self.playlists
+
+    # The playlist with this name (case-insensitive), or None
+    def find(self, name):
+        return self.index().get(name.lower())
+
+    # Like find(), but also tells whether the playlist object comes straight from a listing and was not
+    # returned by an earlier call (for clients whose playlist objects cache their contents, like plexapi)
+    def find_unused(self, name):
+        playlist = self.find(name)
+        with self.lock:
+            unused = playlist is not None and id(playlist) not in self.handed_out
+            if playlist is not None:
+                self.handed_out.add(id(playlist))
+        return playlist, unused
+
+    # Record a playlist created by the scripts, so it is found without listing again
+    def add(self, playlist):
+        with self.lock:
+            if self.playlists is not None:
+                self.playlists.setdefault(self.name_func(playlist).lower(), playlist)
+                self.handed_out.add(id(playlist))
+
+    def invalidate(self):
+        with self.lock:
+            self.playlists = None
+
+
+def direct_call(func, *args, **kwargs):
+    return func(*args, **kwargs)
+
+
+# Every playlist of the Spotify user, one page of 50 at a time
+# (tokens is the SpotifyTokenManager, if any, that refreshes the token when a page is answered with 401)
+def list_spotify_playlists(spotify, retry=None, tokens=None):
+    call = retry.call if retry else direct_call
+    authorized = tokens.call if tokens else direct_call
+    playlists = []
+    offset = 0
+    while True:
+        page = call(authorized, spotify.current_user_playlists, limit=SPOTIFY_PLAYLIST_PAGE_SIZE, offset=offset)
+        items = page.get('items') or []
+        playlists.extend(items)
+        offset += len(items)
+        if not items or not page.get('next'):
+            return playlists
+
+
+# Every playlist in the YouTube Music library (limit=None follows all continuation pages)
+def list_youtube_playlists(ytmusic, retry=None):
+    call = retry.call if retry else direct_call
+    return call(ytmusic.get_library_playlists, limit=None)
+
+
+def spotify_resolver(spotify, retry=None, max_age=DEFAULT_MAX_AGE, tokens=None):
+    return PlaylistResolver(lambda: list_spotify_playlists(spotify, retry, tokens), lambda playlist: playlist['name'], max_age)
+
+
+def youtube_resolver(ytmusic, retry=None, max_age=DEFAULT_MAX_AGE):
+    return PlaylistResolver(lambda: list_youtube_playlists(ytmusic, retry), lambda playlist: playlist['title'], max_age)
+
+
+# Plex lists all playlists in one request
+def plex_resolver(plex, retry=None, max_age=DEFAULT_MAX_AGE):
+    call = retry.call if retry else direct_call
+    return PlaylistResolver(lambda: call(plex.playlists), lambda playlist: playlist.title, max_age)
@@ -0,0 +1,87 @@
+"""
+playlist_writer.py
+
+Description:
+    Batched destination writer shared by the playlist sync scripts.
+    Matched destination IDs (or Plex items) are buffered and written in the largest batch each service
+    accepts, instead of one write request per track. A batch is flushed when it is full, when the oldest
+    buffered item has waited longer than the flush interval, or when the writer is closed.
+    Failed batches are retried through the destination service's RetryPolicy (retry_policy.py), but only
+    when the request never reached the service: a batch that timed out may already have been added.
+    Each batch's outcome is recorded so tracks from failed batches can be reported as unmatched, and the
+    (item, track) pairs that were written are kept so callers can record source -> destination mappings.
+"""
+
+import threading
+from retry_policy import RetryPolicy
+
+# Maximum number of items per write request for each destination service
+SPOTIFY_BATCH_SIZE = 100
+YTMUSIC_BATCH_SIZE = 100
+PLEX_BATCH_SIZE = 200
+
+# Default number of seconds an item may wait in the buffer before a partial batch is flushed
+DEFAULT_FLUSH_INTERVAL = 10
+
+
+class BatchedPlaylistWriter:
+    # write_func receives a list of items and writes them to the destination playlist in one request;
+    # retry is the destination service's RetryPolicy (a private default policy if not given)
+    def __init__(self, write_func, batch_size, flush_interval=DEFAULT_FLUSH_INTERVAL, retry=None, name='playlist', verbose=False):
+        self.write_func = write_func
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.retry = retry or RetryPolicy(name, verbose=verbose)
+        self.name = name
+        self.verbose = verbose
+        self.buffer = []
+        self.batches = []
+        self.written = []
+        self.failed_tracks = []
+        self.lock = threading.RLock()
+        self.timer = None
+
+    # Queue an item for writing; track is the source track it was matched from (reported if the batch fails)
+    def add(self, item, track=None):
+        with self.lock:
+            self.buffer.append((item, track))
+            if len(self.buffer) >= self.batch_size:
+                self.flush()
+            elif self.flush_interval and self.timer is None:
+                # Start the clock on the oldest buffered item
+                self.timer = threading.Timer(self.flush_interval, self.flush)
+                self.timer.daemon = True
+                self.timer.start()
+
+    # Write all buffered items (in batch_size chunks), retrying batches the service never received
+    def flush(self):
+        with self.lock:
+            if self.timer is not None:
+                self.timer.cancel()
+                self.timer = None
+            while self.buffer:
+                batch = self.buffer[:self.batch_size]
+                del self.buffer[:self.batch_size]
+                self.write_batch(batch)
+
+    def write_batch(self, batch):
+        items = [item for item, _ in batch]
+        try:
+            self.retry.call_write(self.write_func, items)
+        except Exception as e:
+            print(f"Error adding batch of {len(items)} items to {self.name}: {e}. Skipping these tracks.")
+            self.batches.append({'size': len(items), 'ok': False, 'error': str(e)})
+            self.failed_tracks.extend(track for _, track in batch if track is not None)
+            return
+        self.batches.append({'size': len(items), 'ok': True, 'error': None})
+        self.written.extend(batch)
+        if self.verbose:
+            print(f"Added batch of {len(items)} items to {self.name}.")
+
+    # Flush whatever is left and return the number of items written successfully
+    def close(self):
+        self.flush()
+        return self.written_count()
+
+    def written_count(self):
+        return sum(batch['size'] for batch in self.batches if batch['ok'])
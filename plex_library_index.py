@@ -0,0 +1,426 @@
+"""
+plex_library_index.py
+
+Description:
+    In-memory index of a Plex music library section, used by the playlist sync scripts as an
+    alternative to the artist -> album -> track walk in find_track_in_plex.
+    All tracks of the section are fetched once in large paged requests and indexed by normalized
+    (artist, title) and (artist, album, title), so each lookup is a dictionary hit with no extra
+    round trips to the Plex server.
+    The index can also be persisted as a SQLite snapshot that is refreshed incrementally on later runs
+    (only tracks added/updated since the last run are fetched, deleted ratingKeys are dropped).
+    When a minimum score is given, lookups that find no exact match fall back to approximate matching
+    over a character trigram index (ngram_index.py) of "title artist" strings, built on first use.
+    Tracks are also indexed by the stable IDs in their Plex Guid tags (ISRC and MusicBrainz recording
+    IDs, when the server's metadata agent or the files' tags provide them), so a source track that
+    carries one of these IDs is matched exactly before any text matching is tried.
+"""
+
+import heapq
+import sqlite3
+import threading
+import time
+from collections import namedtuple
+from datetime import datetime
+from ngram_index import NGramIndex, CANDIDATE_FACTOR, clean_text, ngrams, dice
+
+# Number of tracks requested per page when prefetching the library section
+DEFAULT_PAGE_SIZE = 2000
+
+# Weight of the title similarity in a fuzzy match score (the rest is the artist similarity)
+FUZZY_TITLE_WEIGHT = 0.6
+
+# Number of fuzzy candidates checked against the album criteria before giving up
+FUZZY_CANDIDATES = 5
+
+# Stable track IDs read from Plex Guid tags ('isrc://...', 'mbid://...'), in lookup order.
+# Source track records carry them under the same keys.
+EXTERNAL_ID_SCHEMES = ('isrc', 'mbid')
+
+
+# Normalize a title/artist/album string for index keys (case-insensitive, whitespace-collapsed)
+def normalize_text(value):
+    if not value:
+        return ''
+    return ' '.join(value.casefold().split())
+
+
+# Canonical form of a stable ID: ISRCs are upper-case without separators, MusicBrainz IDs lower-case
+def normalize_id(scheme, value):
+    if not value:
+        return None
+    if scheme == 'isrc':
+        return value.replace('-', '').replace(' ', '').upper()
+    return value.strip().lower()
+
+
+# Stable IDs of a Plex track from its Guid tags, as {scheme: id}
+def external_ids(track):
+    ids = {}
+    for guid in getattr(track, 'guids', None) or ():
+        scheme, _, value = (guid.id or '').partition('://')
+        if scheme in EXTERNAL_ID_SCHEMES and value and scheme not in ids:
+            ids[scheme] = normalize_id(scheme, value)
+    return ids
+
+
+# Artist names a Plex track can be matched under (album artist and track artist)
+def track_artists(track):
+    artists = []
+    for name in (track.grandparentTitle, getattr(track, 'originalTitle', None)):
+        key = normalize_text(name)
+        if key and key not in artists:
+            artists.append(key)
+    return artists
+
+
+# String indexed for fuzzy matching: cleaned title followed by the cleaned artist
+def fuzzy_key(title, artist):
+    return f"{clean_text(title)} {clean_text(artist)}".strip()
+
+
+# Fuzzy match score (0-1) of a Plex track against the n-grams of a source title and artist
+def fuzzy_score(title_grams, artist_grams, track):
+    title_score = dice(title_grams, ngrams(clean_text(track.title)))
+    artist_score = max(
+        (dice(artist_grams, ngrams(clean_text(name))) for name in (track.grandparentTitle, getattr(track, 'originalTitle', None)) if name),
+        default=0.0
+    )
+    return FUZZY_TITLE_WEIGHT * title_score + (1 - FUZZY_TITLE_WEIGHT) * artist_score
+
+
+class PlexLibraryIndex:
+    def __init__(self):
+        self.by_artist_title = {}
+        self.by_artist_album_title = {}
+        self.by_external_id = {}
+        self.by_rating_key = {}
+        self.artists = set()
+        self.tracks = []
+        self.track_count = 0
+        self.snapshot = None
+        self.fuzzy = None
+        self.fuzzy_lock = threading.Lock()
+        # Alternative candidate engine (e.g. vector_matcher.VectorMatcher); None uses the trigram index
+        self.fuzzy_engine = None
+
+    # Prefetch every track of a Plex music section in large pages and build the index
+    # (retry is the Plex RetryPolicy, if any, that the fetch goes through)
+    @classmethod
+    def from_section(cls, music_library, page_size=DEFAULT_PAGE_SIZE, verbose=False, retry=None):
+        call = retry.call if retry else (lambda func, *args, **kwargs: func(*args, **kwargs))
+        start = time.time()
+        index = cls()
+        for track in call(music_library.searchTracks, container_size=page_size):
+            index.add(track)
+        if verbose:
+            print(f"Indexed {index.track_count} Plex tracks from '{music_library.title}' in {time.time() - start:.1f}s.")
+        return index
+
+    # Add a single track to the index
+    def add(self, track):
+        title = normalize_text(track.title)
+        album = normalize_text(track.parentTitle)
+        for artist in track_artists(track):
+            self.artists.add(artist)
+            self.by_artist_title.setdefault((artist, title), []).append(track)
+            self.by_artist_album_title.setdefault((artist, album, title), []).append(track)
+        for scheme, value in external_ids(track).items():
+            self.by_external_id.setdefault((scheme, value), track)
+        self.by_rating_key[int(track.ratingKey)] = track
+        self.tracks.append(track)
+        self.track_count += 1
+        self.fuzzy = None
+
+    # Resolve the artist keys to search: exact match first, then substring (fuzzy) matches
+    def match_artists(self, artist_name):
+        artist = normalize_text(artist_name)
+        if artist in self.artists:
+            return [artist]
+        return sorted(a for a in self.artists if artist and artist in a)
+
+    # Trigram index over every track, built on first use (shared by all matching threads)
+    def fuzzy_index(self):
+        with self.fuzzy_lock:
+            if self.fuzzy is None:
+                fuzzy = NGramIndex()
+                for track in self.tracks:
+                    fuzzy.add(fuzzy_key(track.title, track.grandparentTitle))
+                self.fuzzy = fuzzy
+            return self.fuzzy
+
+    # Top-k approximate matches as (track, score) pairs, best first; the score (0-1) combines
+    # title and artist similarity, so "Song (Remastered 2011)" or "Song - feat. X" still match "Song"
+    def find_candidates(self, artist_name, track_name, k=FUZZY_CANDIDATES, min_score=0.0):
+        if self.fuzzy_engine is not None:
+            return self.fuzzy_engine.find_candidates(artist_name, track_name, k, min_score)
+        title_grams = ngrams(clean_text(track_name))
+        artist_grams = ngrams(clean_text(artist_name))
+        scored = []
+        for doc, _ in self.fuzzy_index().search(fuzzy_key(track_name, artist_name), k * CANDIDATE_FACTOR):
+            track = self.tracks[doc]
+            score = fuzzy_score(title_grams, artist_grams, track)
+            if score >= min_score:
+                scored.append((track, score))
+        return heapq.nlargest(k, scored, key=lambda item: item[1])
+
+    # Track with one of the given stable IDs ({scheme: id}, e.g. a source track record), or None
+    def find_by_ids(self, ids):
+        for scheme in EXTERNAL_ID_SCHEMES:
+            track = self.by_external_id.get((scheme, normalize_id(scheme, ids.get(scheme))))
+            if track is not None:
+                return track
+        return None
+
+    # Look up a track with the same exact/fuzzy album semantics as find_track_in_plex.
+    # With min_score set, a track without an exact match falls back to the best approximate match scoring at least min_score.
+    # ids ({scheme: id}) are looked up first; text matching is only used when none of them is in the library.
+    def find_track(self, artist_name, track_name, album_name=None, force_album_match=None, min_score=None, ids=None):
+        if ids:
+            track = self.find_by_ids(ids)
+            if track is not None:
+                print(f"Exact ID match found: {track.title} in album '{track.parentTitle}' by '{track.grandparentTitle}'")
+                return track
+
+        artists = self.match_artists(artist_name)
+        if not artists and min_score is None:
+            print(f"No results found for artist '{artist_name}'.")
+            return None
+
+        title = normalize_text(track_name)
+        album = normalize_text(album_name)
+
+        # Step 1: Try to find a match based on force-album-match option (exact or fuzzy)
+        for artist in artists:
+            if album:
+                candidates = self.by_artist_album_title.get((artist, album, title))
+                if not candidates and force_album_match != 'exact':
+                    candidates = [
+                        track for track in self.by_artist_title.get((artist, title), [])
+                        if force_album_match != 'fuzzy' or album in normalize_text(track.parentTitle)
+                    ]
+            else:
+                candidates = self.by_artist_title.get((artist, title))
+            if candidates:
+                track = candidates[0]
+                print(f"Match found: {track.title} in album '{track.parentTitle}' by '{track.grandparentTitle}'")
+                return track
+
+        # Step 2: Fallback to double match (artist and track only, ignoring album) if no force-album-match is set
+        if not force_album_match:
+            for artist in artists:
+                candidates = self.by_artist_title.get((artist, title))
+                if candidates:
+                    track = candidates[0]
+                    print(f"Partial match found (without album): {track.title} in album '{track.parentTitle}' by '{track.grandparentTitle}'")
+                    return track
+
+        # Step 3: Approximate match over the trigram index, still honoring the album criteria
+        if min_score is not None:
+            for track, score in self.find_candidates(artist_name, track_name, min_score=min_score):
+                track_album = normalize_text(track.parentTitle)
+                if album and force_album_match == 'exact' and track_album != album:
+                    continue
+                if album and force_album_match == 'fuzzy' and album not in track_album:
+                    continue
+                print(f"Fuzzy match found (score {score:.2f}): {track.title} in album '{track.parentTitle}' by '{track.grandparentTitle}'")
+                return track
+
+        # If no matches are found, return None
+        if not artists:
+            print(f"No results found for artist '{artist_name}'.")
+        else:
+            print(f"No track named '{track_name}' found for artist '{artist_name}' with the specified criteria.")
+        return None
+
+
+# Lightweight track record loaded from an on-disk snapshot; attribute names mirror plexapi Track (and Guid)
+SnapshotTrack = namedtuple('SnapshotTrack', ['ratingKey', 'title', 'grandparentTitle', 'originalTitle', 'parentTitle', 'updatedAt', 'addedAt', 'guids'], defaults=((),))
+SnapshotGuid = namedtuple('SnapshotGuid', ['id'])
+
+# Bump when the snapshot table layout changes; older snapshots are rebuilt from scratch
+SNAPSHOT_SCHEMA_VERSION = 2
+
+
+# ratingKeys of every track in a Plex music section. Only the raw listing pages are read (without Guid tags),
+# no plexapi objects are built, so this is much cheaper than fetching the tracks.
+def list_rating_keys(music_library, page_size=DEFAULT_PAGE_SIZE, retry=None):
+    call = retry.call if retry else (lambda func, *args, **kwargs: func(*args, **kwargs))
+    keys = set()
+    start = 0
+    while True:
+        data = call(
+            music_library._server.query, f"/library/sections/{music_library.key}/all",
+            params={'type': 10, 'includeGuids': 0, 'X-Plex-Container-Start': start, 'X-Plex-Container-Size': page_size}
+        )
+        items = [int(element.attrib['ratingKey']) for element in data if 'ratingKey' in element.attrib]
+        keys.update(items)
+        start += len(items)
+        if not items or start >= int(data.attrib.get('totalSize', start)):
+            return keys
+
+
+# Convert a plexapi datetime attribute to epoch seconds (0 if missing)
+def to_epoch(value):
+    return int(value.timestamp()) if value else 0
+
+
+class PlexLibrarySnapshot:
+    def __init__(self, path):
+        self.path = path
+        # The connection is shared by the sync threads, the batch writer's flush timer and index refreshes
+        self.lock = threading.RLock()
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+        if self.get_meta('schema_version') != str(SNAPSHOT_SCHEMA_VERSION):
+            # Older layout: the tracks are fetched again by the next refresh anyway
+            self.db.execute("DROP TABLE IF EXISTS tracks")
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS tracks ("
+            "rating_key INTEGER PRIMARY KEY, title TEXT, artist TEXT, original_artist TEXT, "
+            "album TEXT, updated_at INTEGER, added_at INTEGER, guids TEXT)"
+        )
+        self.db.commit()
+
+    def get_meta(self, key):
+        with self.lock:
+            row = self.db.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def set_meta(self, key, value):
+        with self.lock:
+            self.db.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, str(value)))
+
+    def track_count(self):
+        with self.lock:
+            return self.db.execute("SELECT COUNT(*) FROM tracks").fetchone()[0]
+
+    # Highest server-side timestamp seen so far; used as the watermark for incremental refreshes
+    def watermark(self):
+        with self.lock:
+            row = self.db.execute("SELECT MAX(MAX(updated_at), MAX(added_at)) FROM tracks").fetchone()
+        return row[0] or 0
+
+    # Insert or update tracks fetched from the Plex server
+    def upsert(self, tracks):
+        rows = [
+            (int(track.ratingKey), track.title, track.grandparentTitle, getattr(track, 'originalTitle', None),
+             track.parentTitle, to_epoch(track.updatedAt), to_epoch(track.addedAt),
+             ' '.join(f"{scheme}://{value}" for scheme, value in external_ids(track).items()))
+            for track in tracks
+        ]
+        with self.lock:
+            self.db.executemany(
+                "INSERT OR REPLACE INTO tracks (rating_key, title, artist, original_artist, album, updated_at, added_at, guids) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                rows
+            )
+
+    def rating_keys(self):
+        with self.lock:
+            return set(row[0] for row in self.db.execute("SELECT rating_key FROM tracks"))
+
+    # Drop tracks that no longer exist on the server
+    def delete(self, rating_keys):
+        with self.lock:
+            self.db.executemany("DELETE FROM tracks WHERE rating_key = ?", [(int(key),) for key in rating_keys])
+            self.db.commit()
+
+    # Bring the snapshot up to date with the Plex section, fetching only what changed when possible
+    def refresh(self, music_library, page_size=DEFAULT_PAGE_SIZE, verbose=False, retry=None):
+        call = retry.call if retry else (lambda func, *args, **kwargs: func(*args, **kwargs))
+        start = time.time()
+        full_rebuild = (
+            self.get_meta('schema_version') != str(SNAPSHOT_SCHEMA_VERSION)
+            or self.get_meta('section_uuid') != music_library.uuid
+            or not self.track_count()
+        )
+
+        if not full_rebuild:
+            # Fetch only tracks added or updated since the newest timestamp already in the snapshot
+            since = datetime.fromtimestamp(self.watermark() - 1)
+            changed = call(
+                music_library.searchTracks, filters={'or': [{'updatedAt>>': since}, {'addedAt>>': since}]},
+                container_size=page_size
+            )
+            self.upsert(changed)
+            # Drop the ratingKeys that are gone. The key sets are always compared (one keys-only listing): the
+            # track counts can agree while they differ, e.g. a deletion offset by an addition the fetch above missed.
+            try:
+                live = list_rating_keys(music_library, page_size, retry)
+                gone = self.rating_keys() - live
+                self.delete(gone)
+                # Tracks the snapshot never saw (e.g. a missed change) still need a full rebuild
+                full_rebuild = self.track_count() != len(live)
+            except Exception as e:
+                print(f"Warning: unable to list the Plex library's tracks ({e}); rebuilding the snapshot.")
+                full_rebuild = True
+            if not full_rebuild and verbose:
+                print(f"Plex library snapshot refreshed incrementally ({len(changed)} changed tracks, {len(gone)} deleted).")
+
+        if full_rebuild:
+            tracks = call(music_library.searchTracks, container_size=page_size)
+            with self.lock:
+                self.db.execute("DELETE FROM tracks")
+                self.upsert(tracks)
+            if verbose:
+                print(f"Plex library snapshot rebuilt from scratch ({self.track_count()} tracks).")
+
+        with self.lock:
+            self.set_meta('schema_version', SNAPSHOT_SCHEMA_VERSION)
+            self.set_meta('section_uuid', music_library.uuid)
+            self.set_meta('section_updated_at', to_epoch(music_library.updatedAt))
+            self.db.commit()
+        if verbose:
+            print(f"Plex library snapshot '{self.path}' ready in {time.time() - start:.1f}s.")
+
+    # Build an in-memory index from the snapshot rows (no server round trips)
+    def load_index(self):
+        with self.lock:
+            rows = self.db.execute(
+                "SELECT rating_key, title, artist, original_artist, album, updated_at, added_at, guids FROM tracks"
+            ).fetchall()
+        index = PlexLibraryIndex()
+        for row in rows:
+            index.add(SnapshotTrack(*row[:-1], tuple(SnapshotGuid(guid) for guid in (row[-1] or '').split())))
+        return index
+
+
+# Load (and incrementally refresh) an on-disk snapshot of the Plex section, then index it in memory
+def load_snapshot_index(music_library, path, page_size=DEFAULT_PAGE_SIZE, verbose=False, retry=None):
+    snapshot = PlexLibrarySnapshot(path)
+    snapshot.refresh(music_library, page_size=page_size, verbose=verbose, retry=retry)
+    index = snapshot.load_index()
+    index.snapshot = snapshot
+    if verbose:
+        print(f"Indexed {index.track_count} Plex tracks from snapshot '{path}'.")
+    return index
+
+
+# Replace snapshot records with live plexapi Track objects, fetched in batches by ratingKey.
+# Tracks that were deleted from the server since the snapshot was taken are dropped (and purged from the snapshot).
+def resolve_plex_tracks(plex, tracks, snapshot=None, batch_size=500, retry=None):
+    call = retry.call if retry else (lambda func, *args, **kwargs: func(*args, **kwargs))
+    keys = [int(track.ratingKey) for track in tracks if isinstance(track, SnapshotTrack)]
+    if not keys:
+        return list(tracks)
+
+    live = {}
+    for i in range(0, len(keys), batch_size):
+        batch = keys[i:i + batch_size]
+        for item in call(plex.fetchItems, f"/library/metadata/{','.join(str(key) for key in batch)}"):
+            live[int(item.ratingKey)] = item
+
+    missing = [key for key in keys if key not in live]
+    if missing:
+        print(f"Warning: {len(missing)} matched Plex tracks no longer exist on the server and were skipped.")
+        if snapshot:
+            snapshot.delete(missing)
+
+    resolved = []
+    for track in tracks:
+        if isinstance(track, SnapshotTrack):
+            track = live.get(int(track.ratingKey))
+        if track is not None:
+            resolved.append(track)
+    return resolved
@@ -0,0 +1,108 @@
+"""
+plex_server_cache.py
+
+Description:
+    Cached Plex server handshakes for fast startup.
+    Before the first useful request, plexapi spends three round trips connecting: PlexServer() fetches
+    the server identity (GET /), and library.section() fetches /library and then /library/sections
+    (which holds the section keys and UUIDs). These responses barely ever change, so they are saved to a
+    small JSON file per server URL and token, and a warm start serves them from there without
+    contacting the server. Each cached response is served once (later reloads go to the server).
+    Entries expire after max_age seconds, and the scripts drop the entry after a failed run, so a
+    renamed or recreated library section is picked up by the next run.
+"""
+
+import hashlib
+import json
+import os
+import time
+from xml.etree import ElementTree
+from plexapi.server import PlexServer
+
+# Paths whose responses make up the connection handshake
+HANDSHAKE_KEYS = ('/', '/library', '/library/sections', '/library/sections/')
+
+# Seconds a cached handshake stays valid
+DEFAULT_MAX_AGE = 24 * 3600
+
+DEFAULT_CACHE_PATH = os.path.join(os.path.expanduser('~'), '.cache', 'playlist-sync', 'plex_server.json')
+
+
+class HandshakeCache:
+    # Entries are keyed by a hash of the server URL and token (the token itself is never stored)
+    def __init__(self, path, baseurl, token, max_age=DEFAULT_MAX_AGE):
+        self.path = path
+        self.key = hashlib.sha256(f"{baseurl.rstrip('/')}\n{token}".encode('utf-8')).hexdigest()
+        self.max_age = max_age
+
+    def read_all(self):
+        try:
+            with open(self.path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    # Cached responses as {path: XML element}; empty if missing or expired
+    def load(self):
+        entry = self.read_all().get(self.key)
+        if not entry or time.time() - entry.get('saved_at', 0) > self.max_age:
+            return {}
+        try:
+            return {key: ElementTree.fromstring(xml) for key, xml in entry['responses'].items()}
+        except (ElementTree.ParseError, KeyError, TypeError):
+            return {}
+
+    def save(self, responses):
+        entries = self.read_all()
+        entries[self.key] = {
+            'saved_at': time.time(),
+            'responses': {key: ElementTree.tostring(data, encoding='unicode') for key, data in responses.items()},
+        }
+        self.write_all(entries)
+
+    def invalidate(self):
+        entries = self.read_all()
+        if entries.pop(self.key, None) is not None:
+            self.write_all(entries)
+
+    def write_all(self, entries):
+        try:
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            temp_path = f"{self.path}.tmp"
+            fd = os.open(temp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+            with os.fdopen(fd, 'w') as f:
+                json.dump(entries, f)
+            os.replace(temp_path, self.path)
+        except OSError as e:
+            print(f"Warning: could not write Plex server cache '{self.path}': {e}")
+
+
+class CachedPlexServer(PlexServer):
+    # cache is a HandshakeCache, or None to always connect live
+    def __init__(self, baseurl, token, session=None, timeout=None, cache=None):
+        self._handshake_cache = cache
+        self._cached_responses = cache.load() if cache else {}
+        self._live_responses = {}
+        self.handshake_cached = bool(self._cached_responses)
+        super().__init__(baseurl, token, session=session, timeout=timeout)
+
+    # Serve handshake responses from the cache; record live ones so they can be saved
+    def query(self, key, *args, **kwargs):
+        if key in HANDSHAKE_KEYS:
+            if key in self._cached_responses:
+                return self._cached_responses.pop(key)
+            data = super().query(key, *args, **kwargs)
+            if data is not None:
+                self._live_responses[key] = data
+            return data
+        return super().query(key, *args, **kwargs)
+
+    # Save the handshake responses fetched live by this connection (call once the library section is resolved)
+    def save_handshake(self):
+        if self._handshake_cache and self._live_responses:
+            self._handshake_cache.save(self._live_responses)
+            self._live_responses = {}
+
+    def invalidate_handshake(self):
+        if self._handshake_cache:
+            self._handshake_cache.invalidate()
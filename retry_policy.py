@@ -0,0 +1,182 @@
+"""
+retry_policy.py
+
+Description:
+    Central retry policy for every Spotify, YouTube Music and Plex call made by the sync scripts.
+    Transient failures (HTTP 429, 5xx, connection errors and timeouts) are retried with exponential
+    backoff and jitter; a Retry-After header, when the service sends one, sets the delay instead.
+    Writes that must not be applied twice use call_write(), which only retries failures that never
+    reached the service (a timed-out request may have succeeded, and replaying it would duplicate it).
+    Each policy wraps the service's shared TokenBucket, so pushback slows the whole worker pool
+    rather than a single thread: a 429 pauses the limiter for the requested delay and halves its rate
+    (restored step by step as calls succeed), and a run of consecutive failures opens a circuit
+    breaker that holds back every caller for a cooldown period.
+"""
+
+import random
+import re
+import socket
+import threading
+import time
+import requests
+from urllib3.exceptions import NewConnectionError
+from sync_workers import TokenBucket
+
+DEFAULT_MAX_ATTEMPTS = 5
+DEFAULT_BASE_DELAY = 1
+DEFAULT_MAX_DELAY = 60
+
+# Consecutive transient failures that open the circuit breaker, and how long it then stays open
+BREAKER_THRESHOLD = 5
+BREAKER_COOLDOWN = 30
+
+# HTTP status codes worth retrying
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+
+# Network errors worth retrying when no status came back. Other OSErrors (a missing cookies file,
+# permission denied, a full disk) and SSL failures, which requests reports as a ConnectionError,
+# would fail the same way again.
+TRANSIENT_ERRORS = (
+    requests.ConnectionError, requests.Timeout, socket.timeout, ConnectionResetError, ConnectionAbortedError,
+)
+
+# Status codes embedded in exception messages: plexapi ("(429) too_many_requests ...")
+# and ytmusicapi ("Server returned HTTP 429: ...")
+STATUS_IN_MESSAGE = re.compile(r"^\((\d{3})\)|HTTP (\d{3})\b")
+
+
+# HTTP status behind an exception or response, if any
+def error_status(error):
+    status = getattr(error, 'http_status', None) or getattr(error, 'status_code', None)
+    if status is None and getattr(error, 'response', None) is not None:
+        status = getattr(error.response, 'status_code', None)
+    if status is None and isinstance(error, Exception):
+        match = STATUS_IN_MESSAGE.search(str(error))
+        if match:
+            status = int(match.group(1) or match.group(2))
+    return status
+
+
+# Seconds requested by a Retry-After header on an exception or response, if any
+def retry_after(error):
+    headers = getattr(error, 'headers', None)
+    if headers is None and getattr(error, 'response', None) is not None:
+        headers = getattr(error.response, 'headers', None)
+    try:
+        return max(0.0, float((headers or {}).get('Retry-After')))
+    except (TypeError, ValueError):
+        return None
+
+
+# Whether an exception is worth retrying: a retryable status, or a network error without one
+def is_transient(error):
+    status = error_status(error)
+    if status is not None:
+        return status in RETRY_STATUS_CODES
+    return isinstance(error, TRANSIENT_ERRORS) and not isinstance(error, requests.exceptions.SSLError)
+
+
+# Whether a failed request certainly never reached the service, so that even a write that must not be
+# applied twice can be sent again: a 429 (rejected before processing), a connect timeout, or a refused or
+# unresolvable connection (requests wraps urllib3's NewConnectionError in a ConnectionError).
+# A read timeout, a reset connection or a 5xx may come after the server already applied the request.
+def is_unapplied(error):
+    status = error_status(error)
+    if status is not None:
+        return status == 429
+    if isinstance(error, (requests.ConnectTimeout, ConnectionRefusedError)):
+        return True
+    reason = getattr(error.args[0], 'reason', None) if isinstance(error, requests.ConnectionError) and error.args else None
+    return isinstance(reason, NewConnectionError)
+
+
+class RetryPolicy:
+    # limiter is the service's shared TokenBucket, acquired before every attempt
+    def __init__(self, name, limiter=None, max_attempts=DEFAULT_MAX_ATTEMPTS, base_delay=DEFAULT_BASE_DELAY,
+                 max_delay=DEFAULT_MAX_DELAY, verbose=False):
+        self.name = name
+        self.limiter = limiter or TokenBucket(0)
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.verbose = verbose
+        self.consecutive_failures = 0
+        self.retries = 0
+        self.lock = threading.Lock()
+
+    # Call func, retrying transient errors; the last error is raised once the attempts run out
+    def call(self, func, *args, **kwargs):
+        return self.call_retrying(is_transient, func, *args, **kwargs)
+
+    # Like call(), for writes that would be duplicated if applied twice (adding entries, creating a
+    # playlist, removing or moving entries by position): only failures that never reached the service are retried
+    def call_write(self, func, *args, **kwargs):
+        return self.call_retrying(is_unapplied, func, *args, **kwargs)
+
+    def call_retrying(self, retryable, func, *args, **kwargs):
+        attempt = 1
+        while True:
+            self.limiter.acquire()
+            try:
+                result = func(*args, **kwargs)
+            except Exception as e:
+                if attempt >= self.max_attempts or not retryable(e):
+                    raise
+                self.back_off(attempt, error_status(e), retry_after(e), e)
+                attempt += 1
+                continue
+            self.succeeded()
+            return result
+
+    # Like call(), for functions that return a requests.Response instead of raising on HTTP errors;
+    # the last response is returned once the attempts run out
+    def call_response(self, func, *args, **kwargs):
+        attempt = 1
+        while True:
+            self.limiter.acquire()
+            try:
+                response = func(*args, **kwargs)
+            except Exception as e:
+                if attempt >= self.max_attempts or not is_transient(e):
+                    raise
+                self.back_off(attempt, error_status(e), retry_after(e), e)
+                attempt += 1
+                continue
+            if response.status_code not in RETRY_STATUS_CODES or attempt >= self.max_attempts:
+                self.succeeded()
+                return response
+            self.back_off(attempt, response.status_code, retry_after(response), f"HTTP {response.status_code}")
+            attempt += 1
+
+    # Exponential backoff with jitter (half fixed, half random), or the server's Retry-After
+    def delay(self, attempt, requested=None):
+        if requested is not None:
+            return requested + random.uniform(0, self.base_delay)
+        delay = min(self.max_delay, self.base_delay * 2 ** (attempt - 1))
+        return delay / 2 + random.uniform(0, delay / 2)
+
+    # Record a transient failure, slow the shared limiter down and wait before the next attempt
+    def back_off(self, attempt, status, requested, error):
+        delay = self.delay(attempt, requested)
+        error = str(error) or type(error).__name__
+        with self.lock:
+            self.retries += 1
+            self.consecutive_failures += 1
+            breaker_open = self.consecutive_failures >= BREAKER_THRESHOLD
+            if breaker_open:
+                self.consecutive_failures = 0
+        if status == 429:
+            # The service is rate limiting us: every worker waits, then continues at a lower rate
+            self.limiter.slow_down()
+            self.limiter.pause(delay)
+        if breaker_open:
+            print(f"{self.name} keeps failing ({error}); pausing all {self.name} calls for {BREAKER_COOLDOWN}s.")
+            self.limiter.pause(BREAKER_COOLDOWN)
+        elif self.verbose:
+            print(f"{self.name} call failed ({error}); retrying in {delay:.1f}s (attempt {attempt + 1}/{self.max_attempts}).")
+        time.sleep(delay)
+
+    def succeeded(self):
+        with self.lock:
+            self.consecutive_failures = 0
+        self.limiter.speed_up()
@@ -0,0 +1,198 @@
+"""
+spotify_api.py
+
+Description:
+    Spotify Web API helpers shared by the playlist sync scripts.
+    Playlist and album track listings are fully paginated: the first page gives the `total`, and the
+    remaining offsets are fetched concurrently. Playlist requests use the `fields=` parameter so only
+    the track name, artists, album, ID and ISRC are returned.
+    Web-player access tokens (obtained from cookies.txt) are cached on disk with their expiry, reused
+    across runs until shortly before they expire, and refreshed transparently when the API returns 401.
+    Requests go through the token manager's session (a pooled requests.Session from http_sessions.py when
+    given), so token fetches and page fetches reuse keep-alive connections.
+    Page fetches can be given a RetryPolicy (retry_policy.py), which then also applies the rate limit.
+"""
+
+import json
+import os
+import threading
+import time
+import requests
+from http.cookiejar import MozillaCookieJar
+from concurrent.futures import ThreadPoolExecutor
+
+SPOTIFY_API_URL = 'https://api.spotify.com/v1'
+SPOTIFY_TOKEN_URL = 'https://open.spotify.com/get_access_token'
+
+# Cached tokens are refreshed this many seconds before they expire
+TOKEN_EXPIRY_MARGIN = 120
+
+# Only the fields the sync scripts use are requested for playlist items
+PLAYLIST_TRACK_FIELDS = 'total,items(track(id,name,artists(name),album(name),external_ids(isrc),external_urls(spotify)))'
+
+# Maximum page sizes allowed by the Spotify Web API
+PLAYLIST_PAGE_SIZE = 100
+ALBUM_PAGE_SIZE = 50
+
+# Number of pages fetched in parallel after the first one
+DEFAULT_FETCH_WORKERS = 4
+
+
+class SpotifyTokenManager:
+    # cache_path defaults to a file next to cookies.txt; session defaults to plain (unpooled) requests
+    def __init__(self, cookies_path, cache_path=None, session=None):
+        self.cookies_path = cookies_path
+        self.cache_path = cache_path or f"{cookies_path}.token.json"
+        self.session = session or requests
+        self.access_token = None
+        self.expires_at = 0
+        self.lock = threading.Lock()
+
+    # Return a valid access token, from memory, the on-disk cache, or a fresh request (None on failure).
+    # Named like spotipy's auth managers so it can be passed as spotipy.Spotify(auth_manager=...).
+    def get_access_token(self, as_dict=False):
+        with self.lock:
+            if not self.is_valid():
+                self.load_cache()
+            if not self.is_valid():
+                self.fetch_token()
+            return self.access_token
+
+    # Force a new token, e.g. after the API rejected the current one with 401
+    def refresh(self, rejected_token=None):
+        with self.lock:
+            # Another thread (or process, via the cache file) may already have replaced the rejected token
+            if rejected_token:
+                if rejected_token == self.access_token:
+                    self.load_cache()
+                if rejected_token != self.access_token and self.is_valid():
+                    return self.access_token
+            self.fetch_token()
+            return self.access_token
+
+    def is_valid(self):
+        return bool(self.access_token) and time.time() < self.expires_at - TOKEN_EXPIRY_MARGIN
+
+    def load_cache(self):
+        try:
+            with open(self.cache_path) as f:
+                cached = json.load(f)
+        except (OSError, ValueError):
+            return
+        self.access_token = cached.get('accessToken')
+        self.expires_at = cached.get('expiresAt', 0)
+
+    # Written to a temp file that is private from the start, then swapped in, so the token is never world-readable
+    # and a crash mid-write cannot leave a truncated cache behind
+    def save_cache(self):
+        temp_path = f"{self.cache_path}.tmp"
+        try:
+            fd = os.open(temp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+            with os.fdopen(fd, 'w') as f:
+                json.dump({'accessToken': self.access_token, 'expiresAt': self.expires_at}, f)
+            os.replace(temp_path, self.cache_path)
+        except OSError as e:
+            print(f"Warning: could not write Spotify token cache '{self.cache_path}': {e}")
+
+    # Exchange the cookies for a new web-player access token
+    def fetch_token(self):
+        cookie_jar = MozillaCookieJar(self.cookies_path)
+        cookie_jar.load(ignore_discard=True, ignore_expires=True)
+        response = self.session.get(SPOTIFY_TOKEN_URL, cookies=cookie_jar)
+        if response.status_code != 200:
+            print(f"Failed to retrieve Spotify access token: {response.status_code} - {response.text}")
+            self.access_token = None
+            self.expires_at = 0
+            return
+        data = response.json()
+        self.access_token = data.get('accessToken')
+        self.expires_at = data.get('accessTokenExpirationTimestampMs', 0) / 1000 or time.time() + 3600
+        self.save_cache()
+
+    # Call a spotipy method, refreshing the token and retrying once if Spotify answers 401
+    def call(self, func, *args, **kwargs):
+        token = self.get_access_token()
+        try:
+            return func(*args, **kwargs)
+        except Exception as e:
+            if getattr(e, 'http_status', None) != 401:
+                raise
+            self.refresh(token)
+            return func(*args, **kwargs)
+
+
+# Fetch a single page of a Spotify collection endpoint.
+# access_token may be a token string or a SpotifyTokenManager (which is refreshed once on 401, and whose
+# session is used for the request). With a RetryPolicy, 429/5xx responses and network errors are retried.
+def fetch_spotify_page(url, access_token, params, limiter=None, retry=None):
+    if retry:
+        return retry.call_response(fetch_spotify_page, url, access_token, params, limiter)
+    if limiter:
+        limiter.acquire()
+    if not isinstance(access_token, SpotifyTokenManager):
+        return requests.get(url, headers={'Authorization': f'Bearer {access_token}'}, params=params)
+    session = access_token.session
+    token = access_token.get_access_token()
+    response = session.get(url, headers={'Authorization': f'Bearer {token}'}, params=params)
+    if response.status_code == 401:
+        token = access_token.refresh(token)
+        response = session.get(url, headers={'Authorization': f'Bearer {token}'}, params=params)
+    return response
+
+
+# Fetch every item of a Spotify playlist or album track listing, in order.
+# Returns None (after printing the error) if any page fails, so callers never work on a truncated list.
+def get_spotify_collection_items(access_token, spotify_type, spotify_id, workers=DEFAULT_FETCH_WORKERS, limiter=None, retry=None):
+    url = f'{SPOTIFY_API_URL}/{spotify_type}s/{spotify_id}/tracks'
+    page_size = PLAYLIST_PAGE_SIZE if spotify_type == 'playlist' else ALBUM_PAGE_SIZE
+    params = {'limit': page_size}
+    if spotify_type == 'playlist':
+        params['fields'] = PLAYLIST_TRACK_FIELDS
+        params['additional_types'] = 'track'
+
+    # The first page tells us how many items there are in total
+    response = fetch_spotify_page(url, access_token, dict(params, offset=0), limiter, retry)
+    if response.status_code != 200:
+        print(f"Failed to retrieve {spotify_type}: {response.status_code} - {response.text}")
+        return None
+    first_page = response.json()
+    items = list(first_page['items'])
+    total = first_page.get('total', len(items))
+
+    # Fetch the remaining offsets concurrently; map() keeps the pages in offset order
+    offsets = range(page_size, total, page_size)
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        responses = executor.map(lambda offset: fetch_spotify_page(url, access_token, dict(params, offset=offset), limiter, retry), offsets)
+        for offset, response in zip(offsets, responses):
+            if response.status_code != 200:
+                print(f"Failed to retrieve {spotify_type} page at offset {offset}: {response.status_code} - {response.text}")
+                return None
+            items.extend(response.json()['items'])
+
+    return items
+
+
+# Fetch every track object of a Spotify playlist, skipping removed/unavailable entries
+def get_spotify_playlist_items(access_token, playlist_id, workers=DEFAULT_FETCH_WORKERS, limiter=None, retry=None):
+    items = get_spotify_collection_items(access_token, 'playlist', playlist_id, workers, limiter, retry)
+    if items is None:
+        return None
+    return [item['track'] for item in items if item.get('track')]
+
+
+# Track IDs of a playlist in playlist order, one per entry (None for local files and unavailable items);
+# None on failure. Positions line up with the playlist, as needed for position-based edits.
+def get_spotify_playlist_track_ids(access_token, playlist_id, workers=DEFAULT_FETCH_WORKERS, limiter=None, retry=None):
+    items = get_spotify_collection_items(access_token, 'playlist', playlist_id, workers, limiter, retry)
+    if items is None:
+        return None
+    return [(item.get('track') or {}).get('id') for item in items]
+
+
+# Fetch a playlist's snapshot_id (changes whenever the playlist contents change); None on failure
+def get_spotify_playlist_snapshot_id(access_token, playlist_id, limiter=None, retry=None):
+    response = fetch_spotify_page(f'{SPOTIFY_API_URL}/playlists/{playlist_id}', access_token, {'fields': 'snapshot_id'}, limiter, retry)
+    if response.status_code != 200:
+        print(f"Failed to retrieve playlist snapshot ID: {response.status_code} - {response.text}")
+        return None
+    return response.json().get('snapshot_id')
@@ -0,0 +1,89 @@
+"""
+sync_engine.py
+
+Description:
+    In-process API for running syncs of convert_playlist_aio_plex_spotify_youtube.py from a
+    long-lived program (the GUI) instead of starting a new Python process per run.
+    The script module stays loaded, so its service clients, authenticated sessions, Plex library
+    index and match cache stay warm between runs. A run that uses the same connection settings as
+    the previous one starts matching immediately.
+    warm_up() does the slow setup (client imports, authentication, Plex connection and index
+    build) in a background thread, for example as soon as the GUI window opens.
+    Runs take the same command-line arguments as the script. Runs and warm-ups are serialized, since
+    they share the script's clients. Output goes to a writable stream (a callable is wrapped), and the
+    script's sys.exit() calls are turned into a return value.
+    A run can also take a progress callback, called as progress(processed, matched, total) from the
+    matching loop (total is None while a streamed source playlist is still being read).
+"""
+
+import io
+import sys
+import threading
+import traceback
+from contextlib import redirect_stdout, redirect_stderr
+
+import convert_playlist_aio_plex_spotify_youtube as aio
+
+
+# File-like adapter that passes every write to a callback (e.g. a GUI log)
+class CallbackWriter(io.TextIOBase):
+    def __init__(self, callback):
+        self.callback = callback
+
+    def write(self, text):
+        if text:
+            self.callback(text)
+        return len(text)
+
+
+class SyncEngine:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.warming = None
+
+    def output_stream(self, output):
+        if output is None:
+            return sys.stdout
+        return output if hasattr(output, 'write') else CallbackWriter(output)
+
+    # Run func with the script's output redirected; returns (succeeded, result)
+    def call(self, func, argv, output=None):
+        stream = self.output_stream(output)
+        with self.lock, redirect_stdout(stream), redirect_stderr(stream):
+            try:
+                return True, func(argv)
+            except SystemExit as e:
+                if e.code not in (None, 0):
+                    # argparse already printed its usage message; other exits carry the error text
+                    if not isinstance(e.code, int):
+                        print(e.code)
+                    return False, None
+                return True, None
+            except Exception:
+                traceback.print_exc()
+                return False, None
+
+    # Run one sync (or manifest) with the script's command-line arguments; returns True on success
+    def run(self, argv, output=None, progress=None):
+        def main(argv):
+            aio.progress_callback = progress
+            try:
+                return aio.main(argv)
+            finally:
+                aio.progress_callback = None
+        return self.call(main, list(argv), output)[0]
+
+    # Set up the clients and Plex index for argv in a background thread; done(succeeded) is called when finished
+    def warm_up(self, argv, output=None, done=None):
+        def warm():
+            ok = self.call(aio.prepare, list(argv), output)[0]
+            if done:
+                done(ok)
+        self.warming = threading.Thread(target=warm, daemon=True)
+        self.warming.start()
+        return self.warming
+
+    # Drop the warm clients and index (e.g. after changing credentials outside the program)
+    def reset(self):
+        with self.lock:
+            aio.reset_services()
@@ -0,0 +1,82 @@
+"""
+sync_state.py
+
+Description:
+    Local sync-state store for incremental (delta) playlist syncs.
+    For every source -> destination sync it records the source playlist fingerprint (Spotify snapshot_id,
+    or a hash of the YouTube Music videoId / Plex ratingKey list), the ordered source track keys, and the
+    destination ID each source track was written as. On a rerun the sync scripts compare against this
+    state to skip unchanged playlists entirely, or to process only added and removed tracks.
+"""
+
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+
+
+# Stable key identifying a source track: its service ID when available, else normalized artist|title
+def track_key(track):
+    if track.get('id'):
+        return str(track['id'])
+    return f"{(track.get('artist') or '').lower()}|{(track.get('title') or '').lower()}"
+
+
+# Fingerprint an ordered list of track keys (used when the source service has no version ID of its own)
+def fingerprint_keys(keys):
+    return hashlib.sha1('\n'.join(keys).encode('utf-8')).hexdigest()
+
+
+# Key identifying one sync job (source playlist -> destination playlist)
+def sync_key(source_service, source_id, destination_service, playlist_name):
+    return f"{source_service}:{source_id}->{destination_service}:{playlist_name}"
+
+
+class SyncState:
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS playlists ("
+            "sync_key TEXT PRIMARY KEY, fingerprint TEXT, track_keys TEXT, synced_at INTEGER)"
+        )
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS track_map ("
+            "sync_key TEXT, source_key TEXT, destination_id TEXT, PRIMARY KEY (sync_key, source_key))"
+        )
+        self.db.commit()
+
+    # Previous state of a sync as (fingerprint, ordered track keys), or None if it never ran
+    def get(self, key):
+        with self.lock:
+            row = self.db.execute("SELECT fingerprint, track_keys FROM playlists WHERE sync_key = ?", (key,)).fetchone()
+        if not row:
+            return None
+        return row[0], json.loads(row[1])
+
+    # Destination ID previously written for each source track key of a sync
+    def mappings(self, key):
+        with self.lock:
+            rows = self.db.execute("SELECT source_key, destination_id FROM track_map WHERE sync_key = ?", (key,)).fetchall()
+        return dict(rows)
+
+    # Record a completed sync: new fingerprint and track list, added mappings, and mappings of removed tracks dropped
+    def save(self, key, fingerprint, track_keys, written=None, removed_keys=(), replace_mappings=False):
+        with self.lock:
+            self.db.execute(
+                "INSERT OR REPLACE INTO playlists (sync_key, fingerprint, track_keys, synced_at) VALUES (?, ?, ?, ?)",
+                (key, fingerprint, json.dumps(track_keys), int(time.time()))
+            )
+            if replace_mappings:
+                self.db.execute("DELETE FROM track_map WHERE sync_key = ?", (key,))
+            self.db.executemany(
+                "DELETE FROM track_map WHERE sync_key = ? AND source_key = ?",
+                [(key, source_key) for source_key in removed_keys]
+            )
+            self.db.executemany(
+                "INSERT OR REPLACE INTO track_map (sync_key, source_key, destination_id) VALUES (?, ?, ?)",
+                [(key, source_key, str(destination_id)) for source_key, destination_id in (written or {}).items()]
+            )
+            self.db.commit()
@@ -0,0 +1,115 @@
+"""
+sync_workers.py
+
+Description:
+    Concurrency helpers for the playlist sync scripts: a thread-safe token-bucket rate limiter
+    (one per service, so parallel searches stay under each service's rate limits) and an
+    order-preserving worker pool used to run per-track searches in parallel.
+    When a service pushes back (see retry_policy.py) its limiter can be paused, or its rate lowered
+    and then gradually restored, which slows every worker sharing it at once.
+"""
+
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+
+# Lowest fraction of its configured rate a throttled limiter is slowed down to
+MIN_RATE_FRACTION = 0.1
+
+# Fraction of the configured rate restored after each successful call
+RATE_RECOVERY_STEP = 0.05
+
+
+class TokenBucket:
+    # rate: tokens added per second; burst: bucket capacity (defaults to one second worth of tokens)
+    def __init__(self, rate, burst=None):
+        self.rate = float(rate) if rate else 0.0
+        self.base_rate = self.rate
+        self.capacity = float(burst) if burst else max(1.0, self.rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.resume_at = 0.0
+        self.lock = threading.Lock()
+
+    # Block until a token is available (a rate of 0 disables limiting, but a pause still applies)
+    def acquire(self, tokens=1):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                if now < self.resume_at:
+                    wait = self.resume_at - now
+                elif self.rate <= 0:
+                    return
+                else:
+                    self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                    self.updated = now
+                    if self.tokens >= tokens:
+                        self.tokens -= tokens
+                        return
+                    wait = (tokens - self.tokens) / self.rate
+            time.sleep(wait)
+
+    # Hold back every caller for the given number of seconds (e.g. a Retry-After)
+    def pause(self, seconds):
+        with self.lock:
+            resume_at = time.monotonic() + seconds
+            if resume_at > self.resume_at:
+                self.resume_at = resume_at
+                self.tokens = 0.0
+                self.updated = resume_at
+
+    # Halve the rate after the service pushed back (never below MIN_RATE_FRACTION of the configured rate)
+    def slow_down(self):
+        with self.lock:
+            self.rate = max(self.base_rate * MIN_RATE_FRACTION, self.rate / 2)
+
+    # Step the rate back up towards the configured rate after a successful call
+    def speed_up(self):
+        with self.lock:
+            self.rate = min(self.base_rate, self.rate + self.base_rate * RATE_RECOVERY_STEP)
+
+
+# Run match_func over tracks with a pool of workers, yielding (track, result) pairs in source order.
+# Tracks are consumed lazily (so a generator source can still be streaming) with a bounded number
+# of searches in flight; workers <= 1 runs sequentially on the calling thread.
+def match_tracks(tracks, match_func, workers=1):
+    if not workers or workers <= 1:
+        for track in tracks:
+            yield track, match_func(track)
+        return
+
+    max_pending = workers * 4
+    pending = deque()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for track in tracks:
+            pending.append((track, executor.submit(match_func, track)))
+            if len(pending) >= max_pending:
+                track, future = pending.popleft()
+                yield track, future.result()
+        while pending:
+            track, future = pending.popleft()
+            yield track, future.result()
+
+
+# Thread-safe cache of search results, shared by all jobs in a process so a track searched once
+# (on a given service with the same criteria) is never searched again
+class MatchCache:
+    def __init__(self):
+        self.results = {}
+        self.lock = threading.Lock()
+
+    def get_or_search(self, key, search_func):
+        with self.lock:
+            if key in self.results:
+                return self.results[key]
+        result = search_func()
+        with self.lock:
+            self.results[key] = result
+        return result
+
+    # Forget all cached results (e.g. after the Plex library index was refreshed in watch mode)
+    def clear(self):
+        with self.lock:
+            self.results.clear()
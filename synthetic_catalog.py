@@ -0,0 +1,133 @@
+"""
+synthetic_catalog.py
+
+Description:
+    Generator of synthetic, Plex-shaped music catalogs (10k to 1M+ tracks) for scaling benchmarks of
+    the matching engines, plus matching source queries with known answers.
+    The catalog deliberately contains the collisions that make real libraries hard to match:
+      - "Various Artists" compilations (album artist differs from the track artist);
+      - remastered / deluxe re-releases of existing tracks ("Song (Remastered 2011)", "Song - 2011 Remaster");
+      - featured artists in titles ("Song (feat. X)", "Song ft. X");
+      - very common titles shared by many artists ("Intro", "Home", "Love", ...);
+      - non-Latin artist and track names (Japanese, Cyrillic, Greek, Korean).
+    Tracks are SnapshotTrack records (the same lightweight shape the on-disk Plex snapshot loads), so
+    they can be indexed directly by PlexLibraryIndex and the faster engines.
+    Generation is deterministic for a given size and seed.
+"""
+
+import random
+from datetime import datetime
+from plex_library_index import SnapshotTrack
+
+ADDED_AT = int(datetime(2024, 1, 1).timestamp())
+
+TRACKS_PER_ALBUM = 12
+ALBUMS_PER_ARTIST = 4
+
+# Share of generated tracks of each kind (the rest are plain studio tracks)
+VARIOUS_ARTISTS_SHARE = 0.08
+REMASTER_SHARE = 0.05
+FEATURED_SHARE = 0.05
+COMMON_TITLE_SHARE = 0.03
+NON_LATIN_ARTIST_SHARE = 0.10
+
+# Share of queries for tracks that are not in the library at all
+MISSING_QUERY_SHARE = 0.10
+
+LATIN_SYLLABLES = ['ka', 'lo', 'mi', 'ra', 'ne', 'to', 'sa', 'vi', 'den', 'mor', 'lin', 'ash', 'el', 'ron', 'tar', 'bel', 'cor', 'dra', 'fen', 'gal']
+WORDS = ['love', 'night', 'fire', 'dream', 'heart', 'light', 'rain', 'gold', 'river', 'shadow', 'summer', 'city', 'ghost', 'stars',
+         'blue', 'wild', 'electric', 'silver', 'broken', 'forever', 'midnight', 'ocean', 'paper', 'stone', 'echo', 'velvet']
+COMMON_TITLES = ['Intro', 'Outro', 'Interlude', 'Home', 'Love', 'Untitled', 'Hello', 'Stay', 'Run', 'Forever']
+NON_LATIN_SYLLABLES = [
+    ['さ', 'く', 'ら', 'な', 'つ', 'み', 'か', 'ぜ', 'ひ', 'こ'],
+    ['ка', 'ли', 'но', 'ра', 'ту', 'ше', 'ве', 'до', 'мир', 'зо'],
+    ['κα', 'λη', 'μο', 'ρα', 'νε', 'το', 'σα', 'φι', 'δε', 'ξο'],
+    ['하', '늘', '사', '랑', '별', '빛', '바', '다', '꿈', '노'],
+]
+REMASTER_FORMATS = ['{title} (Remastered {year})', '{title} - {year} Remaster', '{title} (Live)', '{title} [Remastered]']
+FEATURED_FORMATS = ['{title} (feat. {guest})', '{title} ft. {guest}', '{title} (with {guest})']
+
+
+def latin_name(rng, syllables=2):
+    return ''.join(rng.choice(LATIN_SYLLABLES) for _ in range(syllables)).capitalize()
+
+
+def non_latin_name(rng):
+    alphabet = rng.choice(NON_LATIN_SYLLABLES)
+    return ''.join(rng.choice(alphabet) for _ in range(rng.randint(2, 4)))
+
+
+def artist_name(rng, non_latin_share=NON_LATIN_ARTIST_SHARE):
+    if rng.random() < non_latin_share:
+        return non_latin_name(rng)
+    name = f"{latin_name(rng)} {latin_name(rng, rng.randint(1, 3))}"
+    return f"The {name}" if rng.random() < 0.1 else name
+
+
+def track_title(rng):
+    if rng.random() < COMMON_TITLE_SHARE:
+        return rng.choice(COMMON_TITLES)
+    return ' '.join(rng.choice(WORDS) for _ in range(rng.randint(1, 4))).title()
+
+
+# Generate a catalog of about `size` tracks as a list of SnapshotTrack records
+def generate_catalog(size, seed=0):
+    rng = random.Random(seed)
+    tracks = []
+    artists = []
+
+    def add(title, artist, album, track_artist=None):
+        tracks.append(SnapshotTrack(len(tracks) + 1, title, artist, track_artist, album, ADDED_AT, ADDED_AT, ()))
+
+    while len(tracks) < size:
+        roll = rng.random()
+        if roll < VARIOUS_ARTISTS_SHARE and artists:
+            # Compilation: album artist "Various Artists", track artist in originalTitle
+            album = f"{rng.choice(WORDS).title()} Hits {rng.randint(1990, 2024)}"
+            for _ in range(TRACKS_PER_ALBUM):
+                original = rng.choice(tracks)
+                add(original.title, 'Various Artists', album, original.originalTitle or original.grandparentTitle)
+        elif roll < VARIOUS_ARTISTS_SHARE + REMASTER_SHARE and tracks:
+            # Re-release of an existing album with decorated titles
+            original_album = rng.choice(tracks).parentTitle
+            source = [track for track in tracks[-5000:] if track.parentTitle == original_album] or [rng.choice(tracks)]
+            year = rng.randint(2000, 2024)
+            template = rng.choice(REMASTER_FORMATS)
+            for original in source[:TRACKS_PER_ALBUM]:
+                add(template.format(title=original.title, year=year), original.grandparentTitle,
+                    f"{original.parentTitle} (Deluxe Edition)", original.originalTitle)
+        else:
+            artist = artist_name(rng)
+            artists.append(artist)
+            for _ in range(ALBUMS_PER_ARTIST):
+                album = track_title(rng)
+                for _ in range(TRACKS_PER_ALBUM):
+                    title = track_title(rng)
+                    if rng.random() < FEATURED_SHARE and len(artists) > 1:
+                        title = rng.choice(FEATURED_FORMATS).format(title=title, guest=rng.choice(artists))
+                    add(title, artist, album)
+    return tracks[:size]
+
+
+# Source-side queries as (artist, title, album, expected ratingKey or None), the way another service
+# would present them: mostly exact, some with decorations added or removed, some case-mangled, and
+# a share of tracks that are not in the library at all
+def generate_queries(tracks, count, seed=0):
+    rng = random.Random(seed + 1)
+    queries = []
+    for _ in range(count):
+        if rng.random() < MISSING_QUERY_SHARE:
+            queries.append((artist_name(rng), track_title(rng) + ' ' + latin_name(rng), None, None))
+            continue
+        track = rng.choice(tracks)
+        artist = track.originalTitle or track.grandparentTitle
+        title = track.title
+        roll = rng.random()
+        if roll < 0.15:
+            title = rng.choice(REMASTER_FORMATS).format(title=title, year=rng.randint(2000, 2024))
+        elif roll < 0.2:
+            title = title.upper()
+        elif roll < 0.25:
+            artist = artist.lower()
+        queries.append((artist, title, track.parentTitle, track.ratingKey))
+    return queries
@@ -0,0 +1,300 @@
+"""
+track_identity.py
+
+Description:
+    Local store of cross-service track identities for the playlist sync scripts.
+    Every successful match links the source track's ID (Spotify track ID, YouTube Music videoId or
+    Plex ratingKey) to the ID it was matched to on the destination service. Later syncs in any
+    direction look the source track up here first and, when a chain of links leads to an ID on the
+    destination service, use it without a search call. For example, after syncing a playlist
+    Spotify -> Plex and Spotify -> YouTube Music, syncing it Plex -> YouTube Music needs no searches.
+    Every link carries a confidence level, from lowest to highest: fuzzy (approximate title match),
+    search (top text search result or exact title/artist match), exact (same ISRC/MusicBrainz ID, or
+    the service's own metadata) and manual (linked with this script). Only exact links make IDs one
+    recording (merging everything already known about each of them); lower links stay pairs between
+    two IDs. A chain of links is as confident as its weakest link, lookups only follow links at or
+    above a minimum level and prefer the most confident chain, so a manual link overrides whatever
+    automatic matching found and one wrong fuzzy match cannot join unrelated recordings.
+    Links to Plex tracks found by text remember the matching criteria they were made with
+    (--force-album-match, --min-score) and are only reused by syncs asking for the same or looser criteria.
+    A wrong link can be dropped with the forget command; the ID is then matched again by the next sync that needs it.
+    Plex ratingKeys only mean something within one library section, so Plex IDs are stored under
+    the service name plex/<section uuid>.
+
+Usage:
+    python track_identity.py show spotify:6rqhFgbbKwnb9MLmUQDhG6
+    python track_identity.py link spotify:6rqhFgbbKwnb9MLmUQDhG6 ytmusic:dQw4w9WgXcQ
+    python track_identity.py forget plex/<section uuid>:12345
+    python track_identity.py stats --db ~/.cache/playlist-sync/track_identities.db
+"""
+
+import argparse
+import os
+import sqlite3
+import threading
+import time
+
+DEFAULT_TRACK_IDENTITIES = os.path.join(os.path.expanduser('~'), '.cache', 'playlist-sync', 'track_identities.db')
+
+# Confidence levels of a link, lowest first (stored as their position in this list)
+CONFIDENCE_LEVELS = ['fuzzy', 'search', 'exact', 'manual']
+DEFAULT_MIN_CONFIDENCE = 'search'
+EXACT = CONFIDENCE_LEVELS.index('exact')
+MANUAL = CONFIDENCE_LEVELS.index('manual')
+
+# Most links followed from a source track to the destination ID
+MAX_LINK_CHAIN = 3
+
+# Strictness of --force-album-match values, for comparing the criteria of a link with those of a lookup
+ALBUM_MATCH_STRICTNESS = {'': 0, 'fuzzy': 1, 'exact': 2}
+
+# Bump when the table layout changes; older stores are emptied and refilled by the next syncs
+SCHEMA_VERSION = 2
+
+
+def confidence_rank(confidence):
+    return CONFIDENCE_LEVELS.index(confidence)
+
+
+# Parse "service:id" (e.g. spotify:6rqhFgbbKwnb9MLmUQDhG6, isrc:USRC17607839) into (service, id)
+def parse_identifier(text):
+    service, separator, item_id = text.partition(':')
+    if not separator or not service or not item_id:
+        raise ValueError(f"expected service:id, got '{text}'")
+    if service == 'isrc':
+        item_id = item_id.replace('-', '').upper()
+    elif service == 'mbid':
+        item_id = item_id.lower()
+    return service, item_id
+
+
+def format_identifier(identifier):
+    return f"{identifier[0]}:{identifier[1]}"
+
+
+# Whether a link made with criteria (force_album_match, min_score) may be reused by a lookup asking for
+# criteria; None on either side means the matching did not depend on them
+def criteria_allow(link_criteria, link_rank, criteria):
+    if link_criteria is None or criteria is None:
+        return True
+    link_album, link_score = link_criteria
+    album, min_score = criteria
+    if ALBUM_MATCH_STRICTNESS[link_album or ''] < ALBUM_MATCH_STRICTNESS[album or '']:
+        return False
+    # An approximate match only counts for lookups that accept scores at least as low as it was made with
+    if link_rank < confidence_rank('search'):
+        return min_score is not None and link_score is not None and link_score >= min_score
+    return True
+
+
+class TrackIdentityStore:
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        if self.db.execute("PRAGMA user_version").fetchone()[0] != SCHEMA_VERSION:
+            self.db.execute("DROP TABLE IF EXISTS identities")
+            self.db.execute("DROP TABLE IF EXISTS links")
+            self.db.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+        # IDs known to be the same recording (exact links)
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS identities ("
+            "service TEXT, item_id TEXT, recording INTEGER, PRIMARY KEY (service, item_id))"
+        )
+        self.db.execute("CREATE INDEX IF NOT EXISTS identities_recording ON identities (recording)")
+        # Lower-confidence links between two IDs, stored in both directions
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS links ("
+            "service TEXT, item_id TEXT, other_service TEXT, other_id TEXT, confidence INTEGER, "
+            "album_match TEXT, min_score REAL, linked_at INTEGER, PRIMARY KEY (service, item_id, other_service, other_id))"
+        )
+        self.db.commit()
+
+    # IDs of the same recording as identifier (including itself)
+    def members(self, identifier):
+        row = self.db.execute("SELECT recording FROM identities WHERE service = ? AND item_id = ?", identifier).fetchone()
+        if not row:
+            return [identifier]
+        return self.db.execute("SELECT service, item_id FROM identities WHERE recording = ?", row).fetchall()
+
+    # Links from identifier as (other identifier, confidence rank, criteria or None, linked_at)
+    def neighbours(self, identifier):
+        rows = self.db.execute(
+            "SELECT other_service, other_id, confidence, album_match, min_score, linked_at FROM links "
+            "WHERE service = ? AND item_id = ?", identifier
+        ).fetchall()
+        return [((service, item_id), rank, None if album is None else (album, score), linked_at)
+                for service, item_id, rank, album, score, linked_at in rows]
+
+    # ID on service linked to any of the identifiers (the source track's IDs), or None if unknown.
+    # Chains of up to MAX_LINK_CHAIN links are followed, each as confident as its weakest link; only links at
+    # or above min_confidence and allowed by criteria ((force_album_match, min_score) of the lookup) count.
+    # Returns (item_id, confidence) of the most confident chain (the shortest, then the newest, on ties).
+    def resolve(self, identifiers, service, min_confidence=DEFAULT_MIN_CONFIDENCE, criteria=None):
+        minimum = confidence_rank(min_confidence)
+        with self.lock:
+            # best[identifier] = (confidence rank, -links, linked_at) of the best chain reaching it
+            best = {}
+
+            def reach(identifier, rank, links, linked_at):
+                for member in self.members(identifier):
+                    score = (rank if member == identifier else min(rank, EXACT), -links, linked_at)
+                    if score > best.get(member, (-1,)):
+                        best[member] = score
+                        frontier[member] = score
+
+            frontier = {}
+            for identifier in identifiers:
+                reach(identifier, MANUAL, 0, 0)
+            for links in range(1, MAX_LINK_CHAIN + 1):
+                current, frontier = frontier, {}
+                for identifier, (rank, _, _) in current.items():
+                    for other, link_rank, link_criteria, linked_at in self.neighbours(identifier):
+                        if link_rank >= minimum and criteria_allow(link_criteria, link_rank, criteria):
+                            reach(other, min(rank, link_rank), links, linked_at)
+                if not frontier:
+                    break
+
+        found = [(score, identifier) for identifier, score in best.items()
+                 if identifier[0] == service and identifier not in identifiers and score[0] >= minimum]
+        if not found:
+            return None
+        (rank, _, _), identifier = max(found)
+        return identifier[1], CONFIDENCE_LEVELS[rank]
+
+    # Record that the identifiers are the same recording (e.g. a Spotify track and its ISRC)
+    def merge(self, identifiers):
+        recordings = set()
+        for identifier in identifiers:
+            row = self.db.execute("SELECT recording FROM identities WHERE service = ? AND item_id = ?", identifier).fetchone()
+            if row:
+                recordings.add(row[0])
+        if recordings:
+            recording = min(recordings)
+            for other in recordings - {recording}:
+                self.db.execute("UPDATE identities SET recording = ? WHERE recording = ?", (recording, other))
+        else:
+            recording = self.db.execute("SELECT COALESCE(MAX(recording), 0) + 1 FROM identities").fetchone()[0]
+        self.db.executemany(
+            "INSERT OR REPLACE INTO identities (service, item_id, recording) VALUES (?, ?, ?)",
+            [(*identifier, recording) for identifier in identifiers]
+        )
+
+    # Link two IDs; exact links merge their recordings, others are kept as a pair with their confidence and
+    # criteria. A link never lowers the confidence of an existing one between the same two IDs.
+    def add_link(self, identifier, other, confidence, criteria=None, now=None):
+        rank = confidence_rank(confidence)
+        if rank == EXACT:
+            self.merge([identifier, other])
+            return
+        row = self.db.execute(
+            "SELECT confidence FROM links WHERE service = ? AND item_id = ? AND other_service = ? AND other_id = ?",
+            (*identifier, *other)
+        ).fetchone()
+        if row and row[0] > rank:
+            return
+        album, min_score = criteria if criteria is not None else (None, None)
+        self.db.executemany(
+            "INSERT OR REPLACE INTO links (service, item_id, other_service, other_id, confidence, album_match, min_score, linked_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            [(*a, *b, rank, album, min_score, now or int(time.time())) for a, b in ((identifier, other), (other, identifier))]
+        )
+
+    # Apply the results of a sync in one transaction: groups of IDs of the same recording, and
+    # (identifier, other identifier, confidence, criteria) links
+    def record(self, groups=(), links=()):
+        now = int(time.time())
+        with self.lock:
+            for identifiers in groups:
+                self.merge(identifiers)
+            for identifier, other, confidence, criteria in links:
+                self.add_link(identifier, other, confidence, criteria, now)
+            self.db.commit()
+
+    def link(self, identifier, other, confidence, criteria=None):
+        self.record(links=[(identifier, other, confidence, criteria)])
+
+    # Drop an identifier and its links from the store (the other IDs of its recording stay linked to each other)
+    def forget(self, identifier):
+        with self.lock:
+            deleted = self.db.execute("DELETE FROM identities WHERE service = ? AND item_id = ?", identifier).rowcount
+            deleted += self.db.execute("DELETE FROM links WHERE service = ? AND item_id = ?", identifier).rowcount
+            self.db.execute("DELETE FROM links WHERE other_service = ? AND other_id = ?", identifier)
+            self.db.commit()
+        return bool(deleted)
+
+    # The IDs of the identifier's recording and their direct links, as (identifier, confidence, linked from) tuples
+    def describe(self, identifier):
+        with self.lock:
+            members = self.members(identifier)
+            if members == [identifier] and not self.neighbours(identifier):
+                known = self.db.execute("SELECT 1 FROM identities WHERE service = ? AND item_id = ?", identifier).fetchone()
+                if not known:
+                    return []
+            rows = [(member, 'exact', None) for member in members]
+            for member in members:
+                rows.extend((other, CONFIDENCE_LEVELS[rank], member) for other, rank, _, _ in self.neighbours(member))
+        return rows
+
+    # Number of IDs per service, of recordings and of links
+    def stats(self):
+        with self.lock:
+            services = dict(self.db.execute(
+                "SELECT service, COUNT(*) FROM (SELECT service, item_id FROM identities UNION SELECT service, item_id FROM links) GROUP BY service"
+            ).fetchall())
+            recordings = self.db.execute("SELECT COUNT(DISTINCT recording) FROM identities").fetchone()[0]
+            links = self.db.execute("SELECT COUNT(*) FROM links").fetchone()[0] // 2
+        return services, recordings, links
+
+    def close(self):
+        self.db.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Inspect and override the track identity store of the playlist sync scripts.")
+    parser.add_argument('--db', default=DEFAULT_TRACK_IDENTITIES, help="Track identity store (default: ~/.cache/playlist-sync/track_identities.db)")
+    commands = parser.add_subparsers(dest='command', required=True)
+    show = commands.add_parser('show', help="List the IDs of the same recording as the given one and their links")
+    show.add_argument('identifier', help="service:id, e.g. spotify:<track ID>, ytmusic:<videoId>, plex/<section uuid>:<ratingKey>, isrc:<code>")
+    link = commands.add_parser('link', help="Manually link an ID to one or more others (overrides automatic matches)")
+    link.add_argument('identifiers', nargs='+', help="Two or more service:id identifiers; the first is linked to each of the others")
+    forget = commands.add_parser('forget', help="Drop an ID and its links from the store; it is matched again by the next sync that needs it")
+    forget.add_argument('identifier', help="service:id")
+    commands.add_parser('stats', help="Count the stored IDs per service, recordings and links")
+    args = parser.parse_args(argv)
+
+    store = TrackIdentityStore(args.db)
+    try:
+        if args.command == 'show':
+            rows = store.describe(parse_identifier(args.identifier))
+            if not rows:
+                print(f"{args.identifier} is not in the track identity store.")
+            for identifier, confidence, linked_from in rows:
+                via = f", linked to {format_identifier(linked_from)}" if linked_from else ""
+                print(f"{format_identifier(identifier)} ({confidence}{via})")
+        elif args.command == 'link':
+            identifiers = [parse_identifier(text) for text in args.identifiers]
+            if len(identifiers) < 2:
+                parser.error("link needs at least two identifiers")
+            store.record(links=[(identifiers[0], other, 'manual', None) for other in identifiers[1:]])
+            print(f"Linked {', '.join(format_identifier(identifier) for identifier in identifiers)}.")
+        elif args.command == 'forget':
+            if store.forget(parse_identifier(args.identifier)):
+                print(f"Forgot {args.identifier}.")
+            else:
+                print(f"{args.identifier} is not in the track identity store.")
+        else:
+            services, recordings, links = store.stats()
+            print(f"{recordings} recordings, {links} links")
+            for service, count in sorted(services.items()):
+                print(f"  {service}: {count} IDs")
+    except ValueError as e:
+        parser.error(str(e))
+    finally:
+        store.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,191 @@
+"""
+vector_matcher.py
+
+Description:
+    NumPy batch engine for approximate Plex matching, an alternative to scoring candidates one
+    source track at a time with the trigram index (ngram_index.py).
+    Source rows and library tracks ("title artist" strings) are encoded as sparse binary vectors of
+    hashed character trigrams. A whole playlist is then scored against the library as a sparse
+    matrix product, computed in a few vectorized NumPy operations (no per-pair Python loop):
+      1. candidate pairs (source row, library track) are gathered from the posting lists of each
+         row's selective trigrams and counted with np.unique;
+      2. the best candidates of every row are rescored with their exact trigram overlap (Dice
+         coefficient) using a sorted-key membership test;
+      3. the top few per row get the same title/artist weighted score as the trigram engine.
+    Results are precomputed per playlist by prepare() and served by find_candidates(), so the engine
+    plugs into PlexLibraryIndex.find_track (and therefore find_track_in_plex) unchanged.
+
+    Requires numpy (pip install numpy).
+"""
+
+import threading
+import time
+import zlib
+import numpy as np
+from ngram_index import STOP_GRAM_FRACTION, CANDIDATE_FACTOR, clean_text, ngrams
+from plex_library_index import FUZZY_CANDIDATES, fuzzy_key, fuzzy_score
+
+# Size of the trigram hash space (large enough that collisions are rare)
+HASH_BITS = 20
+HASH_SIZE = 1 << HASH_BITS
+
+# Upper bound on candidate pairs expanded at once; larger playlists are scored in row chunks
+MAX_PAIRS = 10_000_000
+
+
+# Stable hash of a trigram into the vector space
+def hash_gram(gram):
+    return zlib.crc32(gram.encode('utf-8')) & (HASH_SIZE - 1)
+
+
+# Encode strings as sparse binary trigram vectors: (indptr, sorted hashed trigram ids per row)
+def encode(texts):
+    indptr = [0]
+    ids = []
+    for text in texts:
+        ids.extend(sorted({hash_gram(gram) for gram in ngrams(text)}))
+        indptr.append(len(ids))
+    return np.array(indptr, dtype=np.int64), np.array(ids, dtype=np.int64)
+
+
+class VectorMatcher:
+    # Attach to a PlexLibraryIndex; its find_track then takes approximate candidates from this engine
+    def __init__(self, index, verbose=False):
+        self.index = index
+        self.verbose = verbose
+        self.results = {}
+        self.lock = threading.Lock()
+        self.build()
+        index.fuzzy_engine = self
+
+    # Encode the library once and lay it out as posting lists (the transposed sparse matrix)
+    def build(self):
+        start = time.time()
+        indptr, ids = encode(fuzzy_key(track.title, track.grandparentTitle) for track in self.index.tracks)
+        self.doc_count = len(indptr) - 1
+        self.doc_lengths = np.diff(indptr)
+        doc_of_entry = np.repeat(np.arange(self.doc_count, dtype=np.int64), self.doc_lengths)
+
+        # Sorted (doc, trigram) keys for exact membership tests
+        self.doc_keys = doc_of_entry * HASH_SIZE + ids
+
+        # Posting lists: docs grouped by trigram id
+        order = np.argsort(ids, kind='stable')
+        self.posting_docs = doc_of_entry[order]
+        self.gram_counts = np.bincount(ids, minlength=HASH_SIZE)
+        self.posting_starts = np.concatenate(([0], np.cumsum(self.gram_counts)[:-1]))
+        self.stop_grams = self.gram_counts > max(1, int(self.doc_count * STOP_GRAM_FRACTION))
+        if self.verbose:
+            print(f"Vector matcher encoded {self.doc_count} Plex tracks in {time.time() - start:.1f}s.")
+
+    # Score every (artist, title) query in one batch; results are kept for find_candidates
+    def prepare(self, queries, k=FUZZY_CANDIDATES):
+        with self.lock:
+            queries = list(dict.fromkeys(
+                (artist, title) for artist, title in queries if (artist, title) not in self.results
+            ))
+        if not queries or not self.doc_count:
+            return
+        start = time.time()
+        indptr, ids = encode(fuzzy_key(title, artist) for artist, title in queries)
+        lengths = np.diff(indptr)
+        rows = np.repeat(np.arange(len(queries), dtype=np.int64), lengths)
+
+        # Candidate gathering uses only selective trigrams, unless a row has nothing but common ones
+        selective = ~self.stop_grams[ids]
+        has_selective = np.bincount(rows[selective], minlength=len(queries)) > 0
+        keep = selective | ~has_selective[rows]
+        rows, gram_ids = rows[keep], ids[keep]
+
+        # Split the rows into chunks whose candidate pairs fit in MAX_PAIRS
+        pairs_per_row = np.bincount(rows, weights=self.gram_counts[gram_ids], minlength=len(queries))
+        boundaries = [0]
+        total = 0
+        for row, pairs in enumerate(pairs_per_row):
+            if total and total + pairs > MAX_PAIRS:
+                boundaries.append(row)
+                total = 0
+            total += pairs
+        boundaries.append(len(queries))
+
+        top = {}
+        for first, last in zip(boundaries, boundaries[1:]):
+            in_chunk = (rows >= first) & (rows < last)
+            top.update(self.score_rows(rows[in_chunk], gram_ids[in_chunk], indptr, ids, lengths, k))
+
+        # Final title/artist weighted score for the best few candidates of each row
+        results = {}
+        for row, (artist, title) in enumerate(queries):
+            title_grams = ngrams(clean_text(title))
+            artist_grams = ngrams(clean_text(artist))
+            scored = [(self.index.tracks[doc], fuzzy_score(title_grams, artist_grams, self.index.tracks[doc])) for doc in top.get(row, [])]
+            scored.sort(key=lambda item: item[1], reverse=True)
+            results[(artist, title)] = scored
+        with self.lock:
+            self.results.update(results)
+        if self.verbose:
+            print(f"Vector matcher scored {len(queries)} source tracks in {time.time() - start:.1f}s.")
+
+    # Sparse product of a chunk of query rows with the library; returns {row: k best doc numbers}
+    def score_rows(self, rows, gram_ids, indptr, ids, lengths, k):
+        # Expand every (row, trigram) entry into the (row, doc) pairs of its posting list
+        counts = self.gram_counts[gram_ids]
+        pair_rows = np.repeat(rows, counts)
+        offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+        pair_docs = self.posting_docs[np.repeat(self.posting_starts[gram_ids], counts) + offsets]
+        if not len(pair_docs):
+            return {}
+        keys, shared = np.unique(pair_rows * self.doc_count + pair_docs, return_counts=True)
+        pair_rows, pair_docs = keys // self.doc_count, keys % self.doc_count
+
+        # Drop pairs sharing less than half of their row's best gathered overlap (keys are sorted by row)
+        row_starts = np.flatnonzero(np.diff(pair_rows, prepend=-1))
+        row_sizes = np.diff(np.append(row_starts, len(pair_rows)))
+        strong = shared * 2 >= np.repeat(np.maximum.reduceat(shared, row_starts), row_sizes)
+        pair_rows, pair_docs, shared = pair_rows[strong], pair_docs[strong], shared[strong]
+
+        # Keep the best candidates of each row by gathered overlap
+        order = np.lexsort((-shared, pair_rows))
+        pair_rows, pair_docs = pair_rows[order], pair_docs[order]
+        row_starts = np.flatnonzero(np.diff(pair_rows, prepend=-1))
+        row_sizes = np.diff(np.append(row_starts, len(pair_rows)))
+        rank = np.arange(len(pair_rows)) - np.repeat(row_starts, row_sizes)
+        best = rank < k * CANDIDATE_FACTOR
+        pair_rows, pair_docs = pair_rows[best], pair_docs[best]
+
+        # Exact overlap: test each of the row's trigrams against the candidate doc's sorted keys
+        row_lengths = lengths[pair_rows]
+        entry_pairs = np.repeat(np.arange(len(pair_rows)), row_lengths)
+        entry_offsets = np.arange(row_lengths.sum()) - np.repeat(np.cumsum(row_lengths) - row_lengths, row_lengths)
+        entry_grams = ids[np.repeat(indptr[pair_rows], row_lengths) + entry_offsets]
+        probe = pair_docs[entry_pairs] * HASH_SIZE + entry_grams
+        positions = np.searchsorted(self.doc_keys, probe)
+        in_range = positions < len(self.doc_keys)
+        hits = np.zeros(len(probe), dtype=bool)
+        hits[in_range] = self.doc_keys[positions[in_range]] == probe[in_range]
+        overlap = np.bincount(entry_pairs, weights=hits, minlength=len(pair_rows))
+        scores = 2 * overlap / (row_lengths + self.doc_lengths[pair_docs])
+
+        order = np.lexsort((-scores, pair_rows))
+        top = {}
+        for row, doc in zip(pair_rows[order].tolist(), pair_docs[order].tolist()):
+            docs = top.setdefault(row, [])
+            if len(docs) < k:
+                docs.append(doc)
+        return top
+
+    # Same contract as PlexLibraryIndex.find_candidates: top-k (track, score) pairs, best first
+    def find_candidates(self, artist_name, track_name, k=FUZZY_CANDIDATES, min_score=0.0):
+        key = (artist_name, track_name)
+        with self.lock:
+            scored = self.results.get(key)
+        if scored is None:
+            # Not part of a prepared batch: score it on its own
+            self.prepare([key], k)
+            with self.lock:
+                scored = self.results.get(key, [])
+        return [(track, score) for track, score in scored[:k] if score >= min_score]
+
+    # Same interface as find_track_in_plex
+    def find_track(self, artist_name, track_name, album_name=None, force_album_match=None, min_score=None, ids=None):
+        return self.index.find_track(artist_name, track_name, album_name, force_album_match, min_score, ids)
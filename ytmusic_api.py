@@ -0,0 +1,98 @@
+"""
+ytmusic_api.py
+
+Description:
+    YouTube Music helpers shared by the playlist sync scripts.
+    iter_youtube_playlist_items is a generator that reads a playlist page by page, following the
+    continuation tokens returned by YouTube Music, and yields each track as soon as its page arrives.
+    There is no fixed track cap and only one page is held in memory at a time.
+    If the response layout is not recognized (ytmusicapi internals differ between versions), it falls
+    back to ytmusicapi's own get_playlist(limit=None), which is uncapped but not streamed.
+    When a RetryPolicy (retry_policy.py) is given, every page request goes through it.
+"""
+
+
+# Recursively find the first value stored under `key` in a nested YouTube Music response
+def find_key(data, key):
+    if isinstance(data, dict):
+        if key in data:
+            return data[key]
+        values = data.values()
+    elif isinstance(data, list):
+        values = data
+    else:
+        return None
+    for value in values:
+        found = find_key(value, key)
+        if found is not None:
+            return found
+    return None
+
+
+# Split a page of shelf contents into track renderers and the continuation token for the next page (if any)
+def split_continuation(contents):
+    items = []
+    token = None
+    for item in contents:
+        if 'continuationItemRenderer' in item:
+            token = find_key(item['continuationItemRenderer'], 'token')
+        else:
+            items.append(item)
+    return items, token
+
+
+# Yield the raw track dicts of a YouTube Music playlist, one continuation page at a time
+def iter_youtube_playlist_items(ytmusic, playlist_id, verbose=False, retry=None):
+    call = retry.call if retry else (lambda func, *args, **kwargs: func(*args, **kwargs))
+    send_request = lambda *args: call(ytmusic._send_request, *args)
+    try:
+        from ytmusicapi.parsers.playlists import parse_playlist_items
+        browse_id = playlist_id if playlist_id.startswith('VL') else 'VL' + playlist_id
+        response = send_request('browse', {'browseId': browse_id})
+        shelf = find_key(response, 'musicPlaylistShelfRenderer')
+        contents = shelf['contents']
+        legacy_token = find_key(shelf.get('continuations', []), 'continuation')
+    except (ImportError, AttributeError, KeyError, TypeError):
+        # Unknown ytmusicapi layout: let the library fetch the whole playlist without a cap
+        if verbose:
+            print("Streaming playlist reader unavailable for this ytmusicapi version; fetching the whole playlist.")
+        yield from call(ytmusic.get_playlist, playlist_id, limit=None)['tracks']
+        return
+
+    page = 0
+    track_count = 0
+    seen = set()
+    while True:
+        items, token = split_continuation(contents)
+        # A continuation that overlaps an earlier page must not yield its entries again. Entries are told apart
+        # by setVideoId, so a track listed twice in the playlist is kept; without one, the videoId is used.
+        tracks = []
+        for track in parse_playlist_items(items):
+            entry = track.get('setVideoId') or track.get('videoId')
+            if entry and entry in seen:
+                continue
+            seen.add(entry)
+            tracks.append(track)
+        page += 1
+        track_count += len(tracks)
+        if verbose:
+            print(f"Fetched page {page} of YouTube Music playlist '{playlist_id}' ({track_count} tracks so far).")
+        yield from tracks
+
+        if token:
+            # Current layout: continuation items are appended via a plain continuation request.
+            # A legacy token from the first shelf is not followed once this path is taken.
+            legacy_token = None
+            response = send_request('browse', {'continuation': token})
+            contents = find_key(response, 'continuationItems') or []
+        elif legacy_token:
+            # Older layout: shelf continuations requested with ctoken query parameters
+            response = send_request('browse', {}, f"&ctoken={legacy_token}&continuation={legacy_token}")
+            shelf = find_key(response, 'musicPlaylistShelfContinuation') or {}
+            contents = shelf.get('contents', [])
+            legacy_token = find_key(shelf.get('continuations', []), 'continuation')
+        else:
+            break
+
+        if not contents:
+            break